@@ -0,0 +1,6 @@
+"""Performance benchmarks for process_podcast.
+
+Run from the root of the project, e.g.:
+
+    python -m benchmarks.pipeline --help
+"""
@@ -0,0 +1,170 @@
+"""Generate reproducible synthetic benchmark inputs.
+
+Video and audio come from ffmpeg's lavfi testsrc and sine sources,
+and slides from a minimal multi-page PDF written directly, so the
+same inputs can be regenerated on any machine.
+"""
+from pathlib import Path
+
+from shell_command import FFmpegCommand
+
+
+# Synthetic source settings. Changing any of these invalidates
+# comparisons with earlier results.
+VIDEO_SIZE = "1280x720"
+VIDEO_RATE = 25
+AUDIO_RATE = 48000
+JOINER_DURATION = 5
+PDF_PAGE_SIZE = (720, 540)
+
+
+class Scenario(object):
+    """A synthetic lecture of a given length with a number of slides."""
+
+    def __init__(self, name, minutes, slides):
+        self.name = name
+        self.minutes = minutes
+        self.slides = slides
+
+    def __repr__(self):
+        return "<{c} {n}: {m} min, {s} slides>".format(
+            c=self.__class__.__name__, n=self.name, m=self.minutes,
+            s=self.slides)
+
+    def duration(self):
+        """Return the duration of the lecture in seconds."""
+        return self.minutes * 60
+
+    def output_duration(self):
+        """Return the duration of the rendered podcast in seconds."""
+        # Two joiners are inserted between the three parts.
+        return self.duration() + 2 * JOINER_DURATION
+
+    def configuration(self):
+        """Return the podcast configuration for the scenario.
+
+        The lecture is split into two video parts and a run of PDF
+        slides, separated by "^" joiners that repeat the last frame
+        of the preceding video part for the duration of joiner.wav.
+        """
+        d = self.duration()
+        part1, part2 = d / 3, d / 2
+        slide_duration = (d - part2) / self.slides
+        lines = [
+            "[a:lecture.mov] {t0:.3f} {t1:.3f}".format(t0=0, t1=part1),
+            "[a:joiner.wav]",
+            "[a:lecture.mov] {t0:.3f} {t1:.3f}".format(t0=part1, t1=part2),
+            "[a:joiner.wav]",
+            "[a:lecture.mov] {t0:.3f} {t1:.3f}".format(t0=part2, t1=d),
+            "",
+            "[v:lecture.mov] {t0:.3f} {t1:.3f}".format(t0=0, t1=part1),
+            "[f:^:last] @joiner.wav",
+            "[v:lecture.mov] {t0:.3f} {t1:.3f}".format(t0=part1, t1=part2),
+            "[f:^:last] @joiner.wav",
+        ]
+        for i in range(self.slides):
+            lines.append("[f:slides.pdf:{n}] {t0:.3f} {t1:.3f}".format(
+                n=i, t0=part2 + i * slide_duration,
+                t1=part2 + (i + 1) * slide_duration))
+        return "\n".join(lines) + "\n"
+
+
+SCENARIOS = [
+    Scenario("short", 10, 10),
+    Scenario("lecture", 60, 100),
+    Scenario("long", 180, 300),
+]
+
+
+def pdf_document(pages, width=PDF_PAGE_SIZE[0], height=PDF_PAGE_SIZE[1]):
+    """Return the bytes of a minimal PDF with numbered slide pages.
+
+    Each page has a coloured title bar and a large page number, which
+    is enough to exercise rasterisation without any PDF library.
+    """
+    objects = []
+    # 1: catalog, 2: page tree, 3: font, then a (page, content)
+    # object pair for each page.
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append("<< /Type /Pages /Kids [{k}] /Count {n} >>".format(
+        k=" ".join("{i} 0 R".format(i=i) for i in page_ids), n=pages))
+    objects.append("<< /Type /Font /Subtype /Type1 "
+                   "/BaseFont /Helvetica >>")
+    for i in range(pages):
+        shade = (i % 10) / 10
+        content = ("{r:.1f} 0.3 {b:.1f} rg 0 {y} {w} 80 re f "
+                   "0 g BT /F1 96 Tf {x} {ty} Td (Slide {n}) Tj ET".format(
+                       r=shade, b=1 - shade, y=height - 80, w=width,
+                       x=width // 6, ty=height // 3, n=i + 1))
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w} {h}] "
+            "/Resources << /Font << /F1 3 0 R >> >> "
+            "/Contents {c} 0 R >>".format(w=width, h=height,
+                                          c=page_ids[i] + 1))
+        objects.append("<< /Length {n} >>\nstream\n{s}\nendstream".format(
+            n=len(content) + 1, s=content))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += "{n} 0 obj\n{b}\nendobj\n".format(n=number, b=body).encode()
+    xref = len(out)
+    out += "xref\n0 {n}\n0000000000 65535 f \n".format(
+        n=len(objects) + 1).encode()
+    for o in offsets:
+        out += "{o:010d} 00000 n \n".format(o=o).encode()
+    out += ("trailer\n<< /Size {n} /Root 1 0 R >>\nstartxref\n{x}\n"
+            "%%EOF\n".format(n=len(objects) + 1, x=xref)).encode()
+    return bytes(out)
+
+
+def generate_lecture(path, duration):
+    """Generate a lecture recording with test pattern video and a tone."""
+    command = FFmpegCommand(
+        input_options=[
+            "-f", "lavfi", "-i",
+            "testsrc=size={s}:rate={r}:duration={d}".format(
+                s=VIDEO_SIZE, r=VIDEO_RATE, d=duration),
+            "-f", "lavfi", "-i",
+            "sine=frequency=440:beep_factor=4:sample_rate={r}:"
+            "duration={d}".format(r=AUDIO_RATE, d=duration)],
+        output_options=["-codec:v", "h264", "-pix_fmt", "yuv420p",
+                        "-g", str(VIDEO_RATE * 10),
+                        "-codec:a", "pcm_s16le",
+                        "-map", "0:v", "-map", "1:a", str(path)])
+    return command.run()
+
+
+def generate_joiner(path, duration=JOINER_DURATION):
+    """Generate a short audio joiner."""
+    command = FFmpegCommand(
+        input_options=[
+            "-f", "lavfi", "-i",
+            "sine=frequency=880:sample_rate={r}:duration={d}".format(
+                r=AUDIO_RATE, d=duration)],
+        output_options=["-codec:a", "pcm_s16le", str(path)])
+    return command.run()
+
+
+def generate_inputs(scenario, directory):
+    """Generate (or reuse) all inputs for a scenario in directory.
+
+    Returns the path of the scenario's configuration file. Media are
+    only regenerated if they're missing, so repeated runs reuse them.
+    """
+    directory = Path(directory, scenario.name)
+    directory.mkdir(parents=True, exist_ok=True)
+    lecture = directory / "lecture.mov"
+    if not lecture.exists():
+        if generate_lecture(lecture, scenario.duration()) != 0:
+            raise RuntimeError("failed to generate {f}".format(f=lecture))
+    joiner = directory / "joiner.wav"
+    if not joiner.exists():
+        if generate_joiner(joiner) != 0:
+            raise RuntimeError("failed to generate {f}".format(f=joiner))
+    slides = directory / "slides.pdf"
+    slides.write_bytes(pdf_document(scenario.slides))
+    config = directory / "podcast.cfg"
+    config.write_text(scenario.configuration())
+    return config
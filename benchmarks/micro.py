@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Microbenchmarks of the pure-Python planning path.
+
+Times each stage of planning a podcast with a given number of
+segments, without running any external commands:
+
+* parse: parsing the configuration;
+* segments: building segments from the configuration;
+* frames: assigning (already rasterised) images to frame segments;
+* filtergraph: building the ffmpeg complex filter;
+* argv: generating the final ffmpeg argument list and command string.
+
+    python -m benchmarks.micro --sizes 10 100 1000 10000
+"""
+import argparse
+import gc
+import json
+import math
+import sys
+import time
+
+from config_parser import parse_configuration_string
+import process_podcast
+from segment import Segment, AudioSegment, VideoSegment, FrameSegment
+from shell_command import FFmpegConcatCommand
+
+
+STAGES = ["parse", "segments", "frames", "filtergraph", "argv"]
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+# Seconds per slide in generated configurations.
+SLIDE_DURATION = 7.5
+
+
+def make_configuration(n):
+    """Return a configuration with n slides and matching audio.
+
+    The audio is cut into n segments too, so that both the number of
+    segment specifications and the number of timestamps grow with n.
+    """
+    times = " ".join("{t0:.3f} {t1:.3f}".format(
+        t0=i * SLIDE_DURATION, t1=(i + 1) * SLIDE_DURATION - 0.5)
+        for i in range(n))
+    lines = ["[a:lecture.wav] {t}".format(t=times)]
+    for i in range(n):
+        lines.append("[f:slides.pdf:{i}] {t0:.3f} {t1:.3f}".format(
+            i=i, t0=i * SLIDE_DURATION, t1=(i + 1) * SLIDE_DURATION - 0.5))
+    return "\n".join(lines) + "\n"
+
+
+def run_stages(n):
+    """Run every planning stage once for n slides.
+
+    Returns a dictionary of the elapsed time (in seconds) per stage.
+    As with timeit, garbage collection is disabled while timing.
+    """
+    # Start with a clean slate, as input files are tracked globally.
+    Segment._input_files = {}
+    args = argparse.Namespace(prefix=".")
+    text = make_configuration(n)
+    elapsed = {}
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        _time_stages(args, text, elapsed)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return elapsed
+
+
+def _time_stages(args, text, elapsed):
+    """Time each stage, storing the results in elapsed."""
+    start = time.perf_counter()
+    config = parse_configuration_string(text)
+    elapsed["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    segments = process_podcast.process_input_streams(args, config)
+    elapsed["segments"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, s in enumerate(s for s in segments
+                          if isinstance(s, FrameSegment)):
+        s.use_frame("temp_frame_{i:05d}.jpg".format(i=i))
+    elapsed["frames"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    audio_segments = [s for s in segments if isinstance(s, AudioSegment)]
+    video_segments = [s for s in segments if isinstance(s, VideoSegment)]
+    command = FFmpegConcatCommand(
+        input_options=[], output_options=[], quiet=True,
+        has_audio=True, has_video=True)
+    input_files = Segment.input_files()
+    for f in input_files:
+        if (input_files[f]):
+            command.append_input_options(input_files[f])
+        command.append_input_options(["-i", f])
+    for s in (audio_segments + video_segments):
+        command.append_filter(s.trim_filter())
+    command.append_concat_filter("a", audio_segments)
+    command.append_normalisation_filter()
+    command.append_concat_filter("v", video_segments)
+    command.append_output_options(["output.mov"])
+    command.build_complex_filter()
+    elapsed["filtergraph"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    command.argument_list()
+    command.command_string(quote=True)
+    elapsed["argv"] = time.perf_counter() - start
+
+
+def benchmark(sizes, repeat=3):
+    """Time every stage for each size, keeping the fastest of repeat runs.
+
+    Returns a dictionary mapping each size to a dictionary of stage
+    times.
+    """
+    results = {}
+    for n in sizes:
+        best = {}
+        for _ in range(repeat):
+            for stage, t in run_stages(n).items():
+                best[stage] = min(t, best.get(stage, t))
+        results[n] = best
+    return results
+
+
+def scaling_exponents(results):
+    """Estimate the empirical complexity of each stage.
+
+    Returns the exponent k of t ~ n^k between the two largest sizes
+    (about 1 for linear stages, 2 for quadratic ones).
+    """
+    sizes = sorted(results)
+    small, large = sizes[-2], sizes[-1]
+    exponents = {}
+    for stage in STAGES:
+        t_small = max(results[small][stage], 1e-9)
+        t_large = max(results[large][stage], 1e-9)
+        exponents[stage] = (math.log(t_large / t_small) /
+                            math.log(large / small))
+    return exponents
+
+
+def print_results(results):
+    """Print a table of stage times (in milliseconds) for each size."""
+    print("{:>8} ".format("n") +
+          " ".join("{:>12}".format(s) for s in STAGES))
+    for n in sorted(results):
+        print("{:>8} ".format(n) + " ".join(
+            "{:>10.2f}ms".format(results[n][s] * 1000) for s in STAGES))
+    if len(results) > 1:
+        exponents = scaling_exponents(results)
+        print("{:>8} ".format("n^k") + " ".join(
+            "{:>12.2f}".format(exponents[s]) for s in STAGES))
+
+
+def parse_command_line():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks of process_podcast planning.")
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=DEFAULT_SIZES, metavar="N",
+        help="Numbers of slides to benchmark (default {s}).".format(
+            s=" ".join(str(s) for s in DEFAULT_SIZES)))
+    parser.add_argument(
+        "--repeat", type=int, default=3, metavar="N",
+        help="Number of runs per size (the fastest is reported).")
+    parser.add_argument(
+        "--output", "-o", metavar="FILE",
+        help="Also write results to FILE as JSON.")
+    return parser.parse_args()
+
+
+if (__name__ == "__main__"):
+    args = parse_command_line()
+    results = benchmark(args.sizes, args.repeat)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results,
+                       "exponents": scaling_exponents(results)
+                           if len(results) > 1 else {}},
+                      f, indent=4)
+    sys.exit(0)
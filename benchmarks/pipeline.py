@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""End-to-end benchmarks of the full process_podcast.py pipeline.
+
+Each scenario (see benchmarks.media) is rendered under each mode,
+recording wall time, realtime factor (output duration / wall time)
+and the peak RSS of the largest process, along with the per-stage
+resource usage reported by process_podcast.py itself. Results are
+written as JSON so that runs on different commits can be compared:
+
+    python -m benchmarks.pipeline run --output before.json
+    (check out another commit)
+    python -m benchmarks.pipeline run --output after.json
+    python -m benchmarks.pipeline compare before.json after.json
+"""
+import argparse
+import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.media import SCENARIOS, generate_inputs
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PROCESS_PODCAST = ROOT / "process_podcast.py"
+
+# Extra process_podcast.py options for each benchmark mode.
+MODES = {
+    "default": [],
+    "preview": ["--preview", "1"],
+    "copy": ["--copy-audio", "--copy-video"],
+}
+
+# Slowdown (as a fraction) beyond which compare reports a regression.
+DEFAULT_THRESHOLD = 0.10
+
+
+def git_revision():
+    """Return the current git commit of the project, if available."""
+    try:
+        return subprocess.check_output(
+            ["git", "-C", str(ROOT), "rev-parse", "HEAD"],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def tool_version(tool):
+    """Return the first line of a tool's version output, if available."""
+    try:
+        return subprocess.check_output(
+            [tool, "-version"],
+            stderr=subprocess.DEVNULL).decode().splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return None
+
+
+def run_podcast(config, output, options, report):
+    """Run process_podcast.py and measure it.
+
+    Returns (exit status, wall time, peak RSS in KiB). The peak RSS
+    comes from wait4(), which includes the largest descendant (e.g.,
+    ffmpeg) that process_podcast.py waited for.
+    """
+    argv = ([sys.executable, str(PROCESS_PODCAST), "--quiet",
+             "--input-prefix", str(config.parent),
+             "--config", config.name, "--report", str(report)] +
+            options + ["--", str(output)])
+    start = time.monotonic()
+    process = subprocess.Popen(argv, cwd=str(config.parent),
+                               stdout=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall_time = time.monotonic() - start
+    if os.WIFEXITED(status):
+        process.returncode = os.WEXITSTATUS(status)
+    else:
+        process.returncode = -os.WTERMSIG(status)
+    return process.returncode, wall_time, rusage.ru_maxrss
+
+
+def run_benchmarks(args):
+    """Run the selected scenarios and modes and write the results."""
+    results = {
+        "commit": git_revision(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": {
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "ffmpeg": tool_version("ffmpeg"),
+        },
+        "results": [],
+    }
+    for scenario in [s for s in SCENARIOS if s.name in args.scenarios]:
+        print("Generating inputs for {s}...".format(s=scenario))
+        config = generate_inputs(scenario, args.work_dir)
+        for mode in args.modes:
+            for repeat in range(args.repeat):
+                output = config.parent / "output_{m}.mov".format(m=mode)
+                report = config.parent / "report_{m}.json".format(m=mode)
+                status, wall_time, max_rss = run_podcast(
+                    config.resolve(), output.resolve(), MODES[mode],
+                    report.resolve())
+                result = {
+                    "scenario": scenario.name,
+                    "minutes": scenario.minutes,
+                    "slides": scenario.slides,
+                    "mode": mode,
+                    "repeat": repeat,
+                    "status": status,
+                    "wall_time": wall_time,
+                    "realtime_factor": (scenario.output_duration() /
+                                        wall_time),
+                    "max_rss": max_rss,
+                }
+                if report.exists():
+                    with report.open() as f:
+                        result["report"] = json.load(f)
+                    report.unlink()
+                if output.exists():
+                    output.unlink()
+                results["results"].append(result)
+                print("    {s}/{m}: {w:.1f}s ({f:.1f}x realtime), peak "
+                      "RSS {r} KiB{e}".format(
+                          s=scenario.name, m=mode, w=wall_time,
+                          f=result["realtime_factor"], r=max_rss,
+                          e="" if status == 0 else
+                          " FAILED ({s})".format(s=status)))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    return 0
+
+
+def best_results(results):
+    """Return the fastest successful run for each (scenario, mode)."""
+    best = {}
+    for r in results["results"]:
+        if r["status"] != 0:
+            continue
+        key = (r["scenario"], r["mode"])
+        if key not in best or r["wall_time"] < best[key]["wall_time"]:
+            best[key] = r
+    return best
+
+
+def compare_results(args):
+    """Compare two result files and report any regressions."""
+    with open(args.baseline) as f:
+        baseline = best_results(json.load(f))
+    with open(args.current) as f:
+        current = best_results(json.load(f))
+    regressions = 0
+    print("{:<20} {:>10} {:>10} {:>8} {:>10}".format(
+        "scenario/mode", "before", "after", "change", "rss change"))
+    for key in sorted(set(baseline) & set(current)):
+        b, c = baseline[key], current[key]
+        change = c["wall_time"] / b["wall_time"] - 1
+        rss_change = c["max_rss"] / b["max_rss"] - 1 if b["max_rss"] else 0
+        flag = ""
+        if change > args.threshold or rss_change > args.threshold:
+            flag = " REGRESSION"
+            regressions += 1
+        print("{:<20} {:>9.1f}s {:>9.1f}s {:>+7.1%} {:>+10.1%}{}".format(
+            "/".join(key), b["wall_time"], c["wall_time"], change,
+            rss_change, flag))
+    return 1 if regressions else 0
+
+
+def parse_command_line():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="End-to-end process_podcast benchmarks.")
+    subparsers = parser.add_subparsers(dest="action")
+    subparsers.required = True
+
+    run = subparsers.add_parser("run", help="run benchmarks")
+    run.add_argument(
+        "--scenarios", nargs="+", metavar="NAME",
+        choices=[s.name for s in SCENARIOS],
+        default=[s.name for s in SCENARIOS],
+        help="Scenarios to run (default all): {s}.".format(
+            s=", ".join("{n} ({m} min, {s} slides)".format(
+                n=s.name, m=s.minutes, s=s.slides) for s in SCENARIOS)))
+    run.add_argument(
+        "--modes", nargs="+", metavar="MODE", choices=sorted(MODES),
+        default=sorted(MODES),
+        help="Modes to run (default all): {m}.".format(
+            m=", ".join(sorted(MODES))))
+    run.add_argument(
+        "--repeat", type=int, default=1, metavar="N",
+        help="Number of times to run each benchmark (the fastest run is "
+            "used when comparing).")
+    run.add_argument(
+        "--work-dir", default=".bench_inputs", metavar="DIR",
+        help="Directory for generated inputs, which are reused across "
+            "runs (default .bench_inputs).")
+    run.add_argument(
+        "--output", "-o", default="bench_output.json", metavar="FILE",
+        help="File to write results to (default bench_output.json).")
+    run.set_defaults(func=run_benchmarks)
+
+    compare = subparsers.add_parser(
+        "compare", help="compare two result files")
+    compare.add_argument("baseline", help="earlier results")
+    compare.add_argument("current", help="later results")
+    compare.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        metavar="FRACTION",
+        help="Slowdown or memory growth that counts as a regression "
+            "(default {t}).".format(t=DEFAULT_THRESHOLD))
+    compare.set_defaults(func=compare_results)
+
+    return parser.parse_args()
+
+
+if (__name__ == "__main__"):
+    args = parse_command_line()
+    sys.exit(args.func(args))
@@ -0,0 +1,52 @@
+import re
+import unittest
+
+from benchmarks.media import Scenario, pdf_document
+from config_parser import parse_configuration_string
+
+
+class PDFDocumentTestCase(unittest.TestCase):
+    """Test generation of synthetic PDF slides."""
+
+    def test_page_count(self):
+        """Test that the page tree has the right number of pages."""
+        for pages in [1, 10, 300]:
+            with self.subTest(msg="{n} pages".format(n=pages)):
+                pdf = pdf_document(pages)
+                self.assertIn("/Count {n} ".format(n=pages).encode(), pdf)
+                self.assertEqual(pdf.count(b"/Type /Page "), pages)
+
+    def test_xref_offsets(self):
+        """Test that every xref entry points at its object."""
+        pdf = pdf_document(3)
+        xref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+        self.assertTrue(pdf[xref:].startswith(b"xref"))
+        offsets = re.findall(rb"(\d{10}) 00000 n", pdf[xref:])
+        for number, offset in enumerate(offsets, start=1):
+            with self.subTest(msg="object {n}".format(n=number)):
+                self.assertTrue(pdf[int(offset):].startswith(
+                    "{n} 0 obj".format(n=number).encode()))
+
+    def test_reproducible(self):
+        """Test that the same document is generated every time."""
+        self.assertEqual(pdf_document(5), pdf_document(5))
+
+
+class ScenarioTestCase(unittest.TestCase):
+    """Test the Scenario class."""
+
+    def test_configuration(self):
+        """Test that the generated configuration parses as expected."""
+        scenario = Scenario("test", 10, 25)
+        config = parse_configuration_string(scenario.configuration())
+        types = [c["type"] for c in config]
+        test_data = (
+            (types.count("audio"), 5, "audio segments"),
+            (types.count("video"), 2, "video segments"),
+            (types.count("frame"), 2 + 25, "frame segments"),
+            (len([c for c in config if c["filename"] == "^"]), 2,
+             "joiners"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
@@ -0,0 +1,38 @@
+import os
+import unittest
+
+from benchmarks.micro import STAGES, benchmark, scaling_exponents
+from segment import Segment
+
+
+# Timing checks are unreliable on busy machines, so they only run when
+# asked for.
+BENCHMARKS = "PROCESS_PODCAST_BENCHMARKS"
+
+
+@unittest.skipUnless(os.environ.get(BENCHMARKS),
+                     "set {e}=1 to run timing checks".format(e=BENCHMARKS))
+class PlanningScalingTestCase(unittest.TestCase):
+    """Check that no planning stage scales worse than linearly."""
+
+    # Sizes are large enough for quadratic behaviour to dominate
+    # fixed overheads, but small enough to keep the test quick.
+    SIZES = [250, 2000]
+    # Linear stages measure close to 1, quadratic ones close to 2.
+    MAX_EXPONENT = 1.5
+
+    @classmethod
+    def setUpClass(cls):
+        """Run the microbenchmarks once for all tests."""
+        cls.exponents = scaling_exponents(benchmark(cls.SIZES, repeat=2))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up after tests."""
+        Segment._input_files = {}
+
+    def test_scaling(self):
+        """Test that every stage scales (roughly) linearly."""
+        for stage in STAGES:
+            with self.subTest(msg=stage):
+                self.assertLess(self.exponents[stage], self.MAX_EXPONENT)
@@ -0,0 +1,3 @@
+from capabilities.capabilities import (
+    Capabilities,
+)
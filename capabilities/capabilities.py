@@ -0,0 +1,154 @@
+import json
+import os
+from pathlib import Path
+import re
+import tempfile
+
+import globals
+from shell_command import ShellCommand, ToolPath
+
+
+class _ProbeCommand(ShellCommand):
+    """A command that asks a tool about itself."""
+    
+    def __init__(self, executable, options):
+        super().__init__(input_options=options, output_options=[])
+        self._executable = executable
+
+
+class Capabilities(object):
+    """What the installed external tools can do.
+    
+    Each tool is found (on PATH) and probed the first time it's asked
+    about. The results are cached in a JSON file keyed by the tool's
+    path and modification time, so later runs don't start any extra
+    processes until a tool is upgraded.
+    """
+    VERSION = 1
+    TOOLS = {name: ToolPath(name) for name in
+             ["ffmpeg", "convert", "pdftoppm", "mutool"]}
+    # Encoders to use for a codec, fastest first.
+    ENCODERS = {"h264": ["libx264"], "hevc": ["libx265"]}
+    _VERSION = re.compile(r"version:?\s+(?:ImageMagick\s+)?(\S+)",
+                          re.IGNORECASE)
+    # Lines of "ffmpeg -encoders" and "ffmpeg -filters", after the
+    # capability flags (and not the legend, whose "name" is "=").
+    _ENCODER = re.compile(r"^\s*[VAS][\w.]{5}\s+([^\s=]\S*)", re.MULTILINE)
+    _FILTER = re.compile(r"^\s*[T.][S.][C.]?\s+([^\s=]\S*)\s+\S+->\S+",
+                         re.MULTILINE)
+    # Lines of "convert -list format" for readable formats.
+    _FORMAT = re.compile(r"^\s*(\w+)\*?\s+\S+\s+r[w-][+-]", re.MULTILINE)
+    
+    def __init__(self, cache_path):
+        self.cache_path = Path(cache_path)
+        self._cache = None
+        self._probed = {}
+    
+    def which(self, tool):
+        """Return the full path of a tool, or None if it isn't installed."""
+        return self.TOOLS[tool].find()
+    
+    def _load(self):
+        """Return all cached probe results."""
+        if self._cache is None:
+            try:
+                with self.cache_path.open() as f:
+                    self._cache = json.load(f)
+                if (self._cache.get("version") != self.VERSION):
+                    self._cache = {}
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+    
+    def _save(self):
+        """Write the cache, atomically."""
+        fn = "_save"
+        cache = dict(self._load(), version=self.VERSION)
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=str(self.cache_path.parent),
+                                        prefix=self.cache_path.name)
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f, indent=4)
+            os.replace(temp, str(self.cache_path))
+        except OSError as e:
+            globals.log.debug("{cls}.{fn}(): {e!r}".format(
+                cls=self.__class__.__name__, fn=fn, e=e))
+    
+    def _run(self, path, options):
+        """Return the text output of a probe command ("" on failure)."""
+        fn = "_run"
+        command = _ProbeCommand(path, options)
+        globals.log.debug("{cls}.{fn}(): {cmd}".format(
+            cls=self.__class__.__name__, fn=fn, cmd=command))
+        output = command.get_binary_output()
+        return output.decode(errors="replace") if output else ""
+    
+    def _probe_ffmpeg(self, path):
+        """Return the version, encoders and filters of ffmpeg."""
+        version = self._VERSION.search(self._run(path, ["-version"]))
+        return {
+            "version": version.group(1) if version else None,
+            "encoders": self._ENCODER.findall(
+                self._run(path, ["-hide_banner", "-encoders"])),
+            "filters": self._FILTER.findall(
+                self._run(path, ["-hide_banner", "-filters"])),
+        }
+    
+    def _probe_convert(self, path):
+        """Return the version and readable formats of ImageMagick."""
+        version = self._VERSION.search(self._run(path, ["-version"]))
+        return {
+            "version": version.group(1) if version else None,
+            "formats": [f.lower() for f in self._FORMAT.findall(
+                self._run(path, ["-list", "format"]))],
+        }
+    
+    def _probe(self, tool):
+        """Return the probe results for a tool (None if not installed)."""
+        if tool in self._probed:
+            return self._probed[tool]
+        path = self.which(tool)
+        result = None
+        if path:
+            key = "{t}:{p}:{m}".format(t=tool, p=path,
+                                       m=os.stat(path).st_mtime_ns)
+            cache = self._load()
+            if key not in cache:
+                probe = getattr(self, "_probe_{t}".format(t=tool), None)
+                cache[key] = probe(path) if probe else {}
+                self._save()
+            result = cache[key]
+        self._probed[tool] = result
+        return result
+    
+    def has(self, tool):
+        """Return True if a tool is installed."""
+        return self._probe(tool) is not None
+    
+    def version(self, tool):
+        """Return the version of a tool, if known."""
+        return (self._probe(tool) or {}).get("version")
+    
+    def has_encoder(self, encoder):
+        """Return True if ffmpeg has an encoder."""
+        return encoder in (self._probe("ffmpeg") or {}).get("encoders", [])
+    
+    def has_filter(self, filter):
+        """Return True if ffmpeg has a filter."""
+        return filter in (self._probe("ffmpeg") or {}).get("filters", [])
+    
+    def can_read(self, format):
+        """Return True if ImageMagick can read a format (e.g., "pdf")."""
+        return format in (self._probe("convert") or {}).get("formats", [])
+    
+    def encoder(self, codec):
+        """Return the fastest available ffmpeg encoder for a codec.
+        
+        Returns codec itself (i.e., ffmpeg's default encoder) if there's
+        nothing better.
+        """
+        for e in self.ENCODERS.get(codec, []):
+            if self.has_encoder(e):
+                return e
+        return codec
@@ -0,0 +1,116 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from capabilities import Capabilities
+
+
+FFMPEG_VERSION = "ffmpeg version 6.1.1 Copyright (c) 2000-2023\n"
+FFMPEG_ENCODERS = """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC (codec h264)
+ V....D ffv1                 FFmpeg video codec #1
+ A....D pcm_s16le            PCM signed 16-bit little-endian
+"""
+FFMPEG_FILTERS = """Filters:
+  T.. = Timeline support
+  ..C = Command support
+ TSC dynaudnorm        A->A       Dynamic Audio Normalizer.
+ ..C scale             V->V       Scale the input video size.
+"""
+CONVERT_VERSION = "Version: ImageMagick 6.9.11-60 Q16 x86_64\n"
+CONVERT_FORMATS = """   Format  Module    Mode  Description
+-------------------------------------------------------------------------
+     JPEG* JPEG      rw-   Joint Photographic Experts Group JFIF format
+      PDF  PDF       rw+   Portable Document Format
+       PS  PS        -w+   PostScript
+"""
+
+
+class FakeCapabilities(Capabilities):
+    """Capabilities of fake tools, which are never actually run."""
+
+    OUTPUT = {("-version",): FFMPEG_VERSION,
+              ("-hide_banner", "-encoders"): FFMPEG_ENCODERS,
+              ("-hide_banner", "-filters"): FFMPEG_FILTERS}
+    CONVERT_OUTPUT = {("-version",): CONVERT_VERSION,
+                      ("-list", "format"): CONVERT_FORMATS}
+
+    def __init__(self, cache_path, tools):
+        super().__init__(cache_path)
+        self.tools = tools
+        self.runs = []
+
+    def which(self, tool):
+        return self.tools.get(tool)
+
+    def _run(self, path, options):
+        self.runs.append((Path(path).name,) + tuple(options))
+        output = (self.CONVERT_OUTPUT if Path(path).name == "convert"
+                  else self.OUTPUT)
+        return output[tuple(options)]
+
+
+class CapabilitiesTestCase(unittest.TestCase):
+    """Test the Capabilities class."""
+
+    def setUp(self):
+        """Set up some fake tools."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.tools = {}
+        for tool in ["ffmpeg", "convert"]:
+            self.tools[tool] = Path(self.directory.name, tool)
+            self.tools[tool].write_text("#!/bin/sh\n")
+        self.cache_path = Path(self.directory.name, "capabilities.json")
+        self.capabilities = FakeCapabilities(self.cache_path, self.tools)
+
+    def tearDown(self):
+        """Remove the fake tools."""
+        self.directory.cleanup()
+
+    def test_probe(self):
+        """Test probing the tools."""
+        c = self.capabilities
+        test_data = (
+            (c.has("ffmpeg"), True, "ffmpeg is installed"),
+            (c.has("mutool"), False, "mutool isn't installed"),
+            (c.version("ffmpeg"), "6.1.1", "ffmpeg version"),
+            (c.version("convert"), "6.9.11-60", "convert version"),
+            (c.has_encoder("libx264"), True, "has libx264"),
+            (c.has_encoder("libx265"), False, "doesn't have libx265"),
+            (c.has_encoder("="), False, "legend isn't an encoder"),
+            (c.has_filter("scale"), True, "has scale"),
+            (c.has_filter("dynaudnorm"), True, "has dynaudnorm"),
+            (c.has_filter("loudnorm"), False, "doesn't have loudnorm"),
+            (c.can_read("pdf"), True, "convert reads PDF"),
+            (c.can_read("ps"), False, "convert doesn't read PostScript"),
+            (c.encoder("h264"), "libx264", "fastest h264 encoder"),
+            (c.encoder("hevc"), "hevc", "default hevc encoder"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_cache(self):
+        """Test that tools are only probed again if they change."""
+        self.capabilities.has_encoder("libx264")
+        with self.subTest(msg="probed once"):
+            self.assertEqual(len(self.capabilities.runs), 3)
+        later = FakeCapabilities(self.cache_path, self.tools)
+        with self.subTest(msg="later run uses the cache"):
+            self.assertTrue(later.has_encoder("libx264"))
+            self.assertEqual(later.runs, [])
+        stat = os.stat(str(self.tools["ffmpeg"]))
+        os.utime(str(self.tools["ffmpeg"]),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        upgraded = FakeCapabilities(self.cache_path, self.tools)
+        with self.subTest(msg="modified tool is probed again"):
+            self.assertTrue(upgraded.has_encoder("libx264"))
+            self.assertEqual(len(upgraded.runs), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 
+import re
 import sys
 
 from pyparsing import (
     alphanums, delimitedList, nums, oneOf,
     pythonStyleComment, replaceWith,
     Combine, Group, Literal, OneOrMore, Optional, Or,
-    ParseException, ParseSyntaxException, ParseResults,
+    ParseException, ParseSyntaxException, ParseResults, ParserElement,
     Word, ZeroOrMore,
 )
 # pyparsing documentation:
@@ -16,6 +17,24 @@ from pyparsing import (
 INPUTSPEC_DEFAULTS = {"type": None, "filename": None, "num": None}
 TIMESTAMP_DEFAULTS = {"hh": 0, "mm": 0, "ms": 0}
 
+# The grammar is only built once, by get_parser().
+_parser = None
+
+# Regular expressions for the fast path tokenizer (see fast_parse()),
+# which only recognises the most common forms of configuration.
+# Anything else is left to the full grammar.
+FAST_COMMENT = re.compile(r"#[^\n]*")
+FAST_TOKEN = re.compile(r"\s*(?:(\[[^\]\n]*\])|([^\s\[]+))")
+FAST_INPUTSPEC = re.compile(
+    r"\[(?:(?P<av>a|audio|v|video)"
+    r"(?::(?P<av_file>[A-Za-z0-9][-A-Za-z0-9_/. ]*)?(?::(?P<stream>\d+))?)?"
+    r"|(?P<frame>f|frame)"
+    r"(?::(?P<frame_file>\^|[A-Za-z0-9][-A-Za-z0-9_/. ]*)?"
+    r"(?::(?P<frame_num>\d+|-1|last))?)?)\]$")
+FAST_TIMESTAMP = re.compile(
+    r"(?:(?:(?P<hh>\d+):)?(?P<mm>\d+):)?(?P<ss>\d+)(?:\.(?P<ms>\d+))?$")
+FAST_TYPES = {"a": "audio", "v": "video", "f": "frame"}
+
 
 # see http://stackoverflow.com/questions/11180622/optional-string-segment-in-pyparsing
 def default_input_fields(fields):
@@ -143,21 +162,136 @@ def parser_bnf():
     return config
 
 
+def get_parser():
+    """Return the (cached) grammar for podcast configuration files.
+    
+    Building the grammar is relatively expensive, so it's only done
+    once. Packrat parsing is enabled at the same time, which avoids
+    re-parsing the same input when the Or alternatives backtrack.
+    """
+    global _parser
+    if _parser is None:
+        ParserElement.enablePackrat()
+        _parser = parser_bnf()
+    return _parser
+
+
+def named_results(tokens, names):
+    """Build a ParseResults from a list of tokens and their names."""
+    result = ParseResults(tokens)
+    for name, value in names.items():
+        result[name] = value
+    return result
+
+
+def fast_timestamp(token):
+    """Convert a timestamp token into ParseResults, or return None.
+    
+    The result matches what the full grammar produces: the parsed
+    fields in order, followed by the missing fields set to zero.
+    """
+    match = FAST_TIMESTAMP.match(token)
+    if not match:
+        return None
+    names = {k: int(v) for k, v in match.groupdict().items()
+             if v is not None and k != "ms"}
+    if match.group("ms") is not None:
+        names["ms"] = int(match.group("ms")[:3].ljust(3, "0"))
+    tokens = ([names[k] for k in ["hh", "mm", "ss", "ms"] if k in names] +
+              [0] * (4 - len(names)))
+    for k, v in TIMESTAMP_DEFAULTS.items():
+        names.setdefault(k, v)
+    return named_results(tokens, names)
+
+
+def fast_inputspec(token):
+    """Convert an input specification token into ParseResults.
+    
+    Returns the result (without times) and None if the token isn't
+    in one of the common forms handled by the fast path.
+    """
+    match = FAST_INPUTSPEC.match(token)
+    if not match:
+        return None
+    if match.group("av"):
+        type = match.group("av")
+        fields = [("filename", match.group("av_file")),
+                  ("num", match.group("stream"))]
+    else:
+        type = match.group("frame")
+        fields = [("filename", match.group("frame_file")),
+                  ("num", match.group("frame_num"))]
+    names = {"type": FAST_TYPES[type[0]]}
+    tokens = [names["type"]]
+    for name, value in fields:
+        if value is not None:
+            if name == "num":
+                value = -1 if value in ["-1", "last"] else int(value)
+            names[name] = value
+            tokens.append(value)
+    for k, v in INPUTSPEC_DEFAULTS.items():
+        if k not in names:
+            names[k] = v
+            tokens.append(v)
+    return tokens, names
+
+
+def fast_parse(config_string):
+    """Parse a configuration using a simple linear tokenizer.
+    
+    This only handles configurations where every segment
+    specification is of the common form "[type:filename:num]
+    timestamp timestamp ...". It returns the same structure as the
+    full grammar, or None if the configuration contains anything
+    else (including errors), so that the caller can fall back to the
+    full grammar.
+    """
+    text = FAST_COMMENT.sub("", config_string)
+    segments = []
+    tokens = names = times = None
+    pos = 0
+    end = len(text.rstrip())
+    while pos < end:
+        match = FAST_TOKEN.match(text, pos)
+        if not match:
+            return None
+        pos = match.end()
+        if match.group(1):
+            if tokens is not None:
+                segments.append((tokens, names, times))
+            inputspec = fast_inputspec(match.group(1))
+            if inputspec is None:
+                return None
+            tokens, names = inputspec
+            times = []
+        else:
+            timestamp = fast_timestamp(match.group(2))
+            if timestamp is None or tokens is None:
+                return None
+            times.append(timestamp)
+    if tokens is not None:
+        segments.append((tokens, names, times))
+    results = []
+    for tokens, names, times in segments:
+        time_results = ParseResults(times)
+        names["times"] = time_results
+        results.append(named_results(tokens + [time_results], names))
+    return ParseResults(results)
+
+
 def parse_configuration_file(config_file):
     """Parse a podcast configuration file."""
-    try:
-        parser = parser_bnf()
-        result = parser.parseFile(config_file, parseAll=True)
-    except (ParseException, ParseSyntaxException) as e:
-        print("ERROR: {m}".format(m=str(e)))
-        sys.exit(1)
-    return result
+    with open(config_file) as f:
+        return parse_configuration_string(f.read())
 
 
 def parse_configuration_string(config_string):
     """Parse a podcast configuration file."""
+    result = fast_parse(config_string)
+    if result is not None:
+        return result
     try:
-        parser = parser_bnf()
+        parser = get_parser()
         result = parser.parseString(config_string, parseAll=True)
     except (ParseException, ParseSyntaxException) as e:
         print("ERROR: {m}".format(m=str(e)))
@@ -0,0 +1,6 @@
+from frame_index.frame_index import (
+    FrameIndex,
+    difference_hash,
+    hamming_distance,
+    perceptual_hash,
+)
@@ -0,0 +1,86 @@
+import hashlib
+
+import globals
+from shell_command import FFmpegCommand
+
+
+# Size of the greyscale thumbnail used for perceptual hashing. Each
+# row of 9 pixels gives 8 bits of the 64 bit hash.
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+
+def difference_hash(pixels, width=HASH_WIDTH, height=HASH_HEIGHT):
+    """Return the difference hash (dHash) of a greyscale thumbnail.
+    
+    pixels is the thumbnail's 8 bit pixel values, row by row. Each bit
+    of the hash says whether a pixel is brighter than the pixel to its
+    right, so the hash survives scaling, compression and small changes
+    in brightness.
+    """
+    hash = 0
+    for y in range(height):
+        row = pixels[y * width:(y + 1) * width]
+        for x in range(width - 1):
+            hash = (hash << 1) | int(row[x] > row[x + 1])
+    return hash
+
+
+def hamming_distance(a, b):
+    """Return the number of bits that differ between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+def perceptual_hash(file):
+    """Return the difference hash of an image file (None on failure)."""
+    fn = "perceptual_hash"
+    command = FFmpegCommand(
+        input_options=["-i", file],
+        output_options=["-frames:v", "1",
+                        "-filter:v", "scale={w}:{h}:flags=area,format=gray"
+                        .format(w=HASH_WIDTH, h=HASH_HEIGHT),
+                        "-f", "rawvideo", "pipe:1"])
+    globals.log.debug("{fn}(): {cmd}".format(fn=fn, cmd=command))
+    pixels = command.get_binary_output()
+    if not pixels or (len(pixels) != HASH_WIDTH * HASH_HEIGHT):
+        return None
+    return difference_hash(pixels)
+
+
+class FrameIndex(object):
+    """An index of distinct frame images.
+    
+    add() returns the first image added with the same content, so
+    that duplicates can all use a single image. Images with identical
+    files are always duplicates. If threshold is not None, images
+    added with perceptual=True (e.g., frames grabbed from video, which
+    are rarely bit-for-bit identical) are also duplicates of each other
+    if their perceptual hashes differ by at most threshold bits.
+    """
+    
+    def __init__(self, threshold=None, hasher=perceptual_hash):
+        self.threshold = threshold
+        self.hasher = hasher
+        self.duplicates = 0
+        self._digests = {}
+        self._hashes = []
+    
+    def add(self, file, perceptual=False):
+        """Add an image file. Return the image to use for it."""
+        with open(str(file), "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if digest in self._digests:
+            self.duplicates += 1
+            return self._digests[digest]
+        hash = None
+        if perceptual and (self.threshold is not None):
+            hash = self.hasher(file)
+        if hash is not None:
+            for h, image in self._hashes:
+                if (hamming_distance(h, hash) <= self.threshold):
+                    self.duplicates += 1
+                    self._digests[digest] = image
+                    return image
+            self._hashes.append((hash, file))
+        self._digests[digest] = file
+        return file
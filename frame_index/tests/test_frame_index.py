@@ -0,0 +1,102 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from frame_index import FrameIndex, difference_hash, hamming_distance
+
+
+class DifferenceHashTestCase(unittest.TestCase):
+    """Test perceptual hashing."""
+
+    def test_difference_hash(self):
+        """Test hashing greyscale thumbnails."""
+        # Each row gets brighter (0 bits) or darker (1 bits) to the right.
+        brighter = bytes(range(9)) * 8
+        darker = bytes(range(9, 0, -1)) * 8
+        test_data = (
+            (difference_hash(brighter), 0, "all brighter"),
+            (difference_hash(darker), 2**64 - 1, "all darker"),
+            (difference_hash(bytes(range(9)) * 7 + bytes(range(9, 0, -1))),
+                0xff, "last row darker"),
+            (difference_hash(bytes([x + 10 for x in brighter])), 0,
+                "brightness doesn't matter"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_hamming_distance(self):
+        """Test counting differing bits."""
+        test_data = (
+            (0b1011, 0b1011, 0, "identical"),
+            (0b1011, 0b0011, 1, "one bit"),
+            (0, 2**64 - 1, 64, "all bits"),
+        )
+        for a, b, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(hamming_distance(a, b), expected)
+
+
+class FrameIndexTestCase(unittest.TestCase):
+    """Test the FrameIndex class."""
+
+    # Perceptual hashes of the test images, so that ffmpeg isn't needed.
+    HASHES = {"a.jpg": 0b0000, "b.jpg": 0b0001, "c.jpg": 0b0111,
+              "d.jpg": 0b0000}
+
+    def setUp(self):
+        """Set up some image files."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.images = {}
+        for name, content in [("a.jpg", b"a"), ("b.jpg", b"b"),
+                              ("c.jpg", b"c"), ("d.jpg", b"d"),
+                              ("a2.jpg", b"a")]:
+            self.images[name] = Path(self.directory.name, name)
+            self.images[name].write_bytes(content)
+
+    def tearDown(self):
+        """Remove the image files."""
+        self.directory.cleanup()
+
+    def hasher(self, file):
+        return self.HASHES.get(Path(file).name)
+
+    def test_identical(self):
+        """Test that identical images are always duplicates."""
+        index = FrameIndex(hasher=self.hasher)
+        images = self.images
+        test_data = (
+            (index.add(images["a.jpg"]), images["a.jpg"], "first image"),
+            (index.add(images["b.jpg"], perceptual=True), images["b.jpg"],
+                "different image"),
+            (index.add(images["a2.jpg"]), images["a.jpg"], "same content"),
+            (index.add(images["a.jpg"]), images["a.jpg"], "same file"),
+            (index.duplicates, 2, "duplicates"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_perceptual(self):
+        """Test that similar images within the threshold are duplicates."""
+        index = FrameIndex(threshold=1, hasher=self.hasher)
+        images = self.images
+        test_data = (
+            (index.add(images["a.jpg"], perceptual=True), images["a.jpg"],
+                "first image"),
+            (index.add(images["b.jpg"], perceptual=True), images["a.jpg"],
+                "one bit different"),
+            (index.add(images["c.jpg"], perceptual=True), images["c.jpg"],
+                "three bits different"),
+            (index.add(images["d.jpg"]), images["d.jpg"],
+                "not compared perceptually"),
+            (index.add(images["b.jpg"]), images["a.jpg"],
+                "same content as a duplicate"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,3 @@
+from frame_stream.frame_stream import (
+    FrameStream,
+)
@@ -0,0 +1,137 @@
+import os
+import threading
+
+import globals
+from segment import FrameSegment, SegmentError
+
+
+class FrameStream(object):
+    """Stream frame segment images into ffmpeg through a named pipe.
+
+    Rather than rasterising every frame to a temporary JPEG and adding
+    it as a separate looped input, each frame is generated as PNG data
+    and written, in timeline order, to a single image2pipe input. No
+    images are written to disk.
+
+    In the stream, the frame of the i'th frame segment starts at the
+    total duration of the frame segments before it. The stream is
+    converted to a constant frame rate (duplicating each frame until
+    the next one starts) and split, and each frame segment trims its
+    own part back out (see FrameSegment.use_stream()). As frames arrive
+    in the same order that the concat filter consumes them, none of
+    this needs to buffer more than the current frame.
+
+    frames is a list of (frame segment, previous segment) pairs, where
+    the previous segment is only needed for frames of type "^".
+    """
+    LABEL = "fstream"
+    FRAME_RATE = 25
+
+    def __init__(self, fifo, frames, width=2048, height=1536):
+        self.fifo = fifo
+        self.frames = frames
+        self.width = width
+        self.height = height
+        self.error = None
+        self._thread = None
+        self._written = False
+        start = 0
+        for i, (f, _) in enumerate(frames):
+            f.use_stream("{l}{i}".format(l=self.LABEL, i=i), start)
+            start += f.get_duration()
+
+    def input_options(self):
+        """Return the ffmpeg input options for the stream."""
+        return ["-f", "image2pipe", "-codec:v", "png", "-framerate", "1"]
+
+    def filters(self, input_index):
+        """Return the filters that turn the stream into frame segments.
+
+        input_index is the index of the stream in the ffmpeg inputs.
+        """
+        durations = [f.get_duration() for f, _ in self.frames]
+        # Map the n'th image to the start time of its frame segment.
+        pts = "+".join(["gte(N,{i})*{d}".format(i=i + 1, d=d)
+                        for i, d in enumerate(durations[:-1])]) or "0"
+        return ["[{n}:v] settb=AVTB,setpts='({p})/TB',"
+                "tpad=stop_mode=clone:stop_duration={d},fps={r},"
+                "split={c} {o}".format(
+                    n=input_index, p=pts, d=durations[-1],
+                    r=self.FRAME_RATE, c=len(self.frames),
+                    o="".join(f.input_stream_specifier()
+                              for f, _ in self.frames))]
+
+    def images(self):
+        """Generate the PNG data for each frame, in timeline order."""
+        # Images already generated for each frame segment, so that "^"
+        # frames following frame segments don't regenerate them.
+        generated = {}
+        # Images already generated for each page, so that repeated
+        # slides are only rasterised once.
+        pages = {}
+        for f, prev in self.frames:
+            if (f.input_file == "^"):
+                if isinstance(prev, FrameSegment):
+                    image = generated.get(prev.segment_number)
+                    if image is None:
+                        image = prev.generate_image(self.width, self.height)
+                else:
+                    image = prev.generate_frame_image(
+                        f.frame_number, self.width, self.height)
+            else:
+                page = (f.input_file, f.frame_number)
+                if page not in pages:
+                    pages[page] = f.generate_image(self.width, self.height)
+                image = pages[page]
+            generated[f.segment_number] = image
+            yield image
+
+    def _write(self):
+        """Write every image to the pipe (run in a separate thread)."""
+        fn = "_write"
+        try:
+            # Opening blocks until ffmpeg opens the pipe for reading.
+            with open(str(self.fifo), "wb") as pipe:
+                for i, image in enumerate(self.images()):
+                    globals.log.debug("{cls}.{fn}(): frame {i}, {n} "
+                                      "bytes".format(
+                                          cls=self.__class__.__name__,
+                                          fn=fn, i=i, n=len(image)))
+                    pipe.write(image)
+                # Set before closing the pipe, i.e., before ffmpeg can
+                # possibly see the end of the stream.
+                self._written = True
+        except (SegmentError, OSError) as e:
+            self.error = e
+
+    def start(self):
+        """Create the pipe and start writing images to it."""
+        os.mkfifo(str(self.fifo))
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def finish(self):
+        """Wait for the writer after ffmpeg has exited.
+
+        Returns True if every image was written successfully.
+        """
+        # ffmpeg has exited, so if the writer hasn't finished by now,
+        # ffmpeg stopped reading early (or never started).
+        abandoned = not self._written
+        while self._thread.is_alive():
+            # If ffmpeg never opened the pipe, the writer is still
+            # waiting to open it. Open it ourselves to release it;
+            # the writer then gets a broken pipe when it writes.
+            try:
+                os.close(os.open(str(self.fifo),
+                                 os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+            self._thread.join(timeout=0.1)
+        if abandoned and not self.error:
+            self.error = SegmentError("not all frames were read")
+        try:
+            os.remove(str(self.fifo))
+        except OSError:
+            pass
+        return self.error is None
@@ -0,0 +1,133 @@
+from datetime import timedelta
+from pathlib import Path
+import tempfile
+import unittest
+
+from frame_stream import FrameStream
+from segment import Segment, FrameSegment, VideoSegment, SegmentError
+
+
+class FakeFrameSegment(FrameSegment):
+    """A frame segment that doesn't need ImageMagick."""
+    rasterised = []
+
+    def generate_image(self, width=2048, height=1536):
+        self.rasterised.append((self.input_file, self.frame_number))
+        if self.input_file == "bad.pdf":
+            raise SegmentError("bad frame")
+        return "{f}:{n}|".format(f=self.input_file,
+                                 n=self.frame_number).encode()
+
+
+class FakeVideoSegment(VideoSegment):
+    """A video segment that doesn't need ffmpeg."""
+
+    def generate_frame_image(self, frame_number, width=2048, height=1536):
+        return "{f}@{n}|".format(f=self.input_file,
+                                 n=frame_number).encode()
+
+
+class FrameStreamTestCase(unittest.TestCase):
+    """Test the FrameStream class."""
+
+    def setUp(self):
+        """Set up a timeline of frame segments."""
+        Segment._input_files = {}
+        self.video = FakeVideoSegment(
+            file="video.mov", punch_out=timedelta(seconds=60))
+        self.last = FakeFrameSegment(
+            file="^", punch_out=timedelta(seconds=5), frame_number=-1)
+        self.slide = FakeFrameSegment(
+            file="slides.pdf", punch_out=timedelta(seconds=7.5),
+            frame_number=3)
+        self.again = FakeFrameSegment(
+            file="^", punch_out=timedelta(seconds=2), frame_number=-1)
+        self.directory = tempfile.TemporaryDirectory()
+        self.stream = FrameStream(
+            Path(self.directory.name, "frames.fifo"),
+            [(self.last, self.video), (self.slide, None),
+             (self.again, self.slide)])
+
+    def tearDown(self):
+        """Remove the pipe directory."""
+        self.directory.cleanup()
+
+    def test_use_stream(self):
+        """Test that frame segments are positioned in the stream."""
+        test_data = (
+            (self.last.trim_filter(),
+             "[fstream0] trim=start=0:duration=5.0,setpts=PTS-STARTPTS "
+             "[f{n}]".format(n=self.last.segment_number)),
+            (self.slide.trim_filter(),
+             "[fstream1] trim=start=5.0:duration=7.5,setpts=PTS-STARTPTS "
+             "[f{n}]".format(n=self.slide.segment_number)),
+            (self.again.trim_filter(),
+             "[fstream2] trim=start=12.5:duration=2.0,setpts=PTS-STARTPTS "
+             "[f{n}]".format(n=self.again.segment_number)),
+            (Segment.input_files(), {"video.mov": None}),
+        )
+        for actual, expected in test_data:
+            with self.subTest(msg=expected):
+                self.assertEqual(actual, expected)
+
+    def test_filters(self):
+        """Test the filters that split the stream."""
+        self.assertEqual(
+            self.stream.filters(3),
+            ["[3:v] settb=AVTB,setpts='(gte(N,1)*5.0+gte(N,2)*7.5)/TB',"
+             "tpad=stop_mode=clone:stop_duration=2.0,fps=25,"
+             "split=3 [fstream0][fstream1][fstream2]"])
+
+    def test_images(self):
+        """Test generating images in timeline order."""
+        self.assertEqual(
+            list(self.stream.images()),
+            [b"video.mov@-1|", b"slides.pdf:3|", b"slides.pdf:3|"])
+
+    def test_repeated_slides(self):
+        """Test that repeated slides are only rasterised once."""
+        slides = [FakeFrameSegment(file="slides.pdf",
+                                   punch_out=timedelta(seconds=1),
+                                   frame_number=n)
+                  for n in [1, 2, 1]]
+        stream = FrameStream(Path(self.directory.name, "again.fifo"),
+                             [(s, None) for s in slides])
+        FakeFrameSegment.rasterised = []
+        self.assertEqual(
+            list(stream.images()),
+            [b"slides.pdf:1|", b"slides.pdf:2|", b"slides.pdf:1|"])
+        self.assertEqual(FakeFrameSegment.rasterised,
+                         [("slides.pdf", 1), ("slides.pdf", 2)])
+
+    def test_write(self):
+        """Test writing images through the pipe."""
+        self.stream.start()
+        with open(str(self.stream.fifo), "rb") as pipe:
+            data = pipe.read()
+        test_data = (
+            (self.stream.finish(), True, "writing succeeded"),
+            (data, b"video.mov@-1|slides.pdf:3|slides.pdf:3|", "data"),
+            (self.stream.fifo.exists(), False, "pipe is removed"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_write_error(self):
+        """Test that failing to generate an image is reported."""
+        self.slide.input_file = "bad.pdf"
+        self.stream.start()
+        with open(str(self.stream.fifo), "rb") as pipe:
+            data = pipe.read()
+        self.assertFalse(self.stream.finish())
+        self.assertIsInstance(self.stream.error, SegmentError)
+        self.assertEqual(data, b"video.mov@-1|")
+
+    def test_reader_never_opens(self):
+        """Test that the writer is released if ffmpeg never reads."""
+        self.stream.start()
+        self.assertFalse(self.stream.finish())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
 import logging
+import os
+from pathlib import Path
 
 
 PROGRAM = "process_podcast"
 
 log = logging.getLogger(PROGRAM)
+
+# Default location for data kept between runs (e.g., measurements).
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or
+                 Path.home() / ".cache", PROGRAM)
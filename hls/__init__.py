@@ -0,0 +1,8 @@
+from hls.hls import (
+    audio_only,
+    codec_string,
+    media_segments,
+    variant_attributes,
+    variant_bandwidth,
+    write_master_playlist,
+)
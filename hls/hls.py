@@ -0,0 +1,123 @@
+import os
+from pathlib import Path
+
+
+# (profile_idc, constraint flags) of H.264 profiles, by ffprobe's name.
+H264_PROFILES = {"Baseline": (0x42, 0x00),
+                 "Constrained Baseline": (0x42, 0xC0),
+                 "Main": (0x4D, 0x00), "High": (0x64, 0x00),
+                 "High 10": (0x6E, 0x00)}
+# Profile and compatibility flags of HEVC profiles, by ffprobe's name.
+HEVC_PROFILES = {"Main": "1.6", "Main 10": "2.4"}
+# Object types of AAC profiles, by ffprobe's name.
+AAC_PROFILES = {"LC": 2, "HE-AAC": 5, "HE-AACv2": 29}
+# Codecs whose codec string doesn't depend on the stream.
+CODECS = {"mp3": "mp4a.40.34", "ac3": "ac-3", "eac3": "ec-3"}
+
+
+def media_segments(playlist):
+    """Return the (duration, file) of each segment in an HLS media playlist.
+    
+    Segment files are relative to the playlist's directory.
+    """
+    playlist = Path(playlist)
+    segments = []
+    duration = None
+    with playlist.open() as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((duration, playlist.parent / line))
+                duration = None
+    return segments
+
+
+def variant_bandwidth(playlist):
+    """Return the peak and average bit rates (bits/s) of a media playlist.
+    
+    These are measured from the segment files themselves, as the
+    master playlist requires.
+    """
+    peak = 0
+    total_size = 0
+    total_duration = 0
+    for duration, file in media_segments(playlist):
+        size = os.stat(str(file)).st_size
+        if (duration > 0):
+            peak = max(peak, size * 8 / duration)
+        total_size += size
+        total_duration += duration
+    average = total_size * 8 / total_duration if total_duration else 0
+    return int(round(peak)), int(round(average))
+
+
+def codec_string(stream):
+    """Return the RFC 6381 codec string of an (ffprobe) stream, or None."""
+    codec = stream.get("codec_name")
+    profile = stream.get("profile")
+    level = stream.get("level")
+    if (codec == "h264") and (profile in H264_PROFILES) and level:
+        return "avc1.{p:02X}{c:02X}{l:02X}".format(
+            p=H264_PROFILES[profile][0], c=H264_PROFILES[profile][1],
+            l=level)
+    elif (codec == "hevc") and (profile in HEVC_PROFILES) and level:
+        return "hvc1.{p}.L{l}.B0".format(p=HEVC_PROFILES[profile], l=level)
+    elif (codec == "aac") and (profile in AAC_PROFILES):
+        return "mp4a.40.{o}".format(o=AAC_PROFILES[profile])
+    return CODECS.get(codec)
+
+
+def variant_attributes(streams):
+    """Return the EXT-X-STREAM-INF attributes for a variant's streams.
+    
+    streams are the (ffprobe) streams of one of the variant's segments.
+    CODECS is left out unless every stream's codec is known.
+    """
+    attributes = []
+    codecs = [codec_string(s) for s in streams]
+    if codecs and all(codecs):
+        attributes.append('CODECS="{c}"'.format(c=",".join(codecs)))
+    for s in streams:
+        if (s.get("codec_type") == "video") and s.get("width"):
+            attributes.append("RESOLUTION={w}x{h}".format(w=s["width"],
+                                                          h=s["height"]))
+            break
+    return attributes
+
+
+def audio_only(streams):
+    """Return True if a variant's (ffprobe) streams are only audio."""
+    return bool(streams) and all(s.get("codec_type") == "audio"
+                                 for s in streams)
+
+
+def write_master_playlist(path, playlists, streams=None):
+    """Write an HLS master playlist listing the variant media playlists.
+    
+    Variants are listed in the order given, so players start with the
+    first. streams are the (ffprobe) streams of each variant (or an
+    empty list if they're unknown), from which the codecs and
+    resolution are listed. Audio only variants are left out if there's
+    any video, so that players never switch to them and lose the
+    picture (their media playlists can still be used directly).
+    """
+    path = Path(path)
+    streams = streams or [[] for p in playlists]
+    video = not all(audio_only(s) for s in streams)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for p, s in zip(playlists, streams):
+        if video and audio_only(s):
+            continue
+        peak, average = variant_bandwidth(p)
+        lines.append(",".join(
+            ["#EXT-X-STREAM-INF:BANDWIDTH={p}".format(p=peak),
+             "AVERAGE-BANDWIDTH={a}".format(a=average)] +
+            variant_attributes(s)))
+        lines.append(Path(os.path.relpath(str(p), str(path.parent)))
+                     .as_posix())
+    temp = path.with_name(path.name + ".part")
+    temp.write_text("\n".join(lines) + "\n")
+    # Players polling the directory never see a partial playlist.
+    os.replace(str(temp), str(path))
@@ -0,0 +1,130 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from hls import (
+    codec_string, media_segments, variant_bandwidth, write_master_playlist
+)
+
+
+PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:6
+#EXT-X-MEDIA-SEQUENCE:0
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXTINF:6.000000,
+segment_00000.ts
+#EXTINF:2.000000,
+segment_00001.ts
+#EXT-X-ENDLIST
+"""
+
+VIDEO = {"codec_type": "video", "codec_name": "h264", "profile": "High",
+         "level": 31, "width": 1280, "height": 720}
+AUDIO = {"codec_type": "audio", "codec_name": "aac", "profile": "LC"}
+
+
+class HLSTestCase(unittest.TestCase):
+    """Test the HLS playlist functions."""
+
+    def setUp(self):
+        """Set up two variants."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.playlists = []
+        for n, sizes in enumerate([(6000, 1000), (600, 100)]):
+            variant = Path(self.directory.name, "variant_{n}".format(n=n))
+            variant.mkdir()
+            for i, size in enumerate(sizes):
+                Path(variant, "segment_{i:05d}.ts".format(i=i)).write_bytes(
+                    bytes(size))
+            playlist = Path(variant, "index.m3u8")
+            playlist.write_text(PLAYLIST)
+            self.playlists.append(playlist)
+
+    def tearDown(self):
+        """Remove the variants."""
+        self.directory.cleanup()
+
+    def test_media_segments(self):
+        """Test reading a media playlist."""
+        variant = self.playlists[0].parent
+        self.assertEqual(media_segments(self.playlists[0]),
+                         [(6.0, variant / "segment_00000.ts"),
+                          (2.0, variant / "segment_00001.ts")])
+
+    def test_variant_bandwidth(self):
+        """Test measuring the bit rates of a variant."""
+        test_data = (
+            (self.playlists[0], (8000, 7000), "first variant"),
+            (self.playlists[1], (800, 700), "second variant"),
+        )
+        for playlist, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(variant_bandwidth(playlist), expected)
+
+    def test_write_master_playlist(self):
+        """Test writing the master playlist."""
+        master = Path(self.directory.name, "master.m3u8")
+        write_master_playlist(master, self.playlists)
+        self.assertEqual(master.read_text(), "\n".join([
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-STREAM-INF:BANDWIDTH=8000,AVERAGE-BANDWIDTH=7000",
+            "variant_0/index.m3u8",
+            "#EXT-X-STREAM-INF:BANDWIDTH=800,AVERAGE-BANDWIDTH=700",
+            "variant_1/index.m3u8",
+        ]) + "\n")
+
+    def test_codec_string(self):
+        """Test generating codec strings from ffprobe streams."""
+        test_data = (
+            (VIDEO, "avc1.64001F", "H.264 High"),
+            (dict(VIDEO, profile="Constrained Baseline", level=30),
+                "avc1.42C01E", "H.264 Constrained Baseline"),
+            (dict(VIDEO, codec_name="hevc", profile="Main", level=93),
+                "hvc1.1.6.L93.B0", "HEVC Main"),
+            (AUDIO, "mp4a.40.2", "AAC LC"),
+            ({"codec_type": "audio", "codec_name": "mp3"}, "mp4a.40.34",
+                "MP3"),
+            (dict(VIDEO, profile="Unknown"), None, "unknown profile"),
+            ({"codec_type": "video", "codec_name": "vp9"}, None,
+                "unknown codec"),
+        )
+        for stream, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(codec_string(stream), expected)
+
+    def test_master_playlist_streams(self):
+        """Test listing codecs and resolutions, and audio only variants."""
+        master = Path(self.directory.name, "master.m3u8")
+        test_data = (
+            ([[VIDEO, AUDIO], [AUDIO]], [
+                "#EXT-X-STREAM-INF:BANDWIDTH=8000,AVERAGE-BANDWIDTH=7000,"
+                'CODECS="avc1.64001F,mp4a.40.2",RESOLUTION=1280x720',
+                "variant_0/index.m3u8",
+             ], "audio only variant is left out"),
+            ([[AUDIO], [AUDIO]], [
+                "#EXT-X-STREAM-INF:BANDWIDTH=8000,AVERAGE-BANDWIDTH=7000,"
+                'CODECS="mp4a.40.2"',
+                "variant_0/index.m3u8",
+                "#EXT-X-STREAM-INF:BANDWIDTH=800,AVERAGE-BANDWIDTH=700,"
+                'CODECS="mp4a.40.2"',
+                "variant_1/index.m3u8",
+             ], "all audio only"),
+            ([[dict(VIDEO, codec_name="vp9"), AUDIO], []], [
+                "#EXT-X-STREAM-INF:BANDWIDTH=8000,AVERAGE-BANDWIDTH=7000,"
+                "RESOLUTION=1280x720",
+                "variant_0/index.m3u8",
+                "#EXT-X-STREAM-INF:BANDWIDTH=800,AVERAGE-BANDWIDTH=700",
+                "variant_1/index.m3u8",
+             ], "unknown codec and streams"),
+        )
+        for streams, expected, description in test_data:
+            with self.subTest(msg=description):
+                write_master_playlist(master, self.playlists, streams)
+                self.assertEqual(master.read_text(), "\n".join(
+                    ["#EXTM3U", "#EXT-X-VERSION:3"] + expected) + "\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
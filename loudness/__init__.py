@@ -0,0 +1,4 @@
+from loudness.loudness import (
+    LoudnessCache,
+    LoudnessMeasurement,
+)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+import globals
+
+
+class LoudnessCache(object):
+    """Loudness measurements of audio timelines, kept between runs.
+
+    Measurements are keyed by a hash of the audio segment list (input
+    files with their size and modification time, streams and punch
+    points) and the loudness target, so any change to the audio
+    invalidates them.
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @staticmethod
+    def key(segments, target):
+        """Return the cache key for a list of audio segments."""
+        description = [LoudnessCache.VERSION, target]
+        for s in segments:
+            try:
+                stat = os.stat(str(s.input_file))
+                identity = [str(Path(s.input_file).resolve()),
+                            stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                identity = [str(s.input_file), None, None]
+            description.append(identity + [
+                s.input_stream, s.punch_in.total_seconds(),
+                s.punch_out.total_seconds()])
+        return hashlib.sha1(json.dumps(description).encode()).hexdigest()
+
+    def _load(self):
+        """Return all cached measurements."""
+        try:
+            with self.path.open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        """Return the cached measurement for key, or None."""
+        return self._load().get(key)
+
+    def put(self, key, measurement):
+        """Cache a measurement.
+
+        The cache file is replaced atomically, so concurrent jobs never
+        see a partly written file (although one may lose the other's
+        measurement).
+        """
+        fn = "put"
+        cache = self._load()
+        cache[key] = measurement
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=str(self.path.parent),
+                                        prefix=self.path.name)
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f, indent=4)
+            os.replace(temp, str(self.path))
+        except OSError as e:
+            globals.log.warning("can't write loudness cache: {e}".format(e=e))
+            globals.log.debug("{cls}.{fn}(): {e!r}".format(
+                cls=self.__class__.__name__, fn=fn, e=e))
+
+
+class LoudnessMeasurement(object):
+    """Measure the loudness of the audio timeline in the background.
+
+    command is an FFmpegLoudnessCommand that measures the audio. If
+    the cache already has a measurement for key, the command isn't run
+    at all.
+    """
+    # Values required for linear normalisation.
+    FIELDS = ["input_i", "input_tp", "input_lra", "input_thresh",
+              "target_offset"]
+
+    def __init__(self, command, cache, key):
+        self.command = command
+        self.cache = cache
+        self.key = key
+        self.cached = False
+        self._measurement = None
+        self._thread = None
+
+    @staticmethod
+    def valid(measurement):
+        """Return True if measurement can be used for normalisation.
+
+        Silent audio, for example, measures as -inf.
+        """
+        try:
+            return all(math.isfinite(float(measurement[f]))
+                       for f in LoudnessMeasurement.FIELDS)
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    def _measure(self):
+        """Run the measurement command (in a separate thread)."""
+        if self.command.run() == 0:
+            measurement = self.command.measurement()
+            if self.valid(measurement):
+                self._measurement = measurement
+                self.cache.put(self.key, measurement)
+
+    def start(self):
+        """Start measuring, unless the measurement is cached."""
+        measurement = self.cache.get(self.key)
+        if self.valid(measurement):
+            self._measurement = measurement
+            self.cached = True
+        else:
+            self._thread = threading.Thread(target=self._measure,
+                                            daemon=True)
+            self._thread.start()
+
+    def result(self):
+        """Wait for the measurement and return it (None if it failed)."""
+        if self._thread:
+            self._thread.join()
+        return self._measurement
@@ -0,0 +1,139 @@
+from datetime import timedelta
+from pathlib import Path
+import tempfile
+import unittest
+
+from loudness import LoudnessCache, LoudnessMeasurement
+from segment import Segment, AudioSegment
+
+
+MEASUREMENT = {"input_i": "-27.5", "input_tp": "-8.1", "input_lra": "6.2",
+               "input_thresh": "-38.0", "output_i": "-16.0",
+               "target_offset": "0.4"}
+
+
+class FakeCommand(object):
+    """A measurement command that doesn't need ffmpeg."""
+
+    def __init__(self, status=0, measurement=MEASUREMENT):
+        self.status = status
+        self._measurement = measurement
+        self.runs = 0
+
+    def run(self):
+        self.runs += 1
+        return self.status
+
+    def measurement(self):
+        return self._measurement
+
+
+class LoudnessCacheTestCase(unittest.TestCase):
+    """Test the LoudnessCache class."""
+
+    def setUp(self):
+        """Set up an audio file and segments."""
+        Segment._input_files = {}
+        self.directory = tempfile.TemporaryDirectory()
+        self.audio = Path(self.directory.name, "audio.wav")
+        self.audio.write_bytes(b"RIFF")
+        self.segments = [
+            AudioSegment(file=self.audio, punch_in=timedelta(seconds=0),
+                         punch_out=timedelta(seconds=10)),
+            AudioSegment(file=self.audio, punch_in=timedelta(seconds=20),
+                         punch_out=timedelta(seconds=30)),
+        ]
+        self.cache = LoudnessCache(Path(self.directory.name, "cache",
+                                        "loudness.json"))
+
+    def tearDown(self):
+        """Remove the audio file and cache."""
+        self.directory.cleanup()
+
+    def test_key(self):
+        """Test that the key changes whenever the audio does."""
+        key = LoudnessCache.key(self.segments, -16)
+        test_data = (
+            (LoudnessCache.key(self.segments, -16), True, "same audio"),
+            (LoudnessCache.key(self.segments, -23), False,
+                "different target"),
+            (LoudnessCache.key(self.segments[:1], -16), False,
+                "different segments"),
+            (LoudnessCache.key(self.segments[::-1], -16), False,
+                "different order"),
+        )
+        for other, same, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(other == key, same)
+        self.audio.write_bytes(b"RIFF, but longer")
+        with self.subTest(msg="modified input file"):
+            self.assertNotEqual(LoudnessCache.key(self.segments, -16), key)
+
+    def test_get_put(self):
+        """Test caching measurements."""
+        self.assertIsNone(self.cache.get("key"))
+        self.cache.put("key", MEASUREMENT)
+        self.cache.put("other", {})
+        self.assertEqual(self.cache.get("key"), MEASUREMENT)
+        # Another cache object for the same file (i.e., a later run).
+        self.assertEqual(LoudnessCache(self.cache.path).get("key"),
+                         MEASUREMENT)
+
+
+class LoudnessMeasurementTestCase(unittest.TestCase):
+    """Test the LoudnessMeasurement class."""
+
+    def setUp(self):
+        """Set up a cache."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = LoudnessCache(Path(self.directory.name, "loudness.json"))
+
+    def tearDown(self):
+        """Remove the cache."""
+        self.directory.cleanup()
+
+    def test_valid(self):
+        """Test checking measurements."""
+        silent = dict(MEASUREMENT, input_i="-inf")
+        test_data = (
+            (MEASUREMENT, True, "complete measurement"),
+            (silent, False, "silence"),
+            ({"input_i": "-27.5"}, False, "incomplete measurement"),
+            (None, False, "no measurement"),
+        )
+        for measurement, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(LoudnessMeasurement.valid(measurement),
+                                 expected)
+
+    def test_measure(self):
+        """Test measuring and caching."""
+        command = FakeCommand()
+        measurement = LoudnessMeasurement(command, self.cache, "key")
+        measurement.start()
+        self.assertEqual(measurement.result(), MEASUREMENT)
+        self.assertFalse(measurement.cached)
+        self.assertEqual(self.cache.get("key"), MEASUREMENT)
+        # A second run with the same audio uses the cache.
+        measurement = LoudnessMeasurement(command, self.cache, "key")
+        measurement.start()
+        self.assertEqual(measurement.result(), MEASUREMENT)
+        self.assertTrue(measurement.cached)
+        self.assertEqual(command.runs, 1)
+
+    def test_failure(self):
+        """Test that failed measurements aren't used or cached."""
+        test_data = (
+            (FakeCommand(status=1), "command failed"),
+            (FakeCommand(measurement=None), "nothing measured"),
+        )
+        for command, description in test_data:
+            with self.subTest(msg=description):
+                measurement = LoudnessMeasurement(command, self.cache, "key")
+                measurement.start()
+                self.assertIsNone(measurement.result())
+                self.assertIsNone(self.cache.get("key"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,5 @@
+from pcm_audio.pcm_audio import (
+    PCMAssembler,
+    PCMSource,
+    sample_offset,
+)
@@ -0,0 +1,175 @@
+from datetime import timedelta
+import mmap
+import struct
+
+import globals
+
+
+# WAVE format tags for integer PCM, and for WAVE_FORMAT_EXTENSIBLE
+# (whose sub-format then says what the samples really are).
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def sample_offset(time, rate):
+    """Return the offset of time (a timedelta) in samples, rounded.
+    
+    Integer arithmetic keeps this exact, so the same time always maps
+    to the same sample.
+    """
+    microseconds = time // timedelta(microseconds=1)
+    return (microseconds * rate + 500000) // 1000000
+
+
+class PCMSource(object):
+    """A PCM WAV file, memory-mapped so that its samples can be sliced.
+    
+    Raises ValueError if the file isn't integer PCM WAV.
+    """
+    
+    def __init__(self, file):
+        self.file = file
+        self._mmap = None
+        self._file = None
+        with open(str(file), "rb") as f:
+            header = f.read(12)
+            if (len(header) < 12) or (header[0:4] != b"RIFF") or \
+                    (header[8:12] != b"WAVE"):
+                raise ValueError("{f} is not a WAV file".format(f=file))
+            self.format = None
+            while True:
+                chunk = f.read(8)
+                if (len(chunk) < 8):
+                    raise ValueError("{f} has no data".format(f=file))
+                id, size = struct.unpack("<4sI", chunk)
+                if (id == b"fmt "):
+                    self._read_format(f.read(size))
+                    # Chunks are padded to an even size.
+                    f.seek(size % 2, 1)
+                elif (id == b"data"):
+                    if not self.format:
+                        raise ValueError(
+                            "{f} has no format chunk".format(f=file))
+                    self.data_offset = f.tell()
+                    break
+                else:
+                    f.seek(size + size % 2, 1)
+            # Streamed WAV files often have a placeholder data size,
+            # so believe the file itself instead.
+            available = f.seek(0, 2) - self.data_offset
+            self.data_size = min(size, available)
+            self.data_size -= self.data_size % self.block_align
+    
+    def _read_format(self, chunk):
+        """Read the fmt chunk."""
+        if (len(chunk) < 16):
+            raise ValueError("{f} has a bad format chunk".format(f=self.file))
+        tag, channels, rate, _, block_align, bits = struct.unpack(
+            "<HHIIHH", chunk[:16])
+        if (tag == WAVE_FORMAT_EXTENSIBLE) and (len(chunk) >= 26):
+            # The sub-format GUID starts with the real format tag.
+            tag = struct.unpack("<H", chunk[24:26])[0]
+        if (tag != WAVE_FORMAT_PCM) or not channels or not block_align:
+            raise ValueError("{f} is not PCM".format(f=self.file))
+        self.format = (channels, rate, bits)
+        self.channels = channels
+        self.rate = rate
+        self.block_align = block_align
+    
+    @property
+    def frame_count(self):
+        """Return the number of sample frames in the file."""
+        return self.data_size // self.block_align
+    
+    def samples(self, start, count):
+        """Return a view of count sample frames from start.
+        
+        The view stops early at the end of the file (as trimming does
+        in ffmpeg).
+        """
+        if not self._mmap:
+            self._file = open(str(self.file), "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        start = min(start, self.frame_count)
+        end = min(start + count, self.frame_count)
+        return memoryview(self._mmap)[
+            self.data_offset + start * self.block_align:
+            self.data_offset + end * self.block_align]
+    
+    def close(self):
+        """Release the memory map."""
+        if self._mmap:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+
+class PCMAssembler(object):
+    """Assemble a timeline of audio segments from PCM WAV sources.
+    
+    Each segment's samples are sliced straight out of its memory-mapped
+    source and written in order to a single PCM WAV file, so nothing is
+    decoded. This only works if all the sources are PCM WAV with the
+    same format (see supported()).
+    """
+    # The WAV header has 32 bit sizes.
+    MAX_DATA_SIZE = 0xFFFFFFFF - 36
+    
+    def __init__(self, segments):
+        self.segments = segments
+        self._sources = {}
+    
+    def source(self, file):
+        """Return the PCMSource for file."""
+        if file not in self._sources:
+            self._sources[file] = PCMSource(file)
+        return self._sources[file]
+    
+    def _extent(self, segment):
+        """Return the first sample frame and frame count of segment."""
+        source = self.source(segment.input_file)
+        start = sample_offset(segment.punch_in, source.rate)
+        count = sample_offset(segment.punch_out - segment.punch_in,
+                              source.rate)
+        return start, max(0, min(count, source.frame_count - start))
+    
+    def supported(self):
+        """Return True if the segments can be assembled natively."""
+        fn = "supported"
+        try:
+            formats = {self.source(s.input_file).format
+                       for s in self.segments}
+            block_align = self.source(self.segments[0].input_file).block_align
+            size = sum(self._extent(s)[1] for s in self.segments) * \
+                block_align
+        except (OSError, ValueError, IndexError) as e:
+            globals.log.debug("{cls}.{fn}(): {e}".format(
+                cls=self.__class__.__name__, fn=fn, e=e))
+            return False
+        return (len(formats) == 1) and (size <= self.MAX_DATA_SIZE)
+    
+    def assemble(self, output):
+        """Write the assembled audio to output.
+        
+        Returns the duration of the output in seconds.
+        """
+        first = self.source(self.segments[0].input_file)
+        extents = [self._extent(s) for s in self.segments]
+        frames = sum(count for _, count in extents)
+        size = frames * first.block_align
+        try:
+            with open(str(output), "wb") as f:
+                f.write(struct.pack(
+                    "<4sI4s4sIHHIIHH4sI", b"RIFF", size + 36, b"WAVE",
+                    b"fmt ", 16, WAVE_FORMAT_PCM, first.channels, first.rate,
+                    first.rate * first.block_align, first.block_align,
+                    first.format[2], b"data", size))
+                for s, (start, count) in zip(self.segments, extents):
+                    with self.source(s.input_file).samples(start,
+                                                           count) as view:
+                        f.write(view)
+        finally:
+            for s in self._sources.values():
+                s.close()
+        return frames / first.rate
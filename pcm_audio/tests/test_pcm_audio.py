@@ -0,0 +1,146 @@
+from datetime import timedelta
+from pathlib import Path
+import struct
+import tempfile
+import unittest
+import wave
+
+from pcm_audio import PCMAssembler, PCMSource, sample_offset
+from segment import Segment, AudioSegment
+
+
+RATE = 8000
+
+
+def write_wave(path, samples, rate=RATE, channels=1):
+    """Write 16 bit samples to a PCM WAV file."""
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(struct.pack("<{n}h".format(n=len(samples)), *samples))
+
+
+def read_wave(path):
+    """Return the parameters and 16 bit samples of a PCM WAV file."""
+    with wave.open(str(path), "rb") as w:
+        frames = w.readframes(w.getnframes())
+        return ((w.getnchannels(), w.getframerate()),
+                list(struct.unpack("<{n}h".format(n=len(frames) // 2),
+                                   frames)))
+
+
+class SampleOffsetTestCase(unittest.TestCase):
+    """Test the sample_offset() function."""
+
+    def test_sample_offset(self):
+        """Test converting times to sample offsets."""
+        test_data = (
+            (timedelta(), 0, "zero"),
+            (timedelta(seconds=1), 8000, "whole seconds"),
+            (timedelta(seconds=0.1), 800, "fractional seconds"),
+            (timedelta(microseconds=62), 0, "rounds down"),
+            (timedelta(microseconds=63), 1, "rounds up"),
+            (timedelta(hours=2), 57600000, "long times"),
+        )
+        for time, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(sample_offset(time, RATE), expected)
+
+
+class PCMAssemblerTestCase(unittest.TestCase):
+    """Test the PCMSource and PCMAssembler classes."""
+
+    def setUp(self):
+        """Set up some WAV files."""
+        Segment._input_files = {}
+        self.directory = tempfile.TemporaryDirectory()
+        self.one = Path(self.directory.name, "one.wav")
+        write_wave(self.one, range(RATE))
+        self.two = Path(self.directory.name, "two.wav")
+        write_wave(self.two, [-s for s in range(RATE)])
+        self.output = Path(self.directory.name, "output.wav")
+
+    def tearDown(self):
+        """Remove the WAV files."""
+        self.directory.cleanup()
+
+    def segment(self, file, punch_in, punch_out):
+        """Return an audio segment (times in samples)."""
+        return AudioSegment(file=file,
+                            punch_in=timedelta(seconds=punch_in / RATE),
+                            punch_out=timedelta(seconds=punch_out / RATE))
+
+    def test_source(self):
+        """Test reading WAV headers."""
+        source = PCMSource(self.one)
+        test_data = (
+            (source.format, (1, RATE, 16), "format"),
+            (source.data_offset, 44, "data offset"),
+            (source.frame_count, RATE, "frame count"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_not_pcm(self):
+        """Test that other files are rejected."""
+        other = Path(self.directory.name, "other.mp3")
+        other.write_bytes(b"ID3" + bytes(100))
+        with self.assertRaises(ValueError):
+            PCMSource(other)
+
+    def test_supported(self):
+        """Test checking whether segments can be assembled."""
+        stereo = Path(self.directory.name, "stereo.wav")
+        write_wave(stereo, range(RATE * 2), channels=2)
+        faster = Path(self.directory.name, "faster.wav")
+        write_wave(faster, range(RATE), rate=RATE * 2)
+        other = Path(self.directory.name, "other.mp3")
+        other.write_bytes(b"ID3" + bytes(100))
+        test_data = (
+            ([self.one, self.two], True, "same format"),
+            ([self.one, stereo], False, "different channels"),
+            ([self.one, faster], False, "different rates"),
+            ([self.one, other], False, "not WAV"),
+            ([self.one, Path(self.directory.name, "missing.wav")], False,
+             "missing file"),
+            ([], False, "no segments"),
+        )
+        for files, expected, description in test_data:
+            with self.subTest(msg=description):
+                assembler = PCMAssembler(
+                    [self.segment(f, 0, 100) for f in files])
+                self.assertEqual(assembler.supported(), expected)
+
+    def test_assemble(self):
+        """Test assembling segments."""
+        assembler = PCMAssembler([
+            self.segment(self.one, 100, 200),
+            self.segment(self.two, 10, 20),
+            self.segment(self.one, 0, 5),
+            # Past the end of the file.
+            self.segment(self.two, RATE - 3, RATE + 100),
+        ])
+        self.assertTrue(assembler.supported())
+        duration = assembler.assemble(self.output)
+        expected = (list(range(100, 200)) + [-s for s in range(10, 20)] +
+                    list(range(5)) + [-s for s in range(RATE - 3, RATE)])
+        test_data = (
+            (read_wave(self.output), ((1, RATE), expected), "samples"),
+            (duration, len(expected) / RATE, "duration"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_placeholder_size(self):
+        """Test that a streamed WAV's placeholder data size is ignored."""
+        data = bytearray(self.one.read_bytes())
+        data[40:44] = struct.pack("<I", 0xFFFFFFFF)
+        self.one.write_bytes(bytes(data))
+        self.assertEqual(PCMSource(self.one).frame_count, RATE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,4 @@
+from planner.planner import (
+    Plan,
+    StageHistory,
+)
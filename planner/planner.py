@@ -0,0 +1,160 @@
+import json
+import os
+from pathlib import Path
+import tempfile
+
+import globals
+from resource_usage import human_size
+
+
+class StageHistory(object):
+    """CPU time and intermediate disk use of past runs, for each stage.
+
+    Each stage's work is measured in its own units (see UNITS), and the
+    history accumulates the cost of each unit separately for full
+    renders and previews. Until a stage has been recorded, rough
+    defaults are used instead.
+    """
+    VERSION = 1
+    STAGES = ["probe", "frames", "render"]
+    UNITS = {"probe": "files", "frames": "frames", "render": "seconds"}
+    # (CPU seconds, bytes of intermediates) per unit.
+    DEFAULT_COSTS = {
+        "full": {"probe": (0.05, 0), "frames": (0.5, 500000),
+                 "render": (1.0, 200000)},
+        "preview": {"probe": (0.05, 0), "frames": (0.1, 50000),
+                    "render": (0.1, 200000)},
+    }
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def _load(self):
+        """Return the whole history."""
+        try:
+            with self.path.open() as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if (history.get("version") != self.VERSION):
+            return {}
+        return history.get("modes", {})
+
+    def record(self, mode, units, cpu_times, disk):
+        """Add a run's units, CPU times and disk use (dicts by stage).
+
+        Stages without any units of work are ignored.
+        """
+        fn = "record"
+        history = self._load()
+        for stage in self.STAGES:
+            if not units.get(stage):
+                continue
+            totals = history.setdefault(mode, {}).setdefault(
+                stage, {"runs": 0, "units": 0, "cpu_time": 0.0, "disk": 0})
+            totals["runs"] += 1
+            totals["units"] += units[stage]
+            totals["cpu_time"] += cpu_times.get(stage, 0.0)
+            totals["disk"] += disk.get(stage, 0)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=str(self.path.parent),
+                                        prefix=self.path.name)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": self.VERSION, "modes": history}, f,
+                          indent=4)
+            os.replace(temp, str(self.path))
+        except OSError as e:
+            globals.log.warning("can't write stage history: {e}".format(e=e))
+            globals.log.debug("{cls}.{fn}(): {e!r}".format(
+                cls=self.__class__.__name__, fn=fn, e=e))
+
+    def costs(self, mode):
+        """Return {stage: (CPU time, disk, runs)} per unit for mode.
+
+        runs is the number of runs that the costs are based on (0 for
+        the defaults).
+        """
+        history = self._load().get(mode, {})
+        costs = {}
+        for stage in self.STAGES:
+            totals = history.get(stage)
+            if totals and totals["units"]:
+                costs[stage] = (totals["cpu_time"] / totals["units"],
+                                totals["disk"] / totals["units"],
+                                totals["runs"])
+            else:
+                costs[stage] = self.DEFAULT_COSTS[mode][stage] + (0,)
+        return costs
+
+
+class Plan(object):
+    """The execution plan of a job: its stages, their costs and problems.
+
+    A job with problems would fail (or produce the wrong result), so it
+    shouldn't be run.
+    """
+
+    def __init__(self, costs):
+        self.costs = costs
+        self.stages = []
+        self.problems = []
+
+    def add_stage(self, stage, units, description=""):
+        """Add a stage of units of work, estimating its cost."""
+        cpu_time, disk, runs = self.costs[stage]
+        self.stages.append({
+            "stage": stage, "units": units, "description": description,
+            "cpu_time": units * cpu_time, "disk": int(units * disk),
+            "runs": runs})
+
+    def problem(self, message):
+        """Record a problem with the job."""
+        self.problems.append(message)
+
+    def ok(self):
+        """Return True if the job has no problems."""
+        return not self.problems
+
+    def total_cpu_time(self):
+        """Return the estimated CPU time of the whole job."""
+        return sum(s["cpu_time"] for s in self.stages)
+
+    def total_disk(self):
+        """Return the estimated peak size of the job's intermediates.
+
+        Intermediates are kept until the end of the job, so this is the
+        sum over all stages.
+        """
+        return sum(s["disk"] for s in self.stages)
+
+    def table(self):
+        """Return a printable table of the stages and their costs."""
+        header = "{:<8} {:>16} {:>9} {:>10}  {}".format(
+            "stage", "work", "cpu (s)", "disk", "estimate from")
+        row = "{:<8} {:>16} {:>9.1f} {:>10}  {}"
+        lines = [header, "-" * len(header)]
+        for s in self.stages:
+            lines.append(row.format(
+                s["stage"], "{u:g} {n}".format(
+                    u=round(s["units"], 1),
+                    n=StageHistory.UNITS[s["stage"]]),
+                s["cpu_time"], human_size(s["disk"]),
+                "{r} run{s}".format(r=s["runs"],
+                                    s="" if s["runs"] == 1 else "s")
+                if s["runs"] else "defaults"))
+            if s["description"]:
+                lines.append("         {d}".format(d=s["description"]))
+        lines.append("-" * len(header))
+        lines.append(row.format("total", "", self.total_cpu_time(),
+                                human_size(self.total_disk()), ""))
+        return "\n".join(lines).rstrip()
+
+    def as_dict(self):
+        """Return the plan as a dictionary (e.g., for JSON output)."""
+        return {
+            "stages": self.stages,
+            "total_cpu_time": self.total_cpu_time(),
+            "total_disk": self.total_disk(),
+            "problems": self.problems,
+        }
@@ -0,0 +1,98 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from planner import Plan, StageHistory
+
+
+class StageHistoryTestCase(unittest.TestCase):
+    """Test the StageHistory class."""
+
+    def setUp(self):
+        """Set up an empty history."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.history = StageHistory(Path(self.directory.name, "cache",
+                                         "history.json"))
+
+    def tearDown(self):
+        """Remove the history."""
+        self.directory.cleanup()
+
+    def test_defaults(self):
+        """Test that the defaults are used without a history."""
+        for mode in ["full", "preview"]:
+            with self.subTest(msg=mode):
+                self.assertEqual(
+                    self.history.costs(mode),
+                    {s: c + (0,) for s, c in
+                     StageHistory.DEFAULT_COSTS[mode].items()})
+
+    def test_record(self):
+        """Test that recorded runs replace the defaults."""
+        self.history.record("full", {"frames": 10, "render": 100},
+                            {"frames": 4.0, "render": 50.0},
+                            {"frames": 1000, "render": 20000})
+        self.history.record("full", {"probe": 0, "render": 300},
+                            {"probe": 1.0, "render": 250.0}, {})
+        # Another history object for the same file (i.e., a later run).
+        costs = StageHistory(self.history.path).costs("full")
+        test_data = (
+            (costs["frames"], (0.4, 100.0, 1), "one run"),
+            (costs["render"], (0.75, 50.0, 2), "two runs"),
+            (costs["probe"], StageHistory.DEFAULT_COSTS["full"]["probe"] +
+                (0,), "stage without work isn't recorded"),
+            (self.history.costs("preview")["render"],
+                StageHistory.DEFAULT_COSTS["preview"]["render"] + (0,),
+                "other mode"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_corrupt(self):
+        """Test that an unreadable history is ignored."""
+        self.history.path.parent.mkdir()
+        self.history.path.write_text("{")
+        self.assertEqual(self.history.costs("full")["render"][2], 0)
+
+
+class PlanTestCase(unittest.TestCase):
+    """Test the Plan class."""
+
+    def setUp(self):
+        """Set up a plan."""
+        self.plan = Plan({"probe": (0.1, 0, 0), "frames": (0.5, 1000, 3),
+                          "render": (2.0, 100, 3)})
+
+    def test_estimates(self):
+        """Test estimating the cost of each stage."""
+        self.plan.add_stage("probe", 4)
+        self.plan.add_stage("frames", 10, "rasterise 10 slides")
+        self.plan.add_stage("render", 60.5)
+        test_data = (
+            ([s["cpu_time"] for s in self.plan.stages], [0.4, 5.0, 121.0],
+                "CPU time per stage"),
+            ([s["disk"] for s in self.plan.stages], [0, 10000, 6050],
+                "disk per stage"),
+            (self.plan.total_cpu_time(), 126.4, "total CPU time"),
+            (self.plan.total_disk(), 16050, "total disk"),
+            (len(self.plan.table().splitlines()), 8, "table rows"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertAlmostEqual(actual, expected)
+
+    def test_problems(self):
+        """Test recording problems."""
+        with self.subTest(msg="no problems"):
+            self.assertTrue(self.plan.ok())
+        self.plan.problem("missing file")
+        with self.subTest(msg="problem"):
+            self.assertFalse(self.plan.ok())
+        with self.subTest(msg="reported"):
+            self.assertEqual(self.plan.as_dict()["problems"],
+                             ["missing file"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,23 +1,90 @@
 #!/usr/bin/env python3
 
 import argparse
+import copy
 import datetime
+import hashlib
+import json
 import logging
+import os
 from pathlib import Path, PurePath
+import re
+import shutil
+import signal
 import sys
+import threading
 
 from pyparsing import ParseResults
 
 import globals
+from capabilities import Capabilities
 from config_parser import (
-    parse_configuration_file, parse_configuration_string
+    fast_timestamp, parse_configuration_file, parse_configuration_string
 )
+from frame_index import FrameIndex
+from frame_stream import FrameStream
+from hls import media_segments, write_master_playlist
+from loudness import LoudnessCache, LoudnessMeasurement
+from pcm_audio import PCMAssembler
+from planner import Plan, StageHistory
 from progress_bar import ProgressBar
+from proxy import ProxyCache
+from rasteriser import RASTERISERS, make_rasteriser
+from resource_usage import ResourceAccountant
+from scratch import Checkpoint, ScratchWorkspace
 from segment import (
     Segment, AudioSegment, VideoSegment,
     FrameSegment, SegmentError
 )
-from shell_command import FFprobeCommand, FFmpegConcatCommand
+from shell_command import (
+    ConvertCommand, FFprobeCommand, FFmpegCommand, FFmpegConcatCommand,
+    FFmpegLoudnessCommand, ShellCommand
+)
+from thumbnails import Thumbnails
+from work_queue import WorkQueue
+
+
+# Previews are scaled down to (at most) this height early in the
+# filtergraph, with slides rasterised at a correspondingly low density
+# and everything encoded as fast as possible at a low bitrate.
+PREVIEW_HEIGHT = 360
+PREVIEW_DENSITY = 72
+PREVIEW_BITRATE = "300k"
+# Frame inputs that are used as is, without rasterising.
+FRAME_IMAGE_SUFFIXES = [".jpg", ".jpeg", ".png"]
+# Video encoders that support "-preset ultrafast" (see choose_encoders()).
+FAST_PRESET_ENCODERS = ["libx264", "libx265"]
+# Long podcasts are rendered in batches of (by default) this many
+# segments, each to a lossless intermediate file, which are then
+# concatenated. This bounds the number of inputs (and decoders) that
+# ffmpeg has open at once.
+BATCH_SIZE = 100
+INTERMEDIATE_AUDIO = ("pcm_s16le", ".wav")
+INTERMEDIATE_VIDEO = ("ffv1", ".mkv")
+# The final video of a resumable render (see --resume) is encoded in
+# chunks of about this many seconds.
+RESUME_CHUNK_DURATION = 300
+
+# Containers that can be written progressively (see --stream-output),
+# and the default maximum fragment duration (seconds).
+STREAM_FORMATS = ["mp4", "mpegts", "matroska"]
+FRAGMENT_DURATION = 2
+
+# Settings that don't affect the rendered output, so changing them
+# doesn't stop a render from being resumed (see --resume).
+RESUME_IGNORED = ["quiet", "debug", "keep", "resume", "report",
+                  "resource_usage", "scratch", "tmpfs", "cache_dir",
+                  "queue", "queue_timeout"]
+
+# Default interval between scrubbing thumbnails (seconds).
+THUMBNAIL_INTERVAL = 10
+
+# Default duration of HLS segments (seconds).
+HLS_TIME = 6
+
+# Settings that can be given for each rendition (see --rendition).
+RENDITION_KEYS = ["height", "video_codec", "video_bitrate", "audio_codec",
+                  "audio_bitrate"]
 
 
 class InputStreamAction(argparse.Action):
@@ -32,6 +99,77 @@ class InputStreamAction(argparse.Action):
             setattr(namespace, 'video_stream_number', stream)
 
 
+def time_window(value):
+    """Convert a --range argument ("START-END") into a pair of timedeltas.
+    
+    Either end can be omitted (e.g., "10:00-" renders from 10 minutes
+    to the end), in which case it is None.
+    """
+    window = []
+    for t in value.split("-") if value.count("-") == 1 else [value]:
+        timestamp = fast_timestamp(t.strip()) if t.strip() else None
+        if t.strip() and timestamp is None:
+            raise argparse.ArgumentTypeError(
+                'invalid time range "{v}"'.format(v=value))
+        window.append(datetime.timedelta(
+            hours=timestamp["hh"], minutes=timestamp["mm"],
+            seconds=timestamp["ss"], milliseconds=timestamp["ms"])
+            if timestamp else None)
+    if ((len(window) != 2) or (window == [None, None])
+            or ((None not in window) and (window[0] >= window[1]))):
+        raise argparse.ArgumentTypeError(
+            'invalid time range "{v}"'.format(v=value))
+    return window[0] or datetime.timedelta(), window[1]
+
+
+def segment_window(value):
+    """Convert a --segments argument ("I..J") into a pair of positions.
+    
+    Positions start at 1. Either end can be omitted, and a single
+    position selects just that segment. A missing end is None.
+    """
+    ends = value.split("..") if ".." in value else [value, value]
+    try:
+        first, last = [int(e) if e.strip() else None for e in ends]
+    except ValueError:
+        first = last = 0
+    if ((len(ends) != 2) or (first is not None and first < 1)
+            or (last is not None and last < (first or 1))):
+        raise argparse.ArgumentTypeError(
+            'invalid segment range "{v}"'.format(v=value))
+    return first or 1, last
+
+
+def rendition(value):
+    """Convert a --rendition argument ("FILE[:KEY=VALUE,...]") into a dict.
+    
+    Keys are height, video_codec, video_bitrate, audio_codec and
+    audio_bitrate; video=no or audio=no leaves that stream out.
+    Missing keys are None (i.e., the same as the main output).
+    """
+    file, _, spec = value.partition(":")
+    result = dict.fromkeys(RENDITION_KEYS)
+    result.update(file=file, audio=True, video=True)
+    try:
+        for item in spec.split(",") if spec else []:
+            key, setting = [v.strip() for v in item.split("=")]
+            if key in ["audio", "video"] and setting in ["yes", "no"]:
+                result[key] = (setting == "yes")
+            elif key == "height" and int(setting) > 0:
+                result[key] = int(setting)
+            elif key in RENDITION_KEYS and key != "height" and setting:
+                result[key] = setting
+            else:
+                raise ValueError
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'invalid rendition "{v}"'.format(v=value))
+    if not (file and (result["audio"] or result["video"])):
+        raise argparse.ArgumentTypeError(
+            'invalid rendition "{v}"'.format(v=value))
+    return result
+
+
 def parse_command_line():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -103,6 +241,21 @@ def parse_command_line():
         help="Disable normalisation of the source audio level (implied by "
             "--copy-audio).")
     
+    parser.add_argument(
+        "--loudness", metavar="LUFS", nargs="?", type=float, const=-16.0,
+        help="Normalise the audio to an EBU R128 integrated loudness "
+            "target (default -16 LUFS) instead of using dynamic "
+            "normalisation. The loudness is measured in a separate pass "
+            "while frames are processed, and cached so that re-rendering "
+            "the same audio doesn't measure it again (implies "
+            "--no-normalise; ignored with --copy-audio).")
+    
+    parser.add_argument(
+        "--cache-dir", dest="cache_dir", metavar="DIR",
+        default=globals.CACHE_DIR,
+        help="Directory for data kept between runs, such as loudness "
+            "measurements (default {d}).".format(d=globals.CACHE_DIR))
+    
     parser.add_argument(
         "--audio-codec", dest="audio_codec", metavar="CODEC",
         default="pcm_s16le",
@@ -112,7 +265,67 @@ def parse_command_line():
     parser.add_argument(
         "--video-codec", dest="video_codec", metavar="CODEC", default="h264",
         help="Specify ffmpeg video codec for output (default h264). "
-            "See the output of ffmpeg -codecs for possible codecs.")
+            "See the output of ffmpeg -codecs for possible codecs. The "
+            "fastest installed encoder for the codec is used (e.g., "
+            "libx264 for h264).")
+    
+    parser.add_argument(
+        "--rendition", dest="renditions", metavar="FILE[:KEY=VALUE,...]",
+        action="append", type=rendition, default=[],
+        help="Also write a rendition of the podcast to FILE in the same "
+            "pass (can be repeated), so that decoding and normalisation "
+            "happen only once. KEY can be height (scales the video to "
+            "that height), video_codec, video_bitrate, audio_codec or "
+            "audio_bitrate, or video=no or audio=no to leave out that "
+            "stream (e.g., web.mp4:height=720,video_bitrate=2M,"
+            "audio_codec=aac or feed.m4a:video=no,audio_codec=aac). "
+            "Codecs default to those of the main output. Previews "
+            "don't write renditions.")
+    
+    parser.add_argument(
+        "--stream-output", dest="stream_output", choices=STREAM_FORMATS,
+        help="Write the output in a container that can be read while "
+            "it's still being encoded (fragmented MP4, MPEG-TS or "
+            "Matroska), e.g., to a named pipe or to standard output "
+            '(use "-" as the output). mp4 and mpegts need a compressed '
+            "audio codec (e.g., --audio-codec aac).")
+    
+    parser.add_argument(
+        "--fragment-duration", dest="fragment_duration", metavar="SECONDS",
+        type=float, default=FRAGMENT_DURATION,
+        help="Maximum duration of each fragment of streamed output (see "
+            "--stream-output; default {d}). Key frames are forced at "
+            "least this often.".format(d=FRAGMENT_DURATION))
+    
+    parser.add_argument(
+        "--hls", metavar="DIR",
+        help="Also package the output, and each rendition (see "
+            "--rendition), as an HLS variant in DIR, with a master "
+            "playlist (master.m3u8) listing them with their codecs and "
+            "resolutions (audio only variants are left out of it if "
+            "there's video). The variants are "
+            "written as they're encoded, so the stream is ready when "
+            "the render finishes. Needs a compressed audio codec (e.g., "
+            "--audio-codec aac). Previews aren't packaged.")
+    
+    parser.add_argument(
+        "--hls-time", dest="hls_time", metavar="SECONDS", type=float,
+        default=HLS_TIME,
+        help="Duration of each HLS segment (see --hls; default {t}). Key "
+            "frames are forced at segment boundaries.".format(t=HLS_TIME))
+    
+    parser.add_argument(
+        "--thumbnails", metavar="DIR",
+        help="Also write thumbnail sprite sheets, a WebVTT index of them "
+            "(for scrubbing previews) and a poster frame to DIR, taken "
+            "from the final video during the render. Previews don't "
+            "write thumbnails.")
+    
+    parser.add_argument(
+        "--thumbnail-interval", dest="thumbnail_interval",
+        metavar="SECONDS", type=float, default=THUMBNAIL_INTERVAL,
+        help="Interval between thumbnails (see --thumbnails; default "
+            "{i}).".format(i=THUMBNAIL_INTERVAL))
     
     parser.add_argument(
         "--input-prefix", "-i", dest="prefix", metavar="PATH", default=".",
@@ -127,6 +340,9 @@ def parse_command_line():
             "subset of the video frames. RATE is the number of frames "
             "per second to render (default 1 fps). You can specify "
             "fractions (e.g., 1/10 for one frame every 10 seconds). "
+            "Previews are also scaled down to {h} pixels high, encoded "
+            "with the fastest settings, and not normalised. ".format(
+                h=PREVIEW_HEIGHT) +
             'NOTE: if you get a "too few arguments" error when using '
             "this option, you've probably not provided an fps value and "
             "placed the option just before the output filename. "
@@ -134,6 +350,83 @@ def parse_command_line():
             'a "--" between it and the output filename, or provide a '
             "fps value.")
     
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="Check the job and print its execution plan, with an "
+            "estimate of each stage's CPU time and intermediate disk "
+            "space, without rendering anything. The input files are "
+            "only probed. Estimates are based on earlier runs with "
+            "--resource-usage (or --report), if there are any. Exits "
+            "with an error if the job has problems, such as missing or "
+            "unexpected input files, segments that end after their input "
+            "does, or audio and video of different durations.")
+    
+    parser.add_argument(
+        "--proxies", action="store_true",
+        help="Use low resolution proxies of the source videos for "
+            "previews (see --preview), including when extracting frames. "
+            "Each source's proxy is generated in the background the first "
+            "time it's needed (several in parallel), and kept in the "
+            "cache directory for later previews. Final renders always "
+            "use the original sources.")
+    
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument(
+        "--range", dest="time_window", metavar="START-END", type=time_window,
+        help="Only render the part of the podcast between START and END "
+            "(times in the output, e.g., 1:02:30-1:03:15). Either can be "
+            "omitted to render from the start or to the end, but as "
+            "\"-END\" looks like an option, write --range=-END or "
+            "--range 0-END to render from the start. Only the segments "
+            "(and frames) that overlap the range are processed, so "
+            "combined with --preview this is a quick way to check an "
+            "edit.")
+    
+    window.add_argument(
+        "--segments", dest="segment_window", metavar="I..J",
+        type=segment_window,
+        help="Only render segments I to J of the podcast (numbered from "
+            "1 in the order they appear in the video, or the audio if "
+            "there is no video). Either can be omitted, and a single "
+            "number renders just that segment.")
+    
+    parser.add_argument(
+        "--rasteriser", choices=list(RASTERISERS),
+        help="Program to use for rasterising PDF slides (default: the "
+            "fastest installed, in the order listed). Pages are "
+            "rasterised in parallel.")
+    
+    parser.add_argument(
+        "--dedupe-threshold", dest="dedupe_threshold", metavar="BITS",
+        type=int,
+        help="Treat frames taken from video (i.e., \"^\" frames) as "
+            "duplicates if their perceptual hashes differ by at most BITS "
+            "bits (out of 64; e.g., 4). Identical frames, including "
+            "repeated slides, are always rendered from a single image.")
+    
+    parser.add_argument(
+        "--stream-frames", dest="stream_frames", action="store_true",
+        help="Stream frames (e.g., PDF slides) directly into the final "
+            "render through a named pipe, rather than creating a "
+            "temporary image file for each frame.")
+    
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Process audio and video in separate ffmpeg processes that "
+            "run concurrently, connected to a final muxing process by "
+            "named pipes.")
+    
+    parser.add_argument(
+        "--batch-size", dest="batch_size", metavar="N", type=int,
+        default=BATCH_SIZE,
+        help="Render podcasts with more than N audio or video segments "
+            "in batches of N segments, each to a lossless intermediate "
+            "file, then concatenate the intermediate files (in batches "
+            "again, if necessary). This limits the number of files "
+            "that ffmpeg has open at once, and its memory use. "
+            "Default {b}; 0 renders everything in one pass (as does "
+            "--stream-frames).".format(b=BATCH_SIZE))
+    
     parser.add_argument(
         "--debug", "-d", action="store_true",
         help="Print debugging output (overrides --quiet).")
@@ -142,9 +435,61 @@ def parse_command_line():
         "--keep", "-k", action="store_true",
         help="Don't delete any generated temporary files.")
     
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Make the render resumable: completed work (rasterised "
+            "slides, assembled audio, batches (see --batch-size) and "
+            "chunks of about {c} seconds of the final video) is "
+            "checkpointed in a scratch workspace named after the output, "
+            "which is kept for up to a week if the render fails. Running "
+            "the same job again with --resume carries on from the last "
+            "completed work, provided the inputs and settings haven't "
+            "changed. The final video isn't chunked if it also feeds "
+            "renditions, HLS, thumbnails, streamed output or "
+            "--pipeline.".format(c=RESUME_CHUNK_DURATION))
+    
+    parser.add_argument(
+        "--scratch", metavar="DIR",
+        help="Directory in which to create the job's scratch workspace "
+            "for temporary files (default: the system temporary "
+            "directory, e.g., $TMPDIR). Each job gets its own uniquely "
+            "named workspace, so concurrent jobs don't interfere.")
+    
+    parser.add_argument(
+        "--queue", metavar="DIR",
+        help="Distribute slide rasterisation and batches (see "
+            "--batch-size) to workers on other machines, through the "
+            "shared directory DIR. Run \"python -m work_queue DIR\" on "
+            "each worker. The scratch workspace is created in DIR, and "
+            "input files must have the same paths on every machine. "
+            "The final render is done here.")
+    
+    parser.add_argument(
+        "--queue-timeout", dest="queue_timeout", metavar="SECONDS",
+        type=float,
+        help="Give up on work sent to the queue (see --queue) that isn't "
+            "done after SECONDS (default: wait forever).")
+    
+    parser.add_argument(
+        "--tmpfs", action="store_true",
+        help="Put small temporary files (e.g., slide images) on tmpfs "
+            "({t}) rather than in the scratch workspace.".format(
+                t=ScratchWorkspace.TMPFS))
+    
     parser.add_argument(
         "--quiet", "-q", action="store_true",
         help="Mute all console output (overridden by --debug).")
+    
+    parser.add_argument(
+        "--resource-usage", dest="resource_usage", action="store_true",
+        help="Record the CPU time, peak memory and disk I/O of every "
+            "external command (ffmpeg, ffprobe, convert), and print a "
+            "summary for each processing stage at the end of the run.")
+    
+    parser.add_argument(
+        "--report", metavar="FILE",
+        help="Write a machine-readable (JSON) report of the run to FILE. "
+            "Implies --resource-usage.")
 
     args = parser.parse_args()
     
@@ -172,9 +517,23 @@ def check_arguments(args):
     if args.quiet:
         globals.log.setLevel(logging.WARNING)
     
-    # --copy-audio implies --no-normalise.
+    # --copy-audio implies --no-normalise and no --loudness.
     if not args.process_audio:
         args.normalise = False
+        args.loudness = None
+    
+    # --loudness implies --no-normalise.
+    if args.loudness is not None:
+        args.normalise = False
+    
+    # Previews aren't normalised at all.
+    if args.preview:
+        args.normalise = False
+        args.loudness = None
+    
+    # --report implies --resource-usage.
+    if args.report:
+        args.resource_usage = True
         
     # --debug overrides --quiet.
     if args.debug:
@@ -192,6 +551,125 @@ def check_arguments(args):
                           "exist".format(p=args.prefix))
         sys.exit(1)
     
+    if (str(args.output) == "-"):
+        if not args.stream_output:
+            globals.log.error("writing to standard output needs "
+                              "--stream-output")
+            sys.exit(1)
+        # Everything else we print has to go elsewhere.
+        sys.stdout = sys.stderr
+    
+    if ((args.stream_output in ["mp4", "mpegts"])
+            and args.audio_codec.startswith("pcm_")):
+        globals.log.error("--stream-output {f} needs a compressed audio "
+                          "codec (e.g., --audio-codec aac)".format(
+                              f=args.stream_output))
+        sys.exit(1)
+    
+    if (args.fragment_duration <= 0):
+        globals.log.error("fragment duration must be positive")
+        sys.exit(1)
+    
+    if args.hls:
+        if args.stream_output:
+            globals.log.error("--hls can't be used with --stream-output")
+            sys.exit(1)
+        codecs = [args.audio_codec] + [r["audio_codec"] or args.audio_codec
+                                       for r in args.renditions
+                                       if r["audio"]]
+        if any(c.startswith("pcm_") for c in codecs):
+            globals.log.error("--hls needs a compressed audio codec (e.g., "
+                              "--audio-codec aac)")
+            sys.exit(1)
+        if (args.hls_time <= 0):
+            globals.log.error("HLS segment duration must be positive")
+            sys.exit(1)
+    
+    if (args.thumbnail_interval <= 0):
+        globals.log.error("thumbnail interval must be positive")
+        sys.exit(1)
+    
+    if args.renditions and args.pipeline:
+        globals.log.error("--rendition can't be used with --pipeline")
+        sys.exit(1)
+    
+    if (args.batch_size < 0) or (args.batch_size == 1):
+        globals.log.error("batch size must be 0 or at least 2")
+        sys.exit(1)
+    
+    if args.scratch and not Path(args.scratch).is_dir():
+        globals.log.error('scratch directory "{s}" does not '
+                          "exist".format(s=args.scratch))
+        sys.exit(1)
+    
+    if args.queue:
+        if not Path(args.queue).is_dir():
+            globals.log.error('queue directory "{q}" does not '
+                              "exist".format(q=args.queue))
+            sys.exit(1)
+        # Workers can't see our tmpfs.
+        if args.tmpfs:
+            globals.log.warning("--tmpfs can't be used with --queue, "
+                                "ignoring it")
+            args.tmpfs = False
+    
+
+def make_scratch_workspace(args):
+    """Create the scratch workspace for the job's temporary files."""
+    fn = "make_scratch_workspace"
+    base = args.scratch
+    if args.queue:
+        # The workers need to see the workspace, at the same path. Pid
+        # files are no use on other machines, so it isn't purged.
+        base = Path(args.queue, "scratch").resolve()
+        base.mkdir(exist_ok=True)
+    # Remove anything left behind by jobs that were killed outright,
+    # including their small files on tmpfs (which would otherwise use up
+    # memory until the next reboot).
+    stale = [] if args.queue else [base]
+    if Path(ScratchWorkspace.TMPFS).is_dir():
+        stale.append(ScratchWorkspace.TMPFS)
+    for b in stale:
+        for d in ScratchWorkspace.purge_stale(b):
+            globals.log.debug("{fn}(): removed stale workspace {d}".format(
+                fn=fn, d=d))
+    small_base = None
+    if args.tmpfs:
+        if Path(ScratchWorkspace.TMPFS).is_dir():
+            small_base = ScratchWorkspace.TMPFS
+        else:
+            globals.log.warning("{t} doesn't exist, not using "
+                                "tmpfs".format(t=ScratchWorkspace.TMPFS))
+    name = None
+    if args.resume:
+        name = "resume_{h}".format(h=hashlib.sha1(
+            str(Path(args.output).resolve()).encode()).hexdigest()[:16])
+    try:
+        workspace = ScratchWorkspace(base, small_base, name)
+    except FileExistsError as e:
+        globals.log.error("can't resume: {e}".format(e=e))
+        sys.exit(1)
+    globals.log.debug("{fn}(): workspace = {w}".format(fn=fn, w=workspace))
+    if args.keep:
+        workspace.keep()
+        globals.log.info("Temporary files will be kept in "
+                         "{p}".format(p=workspace.path))
+    # Clean up if we're terminated, too.
+    ScratchWorkspace.exit_on_signals()
+    Segment._scratch = workspace
+
+
+def choose_encoders(args, capabilities):
+    """Use the fastest available encoders for the output video codecs."""
+    fn = "choose_encoders"
+    encoder = capabilities.encoder(args.video_codec)
+    globals.log.debug("{fn}(): {c} -> {e}".format(
+        fn=fn, c=args.video_codec, e=encoder))
+    args.video_codec = encoder
+    for r in args.renditions:
+        if r["video_codec"]:
+            r["video_codec"] = capabilities.encoder(r["video_codec"])
+
 
 def get_configuration(args):
     """Load podcast configuration."""
@@ -259,9 +737,50 @@ def get_configuration(args):
     return config
 
 
+def check_configuration(config):
+    """Return a list of problems with the input files of a configuration.
+    
+    Each input file is only checked once, however many segments use it.
+    """
+    problems = []
+    checked = set()
+    for c in config:
+        file, type = c["filename"], c["type"]
+        if ((type, str(file)) in checked):
+            continue
+        checked.add((type, str(file)))
+        if (file == "^"):
+            if (type != "frame"):
+                problems.append('{t} segments can\'t use "^" (only frame '
+                                "segments can)".format(t=type))
+        elif not Path(file).is_file():
+            problems.append('{t} input file "{f}" does not '
+                            "exist".format(t=type, f=file))
+        elif ((type == "frame") and (PurePath(file).suffix.lower() not in
+                                      [".pdf"] + FRAME_IMAGE_SUFFIXES)):
+            problems.append('unexpected input file type "{s}" for frame '
+                            'input "{f}"'.format(s=PurePath(file).suffix,
+                                                 f=file))
+    return problems
+
+
+# Durations of files that have already been probed, keyed by file name
+# and modification time. Configurations often refer to the same file
+# many times, and probing it each time would be slow.
+_file_durations = {}
+
+
 def get_file_duration(file):
     """Calculate the duration a media file as a timedelta object."""
-    fn = "get_file_duration"
+    key = (str(file), Path(file).stat().st_mtime)
+    if key not in _file_durations:
+        _file_durations[key] = probe_file_duration(file)
+    return _file_durations[key]
+
+
+def probe_file_duration(file):
+    """Probe the duration of a media file using ffprobe."""
+    fn = "probe_file_duration"
     command = FFprobeCommand([file])
     globals.log.debug("{fn}(): {cmd}".format(fn=fn, cmd=command))
     # Only consider the first stream. If it's the only stream in the
@@ -278,11 +797,15 @@ def get_file_duration(file):
 def make_new_segment(type, filename, punch_in, punch_out, num):
     """Make a new segment instance of the correct class."""
     fn = "make_new_segment"
-    globals.log.debug("{fn}(): type = {t}".format(fn=fn, t=type))
-    globals.log.debug("{fn}(): filename = {f}".format(fn=fn, f=filename))
-    globals.log.debug("{fn}(): punch in = {i}".format(fn=fn, i=punch_in))
-    globals.log.debug("{fn}(): punch out = {o}".format(fn=fn, o=punch_out))
-    globals.log.debug("{fn}(): num = {n}".format(fn=fn, n=num))
+    # This is called for every segment, so avoid formatting debug
+    # messages that won't be logged.
+    if globals.log.isEnabledFor(logging.DEBUG):
+        globals.log.debug("{fn}(): type = {t}".format(fn=fn, t=type))
+        globals.log.debug("{fn}(): filename = {f}".format(fn=fn, f=filename))
+        globals.log.debug("{fn}(): punch in = {i}".format(fn=fn, i=punch_in))
+        globals.log.debug("{fn}(): punch out = {o}".format(fn=fn,
+                                                             o=punch_out))
+        globals.log.debug("{fn}(): num = {n}".format(fn=fn, n=num))
     
     if (type == "audio"):
         return AudioSegment(file=filename, punch_in=punch_in,
@@ -300,8 +823,10 @@ def make_new_segment(type, filename, punch_in, punch_out, num):
 def process_timestamp_pair(args, times):
     """Constructs timedelta instances from a pair of config timestamps."""
     fn = "process_timestamp_pair"
-    globals.log.debug("{fn}(): times[0] = {t}".format(fn=fn, t=times[0]))
-    globals.log.debug("{fn}(): times[1] = {t}".format(fn=fn, t=times[1]))
+    debug = globals.log.isEnabledFor(logging.DEBUG)
+    if debug:
+        globals.log.debug("{fn}(): times[0] = {t}".format(fn=fn, t=times[0]))
+        globals.log.debug("{fn}(): times[1] = {t}".format(fn=fn, t=times[1]))
     
     # If the first item in the timestamp list in the configuration file
     # is a filename, the parser inserts a zero timestamp before it. We
@@ -325,8 +850,9 @@ def process_timestamp_pair(args, times):
     else:
         t1 = None
     
-    globals.log.debug("{fn}(): t0 = {t}".format(fn=fn, t=t0))
-    globals.log.debug("{fn}(): t1 = {t}".format(fn=fn, t=t1))
+    if debug:
+        globals.log.debug("{fn}(): t0 = {t}".format(fn=fn, t=t0))
+        globals.log.debug("{fn}(): t1 = {t}".format(fn=fn, t=t1))
     return t0, t1
 
 
@@ -385,18 +911,138 @@ def process_input_streams(args, config):
     fn = "process_input_streams"
     globals.log.info("Processing input streams...")
     segments = []
+    debug = globals.log.isEnabledFor(logging.DEBUG)
     for cnf in config:
-        globals.log.debug("{fn}(): type = {t}".format(fn=fn, t=cnf["type"]))
-        globals.log.debug(
-            "{fn}(): filename = {f}".format(fn=fn, f=cnf["filename"]))
-        globals.log.debug("{fn}(): num = {n}".format(fn=fn, n=cnf["num"]))
-        globals.log.debug("{fn}(): times = {t}".format(fn=fn, t=cnf["times"]))
+        if debug:
+            globals.log.debug(
+                "{fn}(): type = {t}".format(fn=fn, t=cnf["type"]))
+            globals.log.debug(
+                "{fn}(): filename = {f}".format(fn=fn, f=cnf["filename"]))
+            globals.log.debug(
+                "{fn}(): num = {n}".format(fn=fn, n=cnf["num"]))
+            globals.log.debug(
+                "{fn}(): times = {t}".format(fn=fn, t=cnf["times"]))
     
         segments += process_time_list(args, cnf["type"], cnf["filename"],
                                       cnf["num"], cnf["times"])  
     return segments
 
 
+def check_timeline(audio_segments, video_segments):
+    """Return a list of problems with the timeline of the segments.
+    
+    The durations of the input files have already been probed.
+    """
+    problems = []
+    for s in audio_segments + video_segments:
+        if isinstance(s, FrameSegment):
+            continue
+        end = get_file_duration(s.input_file)
+        if (s.punch_out > end):
+            problems.append(
+                "{t} segment {n} ends at {o}s, after the end of {f} "
+                "({e}s)".format(t=s._TYPE, n=s.segment_number,
+                                o=s.punch_out.total_seconds(),
+                                f=s.input_file, e=end.total_seconds()))
+    if (audio_segments and video_segments):
+        # Summed exactly (as timedeltas), rather than as float seconds.
+        audio_duration = sum([s.punch_out - s.punch_in
+                              for s in audio_segments], datetime.timedelta())
+        video_duration = sum([s.punch_out - s.punch_in
+                              for s in video_segments], datetime.timedelta())
+        if (audio_duration != video_duration):
+            problems.append("total video duration ({v}s) doesn't match "
+                            "total audio duration ({a}s)".format(
+                                v=video_duration.total_seconds(),
+                                a=audio_duration.total_seconds()))
+    return problems
+
+
+def coalesce_segments(segments, previous=None):
+    """Merge segments that continue the previous segment of their timeline.
+    
+    For example, back to back segments of the same input file, or
+    consecutive frame segments with the same frame. Returns the
+    remaining segments, in the same order.
+    
+    previous maps "^" frames to their previous segments (see
+    previous_segments()), and is updated to match. A "^" frame's
+    numbered frame is counted from the start of its previous segment,
+    so that segment isn't merged into the one before it.
+    """
+    fn = "coalesce_segments"
+    previous = {} if previous is None else previous
+    numbered = {p for f, p in previous.items() if f.frame_number != -1}
+    coalesced = []
+    # The last segment of the audio and video timelines.
+    last = {}
+    # The segment that each merged segment was merged into.
+    merged = {}
+    for s in segments:
+        timeline = (AudioSegment if isinstance(s, AudioSegment)
+                    else VideoSegment)
+        if ((timeline in last) and (s not in numbered)
+                and s.continues(last[timeline])):
+            globals.log.debug("{fn}(): merging {s} into {l}".format(
+                fn=fn, s=s, l=last[timeline]))
+            last[timeline].extend(s)
+            merged[s] = last[timeline]
+        else:
+            coalesced.append(s)
+            last[timeline] = s
+    for f in list(previous):
+        if f in merged:
+            del previous[f]
+        else:
+            previous[f] = merged.get(previous[f], previous[f])
+    return coalesced
+
+
+def start_checkpoint(args, segments):
+    """Start checkpointing the render (see --resume).
+    
+    The checkpoint is keyed by the settings and the segments, including
+    the identity (size and modification time) of their input files.
+    """
+    fn = "start_checkpoint"
+    settings = {k: str(v) for k, v in sorted(vars(args).items())
+                if k not in RESUME_IGNORED}
+    timeline = []
+    for s in segments:
+        try:
+            stat = os.stat(str(s.input_file))
+            identity = [str(Path(s.input_file).resolve()), stat.st_size,
+                        stat.st_mtime_ns]
+        except OSError:
+            identity = [str(s.input_file), None, None]
+        timeline.append(identity + [
+            s.__class__.__name__, s.input_stream, s.punch_in.total_seconds(),
+            s.punch_out.total_seconds(), getattr(s, "frame_number", None)])
+    checkpoint = Checkpoint(Segment._scratch.path,
+                            Checkpoint.key([settings, timeline]))
+    if checkpoint.changed:
+        globals.log.info("Inputs or settings have changed since the last "
+                         "run, starting again")
+    elif checkpoint.completed():
+        globals.log.info("Resuming from {p}".format(p=checkpoint.path))
+    globals.log.debug("{fn}(): key = {k}, {n} units completed".format(
+        fn=fn, k=checkpoint.key, n=checkpoint.completed()))
+    Segment._scratch.checkpoint = checkpoint
+
+
+def checkpoint_result(unit):
+    """Return the result of a unit of work from a previous run, or None."""
+    if Segment._scratch and Segment._scratch.checkpoint:
+        return Segment._scratch.checkpoint.result(unit)
+    return None
+
+
+def checkpoint_complete(unit, result, files=[]):
+    """Record a completed unit of work, if the render is resumable."""
+    if Segment._scratch and Segment._scratch.checkpoint:
+        Segment._scratch.checkpoint.complete(unit, result, files)
+
+
 def smallest_video_dimensions(args, segments):
     """Compute the smallest frame dimensions across all video inputs."""
     fn = "smallest_video_dimensions"
@@ -413,48 +1059,248 @@ def smallest_video_dimensions(args, segments):
     return width, height
 
 
-def process_frame_segments(args, segments, width, height):
-    """Post-process frame segments to set frame images, etc."""
+def start_proxies(args, video_segments):
+    """Start generating proxies of the source videos, if required."""
+    if not (args.proxies and args.preview):
+        return None
+    files = []
+    for s in video_segments:
+        if not isinstance(s, FrameSegment) and s.input_file not in files:
+            files.append(s.input_file)
+    proxies = ProxyCache(Path(args.cache_dir, "proxies"))
+    proxies.start(files)
+    return proxies
+
+
+def use_proxies(proxies, segments):
+    """Switch segments to the proxies of their (video) input files."""
+    fn = "use_proxies"
+    globals.log.info("Waiting for proxies...")
+    sources = {s.input_file for s in segments
+               if isinstance(s, VideoSegment)
+               and not isinstance(s, FrameSegment)}
+    for f in sources:
+        proxy = proxies.result(f)
+        globals.log.debug("{fn}(): {f} -> {p}".format(fn=fn, f=f, p=proxy))
+        if proxy:
+            # Audio from the same file comes from the proxy, too.
+            for s in segments:
+                if (s.input_file == f) and not isinstance(s, FrameSegment):
+                    s.set_input_file(proxy)
+        else:
+            globals.log.warning("failed to generate a proxy for {f}, using "
+                                "the original".format(f=f))
+    proxies.shutdown()
+
+
+def setup_preview(args, video_segments, width, height):
+    """Set up a fast preview render. Return the preview dimensions."""
+    fn = "setup_preview"
+    if (height > PREVIEW_HEIGHT):
+        # Keep the aspect ratio, with an even width for yuv420p.
+        width = int(round(width * PREVIEW_HEIGHT / height / 2)) * 2
+        height = PREVIEW_HEIGHT
+    globals.log.debug("{fn}(): preview size = {w}x{h}".format(
+        fn=fn, w=width, h=height))
+    # Scale (and drop frames) right after trimming, so that the rest
+    # of the filtergraph has as little work to do as possible.
+    for s in video_segments:
+        s.add_filters(["scale={w}:{h}".format(w=width, h=height),
+                       "fps={r}".format(r=args.preview)])
+    ConvertCommand.density = PREVIEW_DENSITY
+    return width, height
+
+
+def render_window(args, audio_segments, video_segments):
+    """Return the part of the output to render as a pair of timedeltas.
+    
+    The end is None if the window extends to the end of the output.
+    Returns None if the whole podcast is to be rendered.
+    """
+    if args.time_window:
+        return args.time_window
+    elif args.segment_window:
+        first, last = args.segment_window
+        timeline = video_segments or audio_segments
+        if (first > len(timeline)):
+            globals.log.error("there are only {n} segments".format(
+                n=len(timeline)))
+            sys.exit(1)
+        start = sum([s.punch_out - s.punch_in for s in timeline[:first - 1]],
+                    datetime.timedelta())
+        end = None
+        if last and (last < len(timeline)):
+            end = sum([s.punch_out - s.punch_in for s in timeline[:last]],
+                      datetime.timedelta())
+        return start, end
+    else:
+        return None
+
+
+def clip_segments(segments, start, end, previous=None):
+    """Clip a timeline of segments to the window from start to end.
+    
+    Returns the segments that overlap the window, with their punch
+    points adjusted so that they only cover it. end is None to clip
+    to the end of the timeline.
+    
+    previous maps "^" frames to their previous segments (see
+    previous_segments()). A "^" frame's numbered frame is counted from
+    the start of its previous segment, so if that start is clipped, the
+    frame is given an unclipped copy of the segment instead.
+    """
+    clipped = []
+    t = datetime.timedelta()
+    for s in segments:
+        s_start = t
+        t += s.punch_out - s.punch_in
+        if (t <= start) or ((end is not None) and (s_start >= end)):
+            continue
+        punch_in = s.punch_in + max(start - s_start, datetime.timedelta())
+        punch_out = s.punch_out
+        if (end is not None) and (t > end):
+            punch_out -= t - end
+        if previous and (punch_in != s.punch_in):
+            unclipped = copy.copy(s)
+            for f, prev in previous.items():
+                if (prev is s) and (f.frame_number != -1):
+                    previous[f] = unclipped
+        s.set_punch(punch_in, punch_out)
+        clipped.append(s)
+    return clipped
+
+
+def clip_previous_segments(previous, video_segments):
+    """Trim "^" frames' previous segments that won't be rendered.
+    
+    Only the end of such a segment is needed for its last frame, so
+    there's no point extracting (or proxying) the rest of it.
+    """
+    for f, prev in previous.items():
+        if ((f.frame_number == -1) and (prev not in video_segments)
+                and not isinstance(prev, FrameSegment)):
+            prev.set_punch(
+                max(prev.punch_in,
+                    prev.punch_out - datetime.timedelta(seconds=5)),
+                prev.punch_out)
+
+
+def previous_segments(video_segments):
+    """Find the segment before each "^" frame segment.
+    
+    Returns a dictionary mapping each "^" frame segment to the video
+    segment before it, whose last frame it uses.
+    """
+    previous = {}
+    for i, f in enumerate(video_segments):
+        if isinstance(f, FrameSegment) and (f.input_file == "^"):
+            if (i > 0):
+                previous[f] = video_segments[i - 1]
+            else:
+                globals.log.error(
+                    "frame segment {s} is attempting to use the last "
+                    "frame of a non-existent previous "
+                    "segment".format(s=f.segment_number))
+                sys.exit(1)
+    return previous
+
+
+def process_frame_segments(args, video_segments, previous, width, height,
+                           capabilities, queue=None):
+    """Post-process frame segments to set frame images, etc.
+    
+    If queue is a WorkQueue, slides are rasterised by its workers.
+    """
     fn = "process_frame_segments"
     globals.log.info("Processing frames...")
-    frame_segments = [s for s in segments if isinstance(s, FrameSegment)]
+    frame_segments = [s for s in video_segments
+                      if isinstance(s, FrameSegment)]
     n = len(frame_segments)
     globals.log.debug("{fn}(): num frames = {n}".format(fn=fn, n=n))
     progress = ProgressBar(max_value=n,
                            quiet=args.quiet or args.debug or n == 0)
     progress.update(0)
+    # Each distinct frame is only rasterised once, and duplicates use
+    # the same image (and hence the same input).
+    index = FrameIndex(args.dedupe_threshold)
+    images = {}
+    
+    # Rasterise all the pages needed from each PDF up front.
+    needed = {}
+    for f in frame_segments + list(previous.values()):
+        if (isinstance(f, FrameSegment)
+                and PurePath(f.input_file).suffix.lower() == ".pdf"):
+            needed.setdefault(Path(f.input_file).resolve(), set()).add(
+                f.frame_number)
+    pages = {}
+    if needed:
+        rasteriser = make_rasteriser(
+            capabilities, Segment._scratch.file("slides", small=True),
+            width=width, height=height, name=args.rasteriser)
+        rasteriser.queue = queue
+        globals.log.info("Rasterising {n} slides with {r}...".format(
+            n=sum([len(p) for p in needed.values()]), r=rasteriser.tool))
+        for pdf in needed:
+            unit = "slides:{p}".format(p=pdf)
+            rasterised = checkpoint_result(unit)
+            if rasterised is None:
+                rasterised = [[n, str(image)] for n, image in sorted(
+                    rasteriser.rasterise(pdf, needed[pdf]).items())]
+                if (len(rasterised) == len(needed[pdf])):
+                    checkpoint_complete(unit, rasterised,
+                                        [i for _, i in rasterised])
+            for n, image in rasterised:
+                pages[(pdf, n)] = index.add(Path(image))
+    
+    def rasterise(f):
+        """Return the image for a PDF frame segment."""
+        page = (Path(f.input_file).resolve(), f.frame_number)
+        if page not in pages:
+            raise SegmentError(
+                "Failed to rasterise frame for {s}".format(s=f))
+        return pages[page]
+    
+    def frame_image(f):
+        """Return the image for a frame segment from a PDF or image file."""
+        suffix = PurePath(f.input_file).suffix
+        if (suffix.lower() == ".pdf"):
+            return rasterise(f)
+        elif (suffix.lower() in FRAME_IMAGE_SUFFIXES):
+            return index.add(f.input_file)
+        else:
+            globals.log.error(
+                'unexpected input file type "{s}" for frame segment '
+                "{f}".format(s=suffix, f=f.segment_number))
+            sys.exit(1)
+    
     for i, f in enumerate(frame_segments):
         try:
             globals.log.debug(
                 "{fn}(): frame (before) = {b}".format(fn=fn, b=f))
             # Frame segments that use a frame from the previous segment.
             if (f.input_file == "^"):
-                if (f.segment_number > 0):
-                    prev = segments[f.segment_number - 1]
-                    globals.log.debug(
-                        "{fn}(): prev = {p}".format(fn=fn, p=prev))
+                prev = previous[f]
+                globals.log.debug(
+                    "{fn}(): prev = {p}".format(fn=fn, p=prev))
+                if prev in images:
+                    images[f] = images[prev]
+                elif isinstance(prev, FrameSegment):
+                    images[f] = frame_image(prev)
+                else:
                     prev.generate_temp_file(args.output, width=width,
                                             height=height)
-                    f.use_frame(
+                    images[f] = index.add(
                         prev.generate_frame(f.frame_number, args.output,
-                                            width=width, height=height))
-                else:
-                    globals.log.error(
-                        "frame segment {s} is attempting to use the last "
-                        "frame of a non-existent previous "
-                        "segment".format(s=f.segment_number))
-                    sys.exit(1)
-            # Frame segments whose frame comes from a PDF file.
+                                            width=width, height=height),
+                        perceptual=True)
+                f.use_frame(images[f])
+            # Frame segments whose frame comes from a PDF or image file.
             else:
-                suffix = PurePath(f.input_file).suffix
-                if (suffix.lower() == ".pdf"):
-                    f.use_frame(f.generate_temp_file(args.output, width=width,
-                                            height=height))
-                else:
-                    globals.log.error(
-                        'unexpected input file type "{s}" for frame segment '
-                        "{f}".format(s=suffix, f=f.segment_number))
-                    sys.exit(1)
+                images[f] = frame_image(f)
+                f.use_frame(images[f])
+            # Frames are scaled to size when they're rendered (once for
+            # each distinct image).
+            f.letterbox(width, height)
             progress.update(i)
             globals.log.debug("{fn}(): frame (after) = ""{a}".format(fn=fn, a=f))
         except SegmentError as e:
@@ -463,38 +1309,631 @@ def process_frame_segments(args, segments, width, height):
             sys.exit(1)
     else:
         progress.finish()
+    globals.log.debug("{fn}(): {d} duplicate frames".format(
+        fn=fn, d=len(frame_segments) - len(set(images.values()))))
 
 
-def render_podcast(args, audio_segments, video_segments, output, duration):
-    """Stitch together the various input components into the final podcast."""
-    fn = "render_podcast"
-    globals.log.info("Rendering final podcast...")
-    command = FFmpegConcatCommand(has_audio=len(audio_segments) > 0,
-                                  has_video=len(video_segments) > 0,
-                                  max_progress=duration,
-                                  quiet=args.quiet and not args.debug,
-                                  process_audio=args.process_audio,
-                                  process_video=args.process_video,
-                                  audio_codec=args.audio_codec,
-                                  video_codec=args.video_codec)
-    input_files = Segment.input_files()
-    for f in input_files:
-        if (input_files[f]):
-            command.append_input_options(input_files[f])
-        command.append_input_options(["-i", f])
-    for s in (audio_segments + video_segments):
-        command.append_filter(s.trim_filter())
+def stream_frame_segments(args, video_segments, previous, width, height):
+    """Set up streaming of frame segments' images into the final render."""
+    frames = []
+    for f in [s for s in video_segments if isinstance(s, FrameSegment)]:
+        prev = previous.get(f)
+        if (f.input_file != "^"):
+            suffix = PurePath(f.input_file).suffix
+            if (suffix.lower() in FRAME_IMAGE_SUFFIXES):
+                # Image files are used directly, rather than streamed.
+                f.letterbox(width, height)
+                continue
+            elif (suffix.lower() != ".pdf"):
+                globals.log.error(
+                    'unexpected input file type "{s}" for frame segment '
+                    "{f}".format(s=suffix, f=f.segment_number))
+                sys.exit(1)
+        frames.append((f, prev))
+    if not frames:
+        return None
+    stream = FrameStream(Segment._scratch.file("frames.fifo"), frames,
+                         width=width, height=height)
+    Segment._add_input_file(stream.fifo, stream.input_options())
+    return stream
+
+
+def build_concat_command(args, audio_segments, video_segments, duration,
+                         frame_stream=None, loudness=None, quiet=False,
+                         command_class=FFmpegConcatCommand):
+    """Build an ffmpeg command that concatenates the specified segments.
+    
+    Only the input files used by the segments are included. loudness
+    is the measured loudness of the audio, if available (see
+    --loudness). The caller must add the output options (i.e., at
+    least the output).
+    """
+    command = command_class(input_options=[], output_options=[],
+                            has_audio=len(audio_segments) > 0,
+                            has_video=len(video_segments) > 0,
+                            max_progress=duration,
+                            quiet=quiet,
+                            process_audio=args.process_audio,
+                            process_video=args.process_video,
+                            audio_codec=args.audio_codec,
+                            video_codec=args.video_codec)
+    files = {s.input_file for s in audio_segments + video_segments}
+    if frame_stream and video_segments:
+        files.add(frame_stream.fifo)
+    # Inputs whose video is decoded (frames are images).
+    videos = {s.input_file for s in video_segments
+              if not isinstance(s, FrameSegment)}
+    with Segment.only_input_files(files):
+        input_files = Segment.input_files()
+        for f in input_files:
+            if (input_files[f]):
+                command.append_input_options(input_files[f])
+            if args.preview and (f in videos):
+                # Faster (if slightly blocky) decoding.
+                command.append_input_options(["-skip_loop_filter", "all"])
+            command.append_input_options(["-i", f])
+        if frame_stream and video_segments:
+            for f in frame_stream.filters(
+                    Segment.input_file_index(frame_stream.fifo)):
+                command.append_filter(f)
+        for f in FrameSegment.split_filters(video_segments):
+            command.append_filter(f)
+        for s in (audio_segments + video_segments):
+            command.append_filter(s.trim_filter())
     command.append_concat_filter("a", [s for s in audio_segments])
-    if (args.normalise):
+    if (args.loudness is not None):
+        command.append_loudness_filter(args.loudness, loudness)
+    elif (args.normalise):
         command.append_normalisation_filter()
+    else:
+        command.append_unnormalised_filter()
     command.append_concat_filter("v", [s for s in video_segments])
+    if args.preview and video_segments:
+        command.append_output_options(["-r", args.preview,
+                                       "-b:v", PREVIEW_BITRATE])
+        if args.video_codec in FAST_PRESET_ENCODERS:
+            command.append_output_options(["-preset", "ultrafast"])
+    return command
+
+
+def start_loudness_measurement(args, audio_segments, duration):
+    """Start measuring the loudness of the audio, if required."""
+    fn = "start_loudness_measurement"
+    if (args.loudness is None) or not audio_segments:
+        return None
+    cache = LoudnessCache(Path(args.cache_dir, "loudness.json"))
+    command = build_concat_command(args, audio_segments, [], duration,
+                                   quiet=True,
+                                   command_class=FFmpegLoudnessCommand)
+    command.append_output_options(["-f", "null", "-"])
+    measurement = LoudnessMeasurement(
+        command, cache, LoudnessCache.key(audio_segments, args.loudness))
+    measurement.start()
+    if measurement.cached:
+        globals.log.info("Using cached loudness measurement")
+    else:
+        globals.log.debug("{fn}(): {c}".format(fn=fn, c=command))
+    return measurement
+
+
+def run_concurrently(commands):
+    """Run commands concurrently and return a list of their exit statuses.
+    
+    If any command fails, the rest are killed, as they would otherwise
+    wait forever for their pipes to be opened (or read).
+    """
+    statuses = [None] * len(commands)
+    
+    def run(i):
+        status = commands[i].run()
+        # Commands killed by a signal have no exit status.
+        statuses[i] = 1 if status is None else status
+    
+    threads = [threading.Thread(target=run, args=(i,), daemon=True)
+               for i in range(len(commands))]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        if any(statuses):
+            for c in commands:
+                if c.process and not c.process.terminated:
+                    try:
+                        os.kill(c.process.pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+        for t in threads:
+            t.join(timeout=0.1)
+    return statuses
+
+
+def keyframe_interval(args):
+    """Return how often key frames must be forced (seconds), or None."""
+    if args.stream_output:
+        return args.fragment_duration
+    elif args.hls and not args.preview:
+        return args.hls_time
+    return None
+
+
+def keyframe_options(interval):
+    """Return output options that force a key frame every interval seconds."""
+    return ["-force_key_frames",
+            "expr:gte(t,n_forced*{i})".format(i=interval)]
+
+
+def stream_output_options(args):
+    """Return the muxer options for streamed output (see --stream-output)."""
+    if (args.stream_output == "mp4"):
+        # Write the header up front, then self-contained fragments.
+        return ["-movflags", "+frag_keyframe+empty_moov+default_base_moof",
+                "-frag_duration",
+                str(int(args.fragment_duration * 1000000)), "-f", "mp4"]
+    elif (args.stream_output == "matroska"):
+        return ["-cluster_time_limit",
+                str(int(args.fragment_duration * 1000)), "-f", "matroska"]
+    elif (args.stream_output == "mpegts"):
+        return ["-f", "mpegts"]
+    return []
+
+
+def tee_escape(value):
+    """Escape special characters in a file name for the tee muxer."""
+    return re.sub(r"([\\'\[\]|:])", r"\\\1", str(value))
+
+
+def hls_variant(args, n):
+    """Return the media playlist of HLS variant n (see --hls)."""
+    return Path(args.hls, "variant_{n}".format(n=n), "index.m3u8")
+
+
+def output_target(args, output, n):
+    """Return the output options and file for output n.
+    
+    The main output is 0, and renditions are numbered from 1. With
+    --hls, each output is also packaged as an HLS variant by the tee
+    muxer, so that it's only encoded once.
+    """
+    if not args.hls or args.preview:
+        return [], output
+    playlist = hls_variant(args, n)
+    playlist.parent.mkdir(parents=True, exist_ok=True)
+    # The tee muxer can't tell the encoders that the output file needs
+    # global headers.
+    return ["-flags", "+global_header", "-f", "tee"], (
+        "{o}|[f=hls:hls_time={t}:hls_playlist_type=vod:"
+        "hls_segment_filename={s}]{p}".format(
+            o=tee_escape(output), t=args.hls_time,
+            s=tee_escape(playlist.with_name("segment_%05d.ts")),
+            p=tee_escape(playlist)))
+
+
+def probe_hls_variant(playlist):
+    """Return the streams of an HLS variant's first segment (if any)."""
+    fn = "probe_hls_variant"
+    try:
+        command = FFprobeCommand([media_segments(playlist)[0][1]])
+        globals.log.debug("{fn}(): {cmd}".format(fn=fn, cmd=command))
+        return json.loads(command.get_output())["streams"]
+    except (AssertionError, IndexError, KeyError, OSError, TypeError,
+            ValueError) as e:
+        globals.log.debug("{fn}(): can't probe {p}: {e!r}".format(
+            fn=fn, p=playlist, e=e))
+        return []
+
+
+def write_hls_playlist(args):
+    """Write the HLS master playlist for all the variants (see --hls)."""
+    fn = "write_hls_playlist"
+    playlists = [hls_variant(args, n)
+                 for n in range(len(args.renditions) + 1)]
+    master = Path(args.hls, "master.m3u8")
+    try:
+        write_master_playlist(master, playlists,
+                              [probe_hls_variant(p) for p in playlists])
+    except OSError as e:
+        globals.log.error("Failed to write {m}: {e}".format(m=master, e=e))
+        return 1
+    globals.log.debug("{fn}(): wrote {m}".format(fn=fn, m=master))
+    return 0
+
+
+def start_stdout_relay():
+    """Start relaying the output to standard output.
+    
+    Commands run on a pty (see ShellCommand.run()), so ffmpeg writes
+    to a named pipe instead, which is copied to standard output in a
+    separate thread. Returns the pipe and the thread.
+    """
+    pipe = Segment._scratch.file("output.fifo")
+    os.mkfifo(str(pipe))
+    
+    def relay():
+        with open(str(pipe), "rb") as f:
+            shutil.copyfileobj(f, sys.__stdout__.buffer, 1 << 20)
+        sys.__stdout__.buffer.flush()
+    
+    thread = threading.Thread(target=relay, daemon=True)
+    thread.start()
+    return pipe, thread
+
+
+def finish_stdout_relay(pipe, thread):
+    """Wait for the relay to standard output to finish."""
+    # If ffmpeg failed before opening the pipe, the relay is still
+    # waiting for a writer (or hasn't even opened it yet).
+    while thread.is_alive():
+        try:
+            os.close(os.open(str(pipe), os.O_WRONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+        thread.join(timeout=0.1)
+    os.remove(str(pipe))
+
+
+def render_pipeline(args, audio_segments, video_segments, output, duration,
+                    frame_stream=None, loudness=None, thumbnails=None):
+    """Render audio and video in separate, concurrent ffmpeg processes.
+    
+    Each writes NUT to a named pipe, and a third process muxes the
+    two (without re-encoding) into the output. Returns the exit status.
+    """
+    fn = "render_pipeline"
+    audio_pipe = Segment._scratch.file("audio.fifo")
+    video_pipe = Segment._scratch.file("video.fifo")
+    audio = build_concat_command(args, audio_segments, [], duration,
+                                 loudness=loudness, quiet=True)
+    audio.append_output_options(["-f", "nut", audio_pipe])
+    video = build_concat_command(args, [], video_segments, duration,
+                                 frame_stream=frame_stream,
+                                 quiet=args.quiet and not args.debug)
+    if keyframe_interval(args):
+        video.append_output_options(
+            keyframe_options(keyframe_interval(args)))
+    # Keep codec headers out of band for the final muxer.
+    video.append_output_options(["-flags:v", "+global_header",
+                                 "-f", "nut", video_pipe])
+    if thumbnails:
+        append_thumbnails(video, thumbnails)
+    options, target = output_target(args, output, 0)
+    mux = FFmpegCommand(
+        input_options=["-f", "nut", "-i", audio_pipe,
+                       "-f", "nut", "-i", video_pipe],
+        output_options=["-map", "0:a", "-map", "1:v",
+                        "-codec", "copy"] + stream_output_options(args) +
+                       options + [target])
+    for c in [audio, video, mux]:
+        globals.log.debug("{fn}(): {c}".format(fn=fn, c=c))
+    for p in [audio_pipe, video_pipe]:
+        os.mkfifo(str(p))
+    try:
+        statuses = run_concurrently([audio, video, mux])
+    finally:
+        for p in [audio_pipe, video_pipe]:
+            os.remove(str(p))
+    globals.log.debug("{fn}(): statuses = {s}".format(fn=fn, s=statuses))
+    return max(statuses)
+
+
+def render_in_batches(args, audio_segments, video_segments):
+    """Return True if the segments need to be rendered in batches."""
+    return (args.batch_size > 0 and not args.stream_frames
+            and max(len(audio_segments), len(video_segments)) >
+            args.batch_size)
+
+
+def render_batches(args, segments, queue=None):
+    """Render a timeline of audio or video segments in batches.
+    
+    Each batch is rendered to a lossless intermediate file, without
+    normalisation or other processing (that's done in the final render).
+    Returns a list of (at most args.batch_size) segments for the
+    intermediate files, with the same timeline as segments, or None if
+    a batch fails.
+    
+    If queue is a WorkQueue, the batches at each level are rendered in
+    parallel by its workers, otherwise one after another.
+    """
+    fn = "render_batches"
+    is_audio = isinstance(segments[0], AudioSegment)
+    codec, suffix = INTERMEDIATE_AUDIO if is_audio else INTERMEDIATE_VIDEO
+    batch_args = copy.copy(args)
+    batch_args.normalise = False
+    batch_args.loudness = None
+    batch_args.process_audio = batch_args.process_video = False
+    batch_args.preview = None
+    batch_args.audio_codec = batch_args.video_codec = codec
+    level = 0
+    while (len(segments) > args.batch_size):
+        level += 1
+        batches = [segments[i:i + args.batch_size]
+                   for i in range(0, len(segments), args.batch_size)]
+        intermediates = []
+        pending = []
+        for i, batch in enumerate(batches):
+            file = Segment._scratch.file("batch_{t}_{l}_{i:03d}{s}".format(
+                t="audio" if is_audio else "video", l=level, i=i, s=suffix))
+            duration = sum([s.get_duration() for s in batch])
+            if checkpoint_result(file.name) is None:
+                command = build_concat_command(
+                    batch_args, batch if is_audio else [],
+                    [] if is_audio else batch, duration, quiet=True)
+                command.append_output_options([file])
+                globals.log.debug("{fn}(): {c}".format(fn=fn, c=command))
+                pending.append((file, duration, command))
+            intermediates.append(
+                (AudioSegment if is_audio else VideoSegment)(
+                    file=file, punch_in=datetime.timedelta(),
+                    punch_out=datetime.timedelta(seconds=duration)))
+        if queue and pending:
+            globals.log.info("Rendering {n} {t} batches on the work "
+                             "queue...".format(
+                                 n=len(pending),
+                                 t="audio" if is_audio else "video"))
+            statuses = queue.run([c for _, _, c in pending])
+        else:
+            statuses = []
+            for i, (file, duration, command) in enumerate(pending):
+                globals.log.info("Rendering {t} batch {i} of {n}...".format(
+                    t="audio" if is_audio else "video", i=i + 1,
+                    n=len(pending)))
+                statuses.append(command.run())
+                if (statuses[-1] != 0):
+                    break
+        for (file, duration, command), status in zip(pending, statuses):
+            if (status != 0):
+                globals.log.error("Failed to render batch "
+                                  "{f}".format(f=file))
+                return None
+            checkpoint_complete(file.name, duration, [file])
+        segments = intermediates
+    return segments
+
+
+def render_in_chunks(args, video_segments, frame_stream=None,
+                     thumbnails=None):
+    """Return True if the final video needs to be rendered in chunks.
+    
+    The final video of a resumable render (see --resume) is encoded in
+    checkpointed chunks, unless it also has to feed other outputs.
+    """
+    return (args.resume and bool(video_segments) and not (
+        frame_stream or thumbnails or args.pipeline or args.renditions or
+        args.hls or args.stream_output))
+
+
+def video_chunks(segments, length=RESUME_CHUNK_DURATION):
+    """Split a video timeline into chunks of about length seconds.
+    
+    Video segments that cross the end of a chunk are split there, but
+    frame segments aren't (the chunk ends after them instead). Returns
+    a list of lists of segments. The segments themselves aren't changed.
+    """
+    length = datetime.timedelta(seconds=length)
+    chunks = [[]]
+    elapsed = datetime.timedelta()
+    for s in segments:
+        while (not isinstance(s, FrameSegment) and
+               (s.punch_out - s.punch_in > length - elapsed)):
+            # Trimmed in the filtergraph, so only the punch points change.
+            head = copy.copy(s)
+            Segment.set_punch(head, s.punch_in, s.punch_in + length - elapsed)
+            tail = copy.copy(s)
+            Segment.set_punch(tail, head.punch_out, s.punch_out)
+            chunks[-1].append(head)
+            chunks.append([])
+            elapsed = datetime.timedelta()
+            s = tail
+        chunks[-1].append(s)
+        elapsed += s.punch_out - s.punch_in
+        if (elapsed >= length):
+            chunks.append([])
+            elapsed = datetime.timedelta()
+    return [c for c in chunks if c]
+
+
+def render_chunks(args, audio_segments, video_segments, output, duration,
+                  loudness=None):
+    """Render the final podcast in checkpointed chunks (see --resume).
+    
+    The video is encoded in chunks of about RESUME_CHUNK_DURATION
+    seconds (see video_chunks()) and the audio in a single pass, each
+    to the output's container, then they're joined without re-encoding.
+    A render that fails carries on from the last completed chunk when
+    resumed. Returns the exit status.
+    """
+    fn = "render_chunks"
+    suffix = PurePath(str(output)).suffix or INTERMEDIATE_VIDEO[1]
+    quiet = args.quiet and not args.debug
+    chunks = video_chunks(video_segments)
+    files = []
+    for i, chunk in enumerate(chunks):
+        file = Segment._scratch.file("chunk_video_{i:03d}{s}".format(
+            i=i, s=suffix))
+        files.append(file)
+        chunk_duration = sum([s.get_duration() for s in chunk])
+        if checkpoint_result(file.name) is not None:
+            continue
+        globals.log.info("Rendering video chunk {i} of {n}...".format(
+            i=i + 1, n=len(chunks)))
+        command = build_concat_command(args, [], chunk, chunk_duration,
+                                       quiet=quiet)
+        command.append_output_options([file])
+        globals.log.debug("{fn}(): {c}".format(fn=fn, c=command))
+        if (command.run() != 0):
+            globals.log.error("Failed to render video chunk "
+                              "{f}".format(f=file))
+            return 1
+        checkpoint_complete(file.name, chunk_duration, [file])
+    audio = None
+    if audio_segments:
+        audio = Segment._scratch.file("chunk_audio{s}".format(s=suffix))
+        if checkpoint_result(audio.name) is None:
+            globals.log.info("Rendering audio...")
+            command = build_concat_command(args, audio_segments, [], duration,
+                                           loudness=loudness, quiet=quiet)
+            command.append_output_options([audio])
+            globals.log.debug("{fn}(): {c}".format(fn=fn, c=command))
+            if (command.run() != 0):
+                globals.log.error("Failed to render audio "
+                                  "{f}".format(f=audio))
+                return 1
+            checkpoint_complete(audio.name, duration, [audio])
+    # Concat demuxer list, with single quotes escaped.
+    listing = Segment._scratch.file("chunk_video.txt")
+    listing.write_text("".join(
+        ["file '{f}'\n".format(f=str(f).replace("'", "'\\''"))
+         for f in files]))
+    input_options = ["-f", "concat", "-safe", "0", "-i", listing]
+    output_options = ["-map", "0:v"]
+    if audio:
+        input_options += ["-i", audio]
+        output_options += ["-map", "1:a"]
+    options, target = output_target(args, output, 0)
+    command = FFmpegCommand(
+        input_options=input_options,
+        output_options=output_options + ["-codec", "copy"] + options +
+                       [target])
+    globals.log.info("Joining {n} video chunks...".format(n=len(files)))
+    globals.log.debug("{fn}(): {c}".format(fn=fn, c=command))
+    return command.run()
+
+
+def append_renditions(args, command):
+    """Add the renditions (see --rendition) to the final render command."""
+    for n, r in enumerate(args.renditions, 1):
+        options = []
+        if r["video"]:
+            options += ["-codec:v", r["video_codec"] or args.video_codec]
+            if r["video_bitrate"]:
+                options += ["-b:v", r["video_bitrate"]]
+            if keyframe_interval(args):
+                options += keyframe_options(keyframe_interval(args))
+        if r["audio"]:
+            options += ["-codec:a", r["audio_codec"] or args.audio_codec]
+            if r["audio_bitrate"]:
+                options += ["-b:a", r["audio_bitrate"]]
+        target_options, target = output_target(args, r["file"], n)
+        command.append_rendition(
+            options + target_options + [target],
+            audio=r["audio"], video=r["video"],
+            video_filter="scale=-2:{h}".format(h=r["height"])
+            if r["height"] else None)
+
+
+def append_thumbnails(command, thumbnails):
+    """Add the thumbnails (see --thumbnails) to a render command.
+    
+    The sprite sheets and poster frame are taps of the final video,
+    and only one frame per thumbnail is scaled.
+    """
+    thumbnails.directory.mkdir(parents=True, exist_ok=True)
+    # JPEG needs full range YUV.
+    command.append_rendition(
+        ["-codec:v", "mjpeg", "-f", "image2", "-start_number", "0",
+         thumbnails.sprites],
+        audio=False, video_filter=thumbnails.sprite_filter(),
+        pix_fmt="yuvj420p")
+    command.append_rendition(
+        ["-frames:v", "1", "-codec:v", "mjpeg", thumbnails.poster],
+        audio=False, pix_fmt="yuvj420p")
+
+
+def assemble_audio(audio_segments):
+    """Assemble PCM WAV audio segments into a single file, if possible.
+    
+    Samples are copied directly from the sources (see PCMAssembler),
+    which is much faster than trimming and concatenating them in the
+    filtergraph. Returns a list of segments for the audio timeline:
+    either one segment for the assembled file, or audio_segments if
+    they can't be assembled.
+    """
+    fn = "assemble_audio"
+    assembler = PCMAssembler(audio_segments)
+    if not assembler.supported():
+        return audio_segments
+    file = Segment._scratch.file("audio.wav")
+    duration = checkpoint_result("audio")
+    if duration is None:
+        globals.log.info("Assembling audio...")
+        try:
+            duration = assembler.assemble(file)
+        except OSError as e:
+            globals.log.warning("can't assemble audio ({e}), "
+                                "rendering it with ffmpeg".format(e=e))
+            return audio_segments
+        checkpoint_complete("audio", duration, [file])
+    globals.log.debug("{fn}(): assembled {n} segments into {f} "
+                      "({d}s)".format(fn=fn, n=len(audio_segments), f=file,
+                                      d=duration))
+    return [AudioSegment(file=file, punch_in=datetime.timedelta(),
+                         punch_out=datetime.timedelta(seconds=duration))]
+
+
+def render_podcast(args, audio_segments, video_segments, output, duration,
+                   frame_stream=None, loudness=None, thumbnails=None,
+                   queue=None):
+    """Stitch together the various input components into the final podcast.
+    
+    thumbnails is the Thumbnails to take from the video, if any (see
+    --thumbnails). queue is the WorkQueue to render batches on, if any
+    (see --queue).
+    """
+    fn = "render_podcast"
+    globals.log.info("Rendering final podcast...")
     if args.preview:
         globals.log.info("PREVIEW MODE: {fps} fps".format(fps=args.preview))
-        command.append_output_options(["-r", args.preview])
-    command.append_output_options([output])
-    globals.log.debug("{fn}(): {c}".format(fn=fn, c=command))
-    if (command.run() != 0):
+    if frame_stream:
+        frame_stream.start()
+    relay = None
+    if (str(output) == "-"):
+        relay = start_stdout_relay()
+        output = relay[0]
+    if audio_segments:
+        audio_segments = assemble_audio(audio_segments)
+    if render_in_batches(args, audio_segments, video_segments):
+        if audio_segments:
+            audio_segments = render_batches(args, audio_segments, queue)
+        if video_segments and (audio_segments is not None):
+            video_segments = render_batches(args, video_segments, queue)
+    if (audio_segments is None) or (video_segments is None):
+        status = 1
+    elif render_in_chunks(args, video_segments, frame_stream, thumbnails):
+        status = render_chunks(args, audio_segments, video_segments, output,
+                               duration, loudness)
+    elif args.pipeline and audio_segments and video_segments:
+        status = render_pipeline(args, audio_segments, video_segments,
+                                 output, duration, frame_stream, loudness,
+                                 thumbnails)
+    else:
+        command = build_concat_command(
+            args, audio_segments, video_segments, duration,
+            frame_stream=frame_stream, loudness=loudness,
+            quiet=args.quiet and not args.debug)
+        if keyframe_interval(args) and video_segments:
+            command.append_output_options(
+                keyframe_options(keyframe_interval(args)))
+        options, target = output_target(args, output, 0)
+        command.append_output_options(
+            stream_output_options(args) + options + [target])
+        if not args.preview:
+            append_renditions(args, command)
+        if thumbnails:
+            append_thumbnails(command, thumbnails)
+        globals.log.debug("{fn}(): {c}".format(fn=fn, c=command))
+        status = command.run()
+    if frame_stream and not frame_stream.finish():
+        globals.log.error("Failed to stream frames: "
+                          "{e}".format(e=frame_stream.error))
+        status = status or 1
+    if relay:
+        finish_stdout_relay(*relay)
+    if args.hls and not args.preview and (status == 0):
+        status = write_hls_playlist(args)
+    if thumbnails and (status == 0):
+        thumbnails.write_index(duration)
+    if (status != 0):
         globals.log.error("Failed to render final podcast")
+    return status
 
 
 def cleanup(segments):
@@ -502,6 +1941,132 @@ def cleanup(segments):
     globals.log.info("Cleaning up...")
     for s in segments:
         s.delete_temp_files()
+    if Segment._scratch:
+        Segment._scratch.cleanup()
+
+
+def set_stage(stage):
+    """Set the processing stage for resource accounting, if enabled."""
+    if ShellCommand.accountant:
+        ShellCommand.accountant.set_stage(stage)
+
+
+def plan_mode(args):
+    """Return the mode that stage costs are kept for (see StageHistory)."""
+    return "preview" if args.preview else "full"
+
+
+def frame_sources(video_segments, previous):
+    """Return the distinct frames of the frame segments, by source.
+    
+    The result maps each frame to the kind of source it comes from
+    ("slide", "image" or "video").
+    """
+    frames = {}
+    for f in video_segments:
+        if not isinstance(f, FrameSegment):
+            continue
+        if (f.input_file == "^"):
+            source = previous[f]
+            if not isinstance(source, FrameSegment):
+                frames[(source.segment_number, f.frame_number)] = "video"
+                continue
+        else:
+            source = f
+        suffix = PurePath(source.input_file).suffix.lower()
+        frames[(str(Path(source.input_file).resolve()),
+                source.frame_number)] = (
+            "slide" if (suffix == ".pdf") else "image")
+    return frames
+
+
+def stage_units(segments, video_segments, previous, duration):
+    """Return the units of work for each stage (see StageHistory).
+    
+    segments is the whole timeline (all of which is probed), whereas
+    video_segments and duration are what's rendered.
+    """
+    return {
+        "probe": len({str(s.input_file) for s in segments
+                      if not isinstance(s, FrameSegment)}),
+        "frames": len(frame_sources(video_segments, previous)),
+        "render": duration,
+    }
+
+
+def make_plan(args, units, problems, audio_segments, video_segments,
+              previous):
+    """Return the execution plan of the job (see --plan)."""
+    history = StageHistory(Path(args.cache_dir, "history.json"))
+    plan = Plan(history.costs(plan_mode(args)))
+    for p in problems:
+        plan.problem(p)
+    plan.add_stage("probe", units["probe"])
+    kinds = list(frame_sources(video_segments, previous).values())
+    plan.add_stage("frames", units["frames"], (
+        "{s} slides, {i} images and {v} frames from video{t}".format(
+            s=kinds.count("slide"), i=kinds.count("image"),
+            v=kinds.count("video"),
+            t=", streamed" if args.stream_frames else "")))
+    description = "{a} audio and {v} video segments to {o}".format(
+        a=len(audio_segments), v=len(video_segments), o=args.output)
+    if render_in_batches(args, audio_segments, video_segments):
+        description += ", in batches of {b}".format(b=args.batch_size)
+    plan.add_stage("render", units["render"], description)
+    return plan
+
+
+def show_plan(plan):
+    """Print the execution plan and any problems."""
+    print("Execution plan:")
+    print(plan.table())
+    for p in plan.problems:
+        globals.log.error(p)
+    if plan.ok():
+        globals.log.info("No problems found")
+
+
+def record_history(args, units):
+    """Record the costs of a successful run, for later plans."""
+    cpu_times = {s: u.cpu_time() for s, u in
+                 ShellCommand.accountant.by_stage().items()}
+    disk = {}
+    for f, size in Segment._scratch.sizes().items():
+        # Directories (e.g., of rasterised slides) aren't tracked file
+        # by file.
+        if f.is_dir():
+            size = sum(i.stat().st_size for i in f.rglob("*")
+                       if i.is_file())
+            stage = "frames"
+        elif (f.suffix in Segment._SMALL_SUFFIXES):
+            stage = "frames"
+        else:
+            stage = "render"
+        disk[stage] = disk.get(stage, 0) + size
+    StageHistory(Path(args.cache_dir, "history.json")).record(
+        plan_mode(args), units, cpu_times, disk)
+
+
+def report_run(args, plan=None):
+    """Print the resource usage summary and write the JSON report."""
+    fn = "report_run"
+    accountant = ShellCommand.accountant
+    if accountant and (not args.quiet or args.debug):
+        print("Resource usage by stage:")
+        print(accountant.summary_table())
+    if Segment._scratch:
+        globals.log.debug("{fn}(): temporary files used {s} bytes".format(
+            fn=fn, s=Segment._scratch.total_size()))
+    if args.report:
+        report = {"output": str(args.output)}
+        if accountant:
+            report["resource_usage"] = accountant.as_dict()
+        if Segment._scratch:
+            report["scratch"] = Segment._scratch.as_dict()
+        if plan:
+            report["plan"] = plan.as_dict()
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
 
 
 def main():
@@ -509,14 +2074,34 @@ def main():
     logging.basicConfig(
         level=logging.INFO,
         format="%(levelname)s: {p}: %(message)s".format(p=globals.PROGRAM))
+    args = None
     segments = None
+    status = None
+    units = None
+    plan = None
     
     try:
         args = parse_command_line()
         check_arguments(args)
+        if args.resource_usage:
+            ShellCommand.accountant = ResourceAccountant()
+        if not args.plan:
+            make_scratch_workspace(args)
+        queue = (WorkQueue(args.queue, wait_timeout=args.queue_timeout)
+                 if args.queue else None)
+        capabilities = Capabilities(
+            Path(args.cache_dir, "capabilities.json"))
+        choose_encoders(args, capabilities)
     
         config = get_configuration(args)
+        # Check all the input files before probing any of them.
+        problems = check_configuration(config)
+        if problems:
+            for p in problems:
+                globals.log.error(p)
+            sys.exit(1)
     
+        set_stage("probe")
         segments = process_input_streams(args, config)
         globals.log.debug("{fn}(): audio segments = {a}".format(
             fn=fn, a=[s for s in segments if isinstance(s, AudioSegment)]))
@@ -533,29 +2118,118 @@ def main():
         globals.log.debug("{fn}(): video duration = "
                           "{v}".format(fn=fn, v=video_duration))
     
-        if (len(audio_segments) and len(video_segments)):
-            if (audio_duration != video_duration):
-                globals.log.warning("total video duration ({v}s) doesn't match "
-                            "total audio duration "
-                            "({a}s)".format(v=video_duration, a=audio_duration))
+        # These are only fatal for --plan.
+        problems = check_timeline(audio_segments, video_segments)
+        if not args.plan:
+            for p in problems:
+                globals.log.warning(p)
         
+        # Segment numbers (see --segments) refer to the configuration as
+        # written, so work out the window before merging any segments.
+        window = render_window(args, audio_segments, video_segments)
+        # "^" frames use a frame of the previous segment, even if it's
+        # not rendered. Numbered frames are counted from the start of
+        # the segment as written, so find them before merging too.
+        previous = previous_segments(video_segments)
+        segments = coalesce_segments(segments, previous)
+        audio_segments = [s for s in segments if isinstance(s, AudioSegment)]
+        video_segments = [s for s in segments if isinstance(s, VideoSegment)]
         width, height = smallest_video_dimensions(args, video_segments)
+        
+        if window:
+            globals.log.info("Rendering from {s} to {e}".format(
+                s=window[0], e=window[1] or "the end"))
+            audio_segments = clip_segments(audio_segments, *window)
+            video_segments = clip_segments(video_segments, *window,
+                                           previous=previous)
+            clip_previous_segments(previous, video_segments)
+            previous = {f: p for f, p in previous.items()
+                        if f in video_segments}
+            audio_duration = sum([s.get_duration() for s in audio_segments])
+            video_duration = sum([s.get_duration() for s in video_segments])
+            if not (audio_segments or video_segments):
+                globals.log.error("nothing to render in that range")
+                sys.exit(1)
+        
+        units = stage_units(segments, video_segments, previous,
+                            max(audio_duration, video_duration))
+        if args.plan:
+            plan = make_plan(args, units, problems, audio_segments,
+                             video_segments, previous)
+            show_plan(plan)
+            if not plan.ok():
+                sys.exit(1)
+            return
+        
+        if args.resume:
+            start_checkpoint(args, audio_segments + video_segments +
+                             list(previous.values()))
+        
+        # Proxies are generated in the background from here on.
+        proxies = start_proxies(
+            args, video_segments + list(previous.values()))
+        
         globals.log.debug("{fn}(): width = {w}, height = "
                           "{h}".format(fn=fn, w=width, h=height))
         
-        process_frame_segments(args, segments, width, height)
+        if args.preview:
+            width, height = setup_preview(args, video_segments, width,
+                                          height)
+        if proxies:
+            use_proxies(proxies, audio_segments + video_segments +
+                        list(previous.values()))
+        
+        set_stage("frames")
+        # Measure loudness while frames are being processed.
+        loudness = start_loudness_measurement(args, audio_segments,
+                                              audio_duration)
+        frame_stream = None
+        if args.stream_frames:
+            # Frames are generated while rendering.
+            frame_stream = stream_frame_segments(args, video_segments,
+                                                 previous, width, height)
+        else:
+            process_frame_segments(args, video_segments, previous, width,
+                                   height, capabilities, queue)
     
         globals.log.debug("{fn}(): input files = "
                           "{i}".format(fn=fn, i=Segment.input_files()))
     
-        render_podcast(args, audio_segments, video_segments, args.output,
-                       max(audio_duration, video_duration))
+        set_stage("render")
+        measured = None
+        if loudness:
+            measured = loudness.result()
+            if not measured:
+                globals.log.warning("failed to measure loudness, "
+                                    "normalising in a single pass")
+            globals.log.debug("{fn}(): loudness = {m}".format(
+                fn=fn, m=measured))
+        thumbnails = None
+        if args.thumbnails and video_segments and not args.preview:
+            thumbnails = Thumbnails(args.thumbnails, args.thumbnail_interval,
+                                    width, height)
+        status = render_podcast(args, audio_segments, video_segments,
+                                args.output,
+                                max(audio_duration, video_duration),
+                                frame_stream, measured, thumbnails, queue)
 
     except (KeyboardInterrupt):
         pass
     finally:
-        if segments and not args.keep:
+        # Record the size of temporary files before they're deleted.
+        if Segment._scratch:
+            Segment._scratch.update_sizes()
+            if (status == 0) and units and ShellCommand.accountant:
+                record_history(args, units)
+        if args and args.resume and (status != 0) and Segment._scratch:
+            # Keep the completed work for next time (but not forever).
+            Segment._scratch.keep(permanent=False)
+            globals.log.info("Run again with --resume to carry on from "
+                             "{p}".format(p=Segment._scratch.path))
+        elif segments and not (args.keep or args.plan):
             cleanup(segments)
+        if args:
+            report_run(args, plan)
 
 
 if (__name__ == "__main__"):
@@ -0,0 +1,3 @@
+from proxy.proxy import (
+    ProxyCache,
+)
@@ -0,0 +1,99 @@
+import concurrent.futures
+import hashlib
+import os
+from pathlib import Path
+
+import globals
+from shell_command import FFmpegCommand
+
+
+class ProxyCache(object):
+    """Low resolution proxies of source videos, kept between runs.
+
+    Each unique source is transcoded once to a small, all-intra proxy
+    (so that seeking and extracting frames is cheap), in parallel and
+    in the background. Proxies are keyed by the source's identity
+    (path, size and modification time), so a modified source gets a
+    new proxy.
+    """
+    HEIGHT = 360
+    SUFFIX = ".mkv"
+
+    def __init__(self, directory, max_workers=None):
+        self.directory = Path(directory)
+        self.max_workers = max_workers
+        self._executor = None
+        self._futures = {}
+
+    @staticmethod
+    def key(file):
+        """Return the cache key for a source file."""
+        stat = os.stat(str(file))
+        identity = "{p}\0{s}\0{m}".format(
+            p=Path(file).resolve(), s=stat.st_size, m=stat.st_mtime_ns)
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def path(self, file):
+        """Return the path of the proxy for a source file."""
+        return (self.directory / self.key(file)).with_suffix(self.SUFFIX)
+
+    def _transcode(self, file, proxy):
+        """Transcode file to proxy. Return the exit status."""
+        fn = "_transcode"
+        command = FFmpegCommand(
+            input_options=["-i", file],
+            output_options=["-map", "0:v", "-map", "0:a?",
+                            "-filter:v", "scale=-2:{h}".format(h=self.HEIGHT),
+                            "-codec:v", "h264", "-preset", "ultrafast",
+                            "-pix_fmt", "yuv420p",
+                            # Every frame is a key frame.
+                            "-g", "1",
+                            "-codec:a", "copy",
+                            "-f", "matroska", proxy])
+        globals.log.debug("{cls}.{fn}(): {cmd}".format(
+            cls=self.__class__.__name__, fn=fn, cmd=command))
+        return command.run()
+
+    def _build(self, file):
+        """Return the proxy for file, generating it if necessary.
+
+        Returns None if the proxy can't be generated.
+        """
+        proxy = self.path(file)
+        if proxy.exists():
+            return proxy
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name so that an interrupted (or
+        # concurrent) job never leaves a partial proxy behind.
+        temp = proxy.with_name("{n}.{p}.part".format(n=proxy.name,
+                                                     p=os.getpid()))
+        try:
+            if (self._transcode(file, temp) == 0):
+                os.replace(str(temp), str(proxy))
+                return proxy
+        finally:
+            if temp.exists():
+                temp.unlink()
+        return None
+
+    def start(self, files):
+        """Start generating proxies for files in the background."""
+        if not self._executor:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers)
+        for f in files:
+            if f not in self._futures:
+                self._futures[f] = self._executor.submit(self._build, f)
+
+    def result(self, file):
+        """Wait for the proxy of file and return it (None on failure)."""
+        try:
+            return self._futures[file].result()
+        except (KeyError, OSError):
+            return None
+
+    def shutdown(self):
+        """Wait for all proxies and release the worker threads."""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
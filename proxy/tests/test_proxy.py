@@ -0,0 +1,97 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from proxy import ProxyCache
+
+
+class FakeProxyCache(ProxyCache):
+    """A proxy cache that doesn't need ffmpeg."""
+
+    def __init__(self, directory):
+        super().__init__(directory, max_workers=2)
+        self.transcoded = []
+
+    def _transcode(self, file, proxy):
+        self.transcoded.append(file)
+        if Path(file).name == "bad.mov":
+            Path(proxy).write_bytes(b"partial")
+            return 1
+        Path(proxy).write_bytes(b"proxy of " + Path(file).read_bytes())
+        return 0
+
+
+class ProxyCacheTestCase(unittest.TestCase):
+    """Test the ProxyCache class."""
+
+    def setUp(self):
+        """Set up source files and a cache."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.sources = []
+        for name in ["one.mov", "two.mov", "bad.mov"]:
+            source = Path(self.directory.name, name)
+            source.write_bytes(name.encode())
+            self.sources.append(source)
+        self.cache_dir = Path(self.directory.name, "proxies")
+        self.cache = FakeProxyCache(self.cache_dir)
+
+    def tearDown(self):
+        """Remove the sources and cache."""
+        self.cache.shutdown()
+        self.directory.cleanup()
+
+    def test_key(self):
+        """Test that the key depends on the source's identity."""
+        one, two, _ = self.sources
+        key = ProxyCache.key(one)
+        test_data = (
+            (ProxyCache.key(one) == key, True, "same source"),
+            (ProxyCache.key(two) == key, False, "different source"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        one.write_bytes(b"modified")
+        with self.subTest(msg="modified source"):
+            self.assertNotEqual(ProxyCache.key(one), key)
+
+    def test_build(self):
+        """Test generating proxies in the background."""
+        one, two, bad = self.sources
+        self.cache.start(self.sources)
+        test_data = (
+            (self.cache.result(one).read_bytes(), b"proxy of one.mov",
+                "first proxy"),
+            (self.cache.result(two).read_bytes(), b"proxy of two.mov",
+                "second proxy"),
+            (self.cache.result(bad), None, "failed proxy"),
+            (self.cache.result("unknown.mov"), None, "unknown source"),
+            (sorted(p.name for p in self.cache_dir.iterdir()),
+                sorted([self.cache.path(one).name,
+                        self.cache.path(two).name]),
+                "no partial proxies are left behind"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_reuse(self):
+        """Test that existing proxies are reused."""
+        one = self.sources[0]
+        self.cache.start([one, one])
+        self.cache.result(one)
+        later = FakeProxyCache(self.cache_dir)
+        later.start([one])
+        self.assertEqual(later.result(one), self.cache.path(one))
+        later.shutdown()
+        self.assertEqual(self.cache.transcoded + later.transcoded, [one])
+
+    def test_missing_source(self):
+        """Test that a missing source has no proxy."""
+        missing = Path(self.directory.name, "missing.mov")
+        self.cache.start([missing])
+        self.assertIsNone(self.cache.result(missing))
+
+
+if __name__ == '__main__':
+    unittest.main()
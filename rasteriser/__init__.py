@@ -0,0 +1,8 @@
+from rasteriser.rasteriser import (
+    Rasteriser,
+    PdftoppmRasteriser,
+    MutoolRasteriser,
+    ConvertRasteriser,
+    RASTERISERS,
+    make_rasteriser,
+)
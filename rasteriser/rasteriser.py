@@ -0,0 +1,239 @@
+import concurrent.futures
+import math
+import os
+from pathlib import Path
+import re
+
+import globals
+from shell_command import ConvertCommand, ShellCommand, ToolPath
+
+
+class _RasteriserCommand(ShellCommand):
+    """A command that runs a rasteriser tool."""
+    
+    def __init__(self, executable, options):
+        super().__init__(input_options=options, output_options=[])
+        self._executable = executable
+
+
+class Rasteriser(object):
+    """Rasterise PDF pages to PNG images that fit within width x height.
+    
+    The pages needed from a PDF are split into (at most) max_workers
+    chunks of consecutive pages, which are rendered in parallel. The
+    images aren't letterboxed: that's done, the same way for every
+    backend, when the frames are rendered (see FrameSegment.letterbox()).
+    
+    Pages are numbered from 0, like frame numbers, and -1 is the last
+    page. Backends render chunks of pages in _rasterise_chunk().
+    
+    If queue is a WorkQueue, the chunks are run by its workers instead
+    (each chunk is still a separate unit of work).
+    """
+    # Name of the backend's tool (see Capabilities), and its path.
+    tool = ""
+    executable = None
+    # Whether the backend understands -1 as the last page itself.
+    negative_pages = False
+    # "Pages:" line of pdfinfo and mutool info output.
+    _PAGES = re.compile(rb"^Pages:\s+(\d+)", re.MULTILINE)
+    
+    def __init__(self, directory, width=2048, height=1536, max_workers=None):
+        self.directory = Path(directory)
+        self.width = width
+        self.height = height
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.queue = None
+        self._documents = {}
+    
+    @classmethod
+    def available(cls, capabilities):
+        """Return True if the backend's tool is installed."""
+        return capabilities.has(cls.tool)
+    
+    def chunks(self, pages):
+        """Split pages into (at most) max_workers lists of page runs.
+        
+        Each run is a (first, last) pair of consecutive pages.
+        """
+        pages = sorted(set(pages))
+        size = max(math.ceil(len(pages) / self.max_workers), 1)
+        chunks = []
+        for i in range(0, len(pages), size):
+            runs = []
+            for p in pages[i:i + size]:
+                if runs and (runs[-1][1] == p - 1):
+                    runs[-1] = (runs[-1][0], p)
+                else:
+                    runs.append((p, p))
+            chunks.append(runs)
+        return chunks
+    
+    def _prefix(self, pdf):
+        """Return a unique file name prefix for the pages of pdf."""
+        pdf = Path(pdf).resolve()
+        if pdf not in self._documents:
+            self._documents[pdf] = "{s}_{n:03d}".format(
+                s=pdf.stem, n=len(self._documents))
+        return self.directory / self._documents[pdf]
+    
+    def _run_command(self, command):
+        """Run command here or on the queue. Return True if it succeeds."""
+        fn = "_run_command"
+        globals.log.debug("{cls}.{fn}(): {cmd}".format(
+            cls=self.__class__.__name__, fn=fn, cmd=command))
+        if self.queue:
+            return self.queue.run([command]) == [0]
+        return command.get_binary_output() is not None
+    
+    def _run(self, options):
+        """Run the backend's tool. Return True if it succeeds."""
+        return self._run_command(_RasteriserCommand(self.executable, options))
+    
+    def _info_command(self, pdf):
+        """Return a command that prints the page count of pdf, or None."""
+        return None
+    
+    def page_count(self, pdf):
+        """Return the number of pages in pdf, or None if it's unknown."""
+        fn = "page_count"
+        command = self._info_command(pdf)
+        if not command:
+            return None
+        globals.log.debug("{cls}.{fn}(): {cmd}".format(
+            cls=self.__class__.__name__, fn=fn, cmd=command))
+        match = self._PAGES.search(command.get_binary_output() or b"")
+        return int(match.group(1)) if match else None
+    
+    def rasterise(self, pdf, pages):
+        """Rasterise pages of pdf. Return {page: image file}.
+        
+        Pages that fail are missing from the result.
+        """
+        fn = "rasterise"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Fix the prefix before starting any threads.
+        self._prefix(pdf)
+        # The page that each requested page really is.
+        actual = {p: p for p in pages}
+        if (-1 in actual) and not self.negative_pages:
+            count = self.page_count(pdf)
+            if count:
+                actual[-1] = count - 1
+            else:
+                globals.log.warning("can't find the last page of "
+                                    "{p}".format(p=pdf))
+                del actual[-1]
+            globals.log.debug("{cls}.{fn}(): {p} has {n} pages".format(
+                cls=self.__class__.__name__, fn=fn, p=pdf, n=count))
+        images = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers) as executor:
+            for result in executor.map(
+                    lambda runs: self._rasterise_chunk(pdf, runs),
+                    self.chunks(actual.values())):
+                images.update(result)
+        return {p: images[a] for p, a in actual.items() if a in images}
+
+
+class PdftoppmRasteriser(Rasteriser):
+    """Rasterise with pdftoppm (from Poppler)."""
+    tool = "pdftoppm"
+    executable = ToolPath(tool)
+    info = ToolPath("pdfinfo")
+    
+    def _info_command(self, pdf):
+        return _RasteriserCommand(self.info, [pdf]) if self.info else None
+    
+    def _rasterise_chunk(self, pdf, runs):
+        files = {}
+        for first, last in runs:
+            prefix = "{p}_{f:04d}".format(p=self._prefix(pdf), f=first)
+            # Scale the longest side to fit, so that pages are only ever
+            # scaled down when they're letterboxed.
+            if self._run([
+                    "-png", "-f", str(first + 1), "-l", str(last + 1),
+                    "-scale-to", str(max(self.width, self.height)),
+                    pdf, prefix]):
+                # Output files are named prefix-<page>.png, with the page
+                # number padded to a width that depends on the PDF.
+                for f in Path(prefix).parent.glob(
+                        Path(prefix).name + "-*.png"):
+                    files[int(f.stem.rsplit("-", 1)[1]) - 1] = f
+        return files
+
+
+class MutoolRasteriser(Rasteriser):
+    """Rasterise with mutool draw (from MuPDF)."""
+    tool = "mutool"
+    executable = ToolPath(tool)
+    
+    def _info_command(self, pdf):
+        return _RasteriserCommand(self.executable, ["info", pdf])
+    
+    def _rasterise_chunk(self, pdf, runs):
+        prefix = "{p}_{f:04d}".format(p=self._prefix(pdf), f=runs[0][0])
+        # mutool scales pages to fit width x height by default.
+        if not self._run([
+                "draw", "-q", "-c", "rgb",
+                "-w", str(self.width), "-h", str(self.height),
+                "-o", prefix + "-%d.png", pdf,
+                ",".join("{f}-{l}".format(f=f + 1, l=l + 1)
+                         for f, l in runs)]):
+            return {}
+        return {p: Path("{x}-{n}.png".format(x=prefix, n=p + 1))
+                for f, l in runs for p in range(f, l + 1)}
+
+
+class ConvertRasteriser(Rasteriser):
+    """Rasterise with ImageMagick convert (via Ghostscript).
+    
+    This is the slowest backend. Each page is a separate command.
+    """
+    tool = "convert"
+    negative_pages = True
+    
+    @classmethod
+    def available(cls, capabilities):
+        return capabilities.can_read("pdf")
+    
+    def _rasterise_chunk(self, pdf, runs):
+        images = {}
+        for first, last in runs:
+            for page in range(first, last + 1):
+                image = Path("{p}_{n:04d}.png".format(
+                    p=self._prefix(pdf), n=page))
+                command = ConvertCommand(
+                    input_options=["{f}[{n}]".format(f=pdf, n=page)],
+                    output_options=["png24:{i}".format(i=image)],
+                    width=self.width, height=self.height, letterbox=False)
+                if self._run_command(command):
+                    images[page] = image
+        return images
+
+
+# Backends, fastest first.
+RASTERISERS = {"pdftoppm": PdftoppmRasteriser,
+               "mutool": MutoolRasteriser,
+               "convert": ConvertRasteriser}
+
+
+def make_rasteriser(capabilities, directory, width=2048, height=1536,
+                    name=None):
+    """Return the fastest available rasteriser (or the one named).
+    
+    Falls back to convert if nothing else is available, even if it
+    doesn't seem to be able to read PDFs.
+    """
+    fn = "make_rasteriser"
+    names = [name] if name else list(RASTERISERS)
+    for n in names:
+        if RASTERISERS[n].available(capabilities):
+            break
+    else:
+        if name:
+            globals.log.warning("{n} isn't installed, using "
+                                "convert".format(n=name))
+        n = "convert"
+    globals.log.debug("{fn}(): using {n}".format(fn=fn, n=n))
+    return RASTERISERS[n](directory, width=width, height=height)
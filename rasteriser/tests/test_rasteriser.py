@@ -0,0 +1,174 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from rasteriser import (
+    ConvertRasteriser, MutoolRasteriser, PdftoppmRasteriser, Rasteriser,
+    make_rasteriser
+)
+
+
+class FakeCapabilities(object):
+    """Capabilities with a fixed set of tools."""
+
+    def __init__(self, tools, pdf=True):
+        self.tools = tools
+        self.pdf = pdf
+
+    def has(self, tool):
+        return tool in self.tools
+
+    def can_read(self, format):
+        return self.pdf
+
+
+class FakeInfoCommand(object):
+    """A pdfinfo command that doesn't need pdfinfo."""
+
+    def __init__(self, output):
+        self.output = output
+
+    def get_binary_output(self):
+        return self.output
+
+
+class FakePdftoppmRasteriser(PdftoppmRasteriser):
+    """A pdftoppm rasteriser that doesn't need pdftoppm."""
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(directory, max_workers=2, **kwargs)
+        self.commands = []
+
+    def _info_command(self, pdf):
+        if (Path(pdf).name == "deck.pdf"):
+            return FakeInfoCommand(b"Title:    Deck\nPages:          6\n")
+        return FakeInfoCommand(None)
+
+    def _run(self, options):
+        self.commands.append(options)
+        first, last = int(options[2]), int(options[4])
+        if (Path(options[-2]).name == "bad.pdf"):
+            return False
+        for p in range(first, last + 1):
+            Path("{x}-{p:02d}.png".format(x=options[-1], p=p)).write_bytes(
+                "page {p}".format(p=p).encode())
+        return True
+
+
+class FakeQueue(object):
+    """A work queue that records commands instead of running them."""
+
+    def __init__(self):
+        self.commands = []
+
+    def run(self, commands):
+        self.commands.extend(commands)
+        return [0] * len(commands)
+
+
+class RasteriserTestCase(unittest.TestCase):
+    """Test the Rasteriser classes."""
+
+    def setUp(self):
+        """Set up a directory for images."""
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove the images."""
+        self.directory.cleanup()
+
+    def test_chunks(self):
+        """Test splitting pages between workers."""
+        test_data = (
+            (1, [3, 1, 2], [[(1, 3)]], "one worker"),
+            (2, [0, 1, 2, 3], [[(0, 1)], [(2, 3)]], "two workers"),
+            (2, [0, 2, 3, 7, 2], [[(0, 0), (2, 2)], [(3, 3), (7, 7)]],
+                "gaps and repeats"),
+            (4, [5], [[(5, 5)]], "more workers than pages"),
+        )
+        for workers, pages, expected, description in test_data:
+            with self.subTest(msg=description):
+                rasteriser = Rasteriser(self.directory.name,
+                                        max_workers=workers)
+                self.assertEqual(rasteriser.chunks(pages), expected)
+
+    def test_rasterise(self):
+        """Test rasterising pages in parallel."""
+        directory = Path(self.directory.name, "slides")
+        rasteriser = FakePdftoppmRasteriser(directory, width=640, height=480)
+        images = rasteriser.rasterise("deck.pdf", [4, 0, 1])
+        test_data = (
+            (sorted(images), [0, 1, 4], "pages"),
+            ({p: Path(f).read_bytes() for p, f in images.items()},
+                {0: b"page 1", 1: b"page 2", 4: b"page 5"},
+                "images"),
+            (sorted(c[1:5] for c in rasteriser.commands),
+                [["-f", "1", "-l", "2"], ["-f", "5", "-l", "5"]],
+                "page ranges (numbered from 1)"),
+            ({c[6] for c in rasteriser.commands}, {"640"},
+                "rendered at the target size"),
+            (rasteriser.rasterise("bad.pdf", [0]), {}, "failed pages"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_last_page(self):
+        """Test rasterising the last page (-1, or "last")."""
+        directory = Path(self.directory.name, "slides")
+        rasteriser = FakePdftoppmRasteriser(directory)
+        images = rasteriser.rasterise("deck.pdf", [-1, 0])
+        test_data = (
+            ({p: Path(f).read_bytes() for p, f in images.items()},
+                {-1: b"page 6", 0: b"page 1"}, "images"),
+            (sorted(c[1:5] for c in rasteriser.commands),
+                [["-f", "1", "-l", "1"], ["-f", "6", "-l", "6"]],
+                "last page is resolved"),
+            (rasteriser.rasterise("unknown.pdf", [-1]), {},
+                "unknown page count"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_queue(self):
+        """Test running chunks on a work queue."""
+        rasteriser = MutoolRasteriser(self.directory.name, max_workers=2)
+        rasteriser.queue = FakeQueue()
+        images = rasteriser.rasterise("deck.pdf", [0, 1, 3])
+        test_data = (
+            (sorted(images), [0, 1, 3], "pages"),
+            (sorted(c.argument_list()[-1]
+                    for c in rasteriser.queue.commands),
+                ["1-2", "4-4"], "one unit per chunk"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_make_rasteriser(self):
+        """Test choosing the fastest available backend."""
+        test_data = (
+            (FakeCapabilities(["pdftoppm", "mutool"]), None,
+                PdftoppmRasteriser, "pdftoppm is fastest"),
+            (FakeCapabilities(["mutool"]), None, MutoolRasteriser,
+                "mutool is next"),
+            (FakeCapabilities([]), None, ConvertRasteriser,
+                "convert is the fallback"),
+            (FakeCapabilities([], pdf=False), None, ConvertRasteriser,
+                "convert even if it can't seem to read PDFs"),
+            (FakeCapabilities(["pdftoppm", "mutool"]), "mutool",
+                MutoolRasteriser, "named backend"),
+            (FakeCapabilities(["pdftoppm"]), "mutool", ConvertRasteriser,
+                "named backend isn't installed"),
+        )
+        for capabilities, name, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertIsInstance(
+                    make_rasteriser(capabilities, self.directory.name,
+                                    name=name),
+                    expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
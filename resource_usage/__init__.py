@@ -0,0 +1,5 @@
+from resource_usage.resource_usage import (
+    ProcessUsage,
+    ResourceAccountant,
+    human_size,
+)
@@ -0,0 +1,178 @@
+from pathlib import Path
+
+
+class ProcessUsage(object):
+    """Resources consumed by a single child process.
+
+    Times are in seconds, max_rss is in KiB (as reported by
+    getrusage() on Linux) and I/O counts are in bytes.
+    """
+    # Fields reported in summaries, in display order.
+    FIELDS = ["count", "wall_time", "user_time", "system_time",
+              "max_rss", "read_bytes", "write_bytes"]
+
+    def __init__(self, command="", stage="", wall_time=0.0, user_time=0.0,
+                 system_time=0.0, max_rss=0, read_bytes=0, write_bytes=0):
+        self.command = command
+        self.stage = stage
+        self.count = 1
+        self.wall_time = wall_time
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss = max_rss
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+
+    def __repr__(self):
+        return ("<{c} {cmd} ({s}): wall {w:.2f}s, cpu {cpu:.2f}s, "
+                "max rss {r} KiB>".format(c=self.__class__.__name__,
+                                           cmd=self.command, s=self.stage,
+                                           w=self.wall_time,
+                                           cpu=self.cpu_time(),
+                                           r=self.max_rss))
+
+    def cpu_time(self):
+        """Return the total (user + system) CPU time."""
+        return self.user_time + self.system_time
+
+    def add(self, other):
+        """Accumulate another usage record into this one.
+
+        Times and I/O are summed, whereas max_rss is the peak across
+        all records, because processes run one after another.
+        """
+        self.count += other.count
+        self.wall_time += other.wall_time
+        self.user_time += other.user_time
+        self.system_time += other.system_time
+        self.max_rss = max(self.max_rss, other.max_rss)
+        self.read_bytes += other.read_bytes
+        self.write_bytes += other.write_bytes
+
+    def as_dict(self):
+        """Return the usage as a dictionary (e.g., for JSON output)."""
+        d = {f: getattr(self, f) for f in self.FIELDS}
+        d["cpu_time"] = self.cpu_time()
+        return d
+
+
+class ResourceAccountant(object):
+    """Collect resource usage of every child process that we start.
+
+    Usage is recorded against the current stage (e.g., "frames"),
+    which the caller sets as processing proceeds.
+    """
+
+    def __init__(self, stage="setup"):
+        self.stage = stage
+        self.records = []
+
+    @staticmethod
+    def read_proc_io(pid):
+        """Read I/O counters for a (possibly defunct) process.
+
+        This must be called before the process is reaped. Returns an
+        empty dictionary if /proc/<pid>/io isn't available (e.g., not
+        Linux, or insufficient permissions).
+        """
+        counters = {}
+        try:
+            with Path("/proc", str(pid), "io").open() as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    counters[key.strip()] = int(value)
+        except (OSError, ValueError):
+            pass
+        return counters
+
+    def set_stage(self, stage):
+        """Set the stage that subsequent usage is recorded against."""
+        self.stage = stage
+
+    def record(self, command, wall_time, rusage, io=None):
+        """Record the usage of a reaped child process.
+
+        rusage is the resource.struct_rusage returned by os.wait4(),
+        and io is the result of read_proc_io(). Falls back to block
+        counts from rusage if no I/O counters are available.
+        """
+        if io:
+            read_bytes = io.get("read_bytes", 0)
+            write_bytes = io.get("write_bytes", 0)
+        else:
+            read_bytes = rusage.ru_inblock * 512
+            write_bytes = rusage.ru_oublock * 512
+        usage = ProcessUsage(command=command, stage=self.stage,
+                             wall_time=wall_time,
+                             user_time=rusage.ru_utime,
+                             system_time=rusage.ru_stime,
+                             max_rss=rusage.ru_maxrss,
+                             read_bytes=read_bytes,
+                             write_bytes=write_bytes)
+        self.records.append(usage)
+        return usage
+
+    def _aggregate(self, key):
+        """Aggregate records into a dictionary keyed by key(record)."""
+        totals = {}
+        for r in self.records:
+            k = key(r)
+            if k in totals:
+                totals[k].add(r)
+            else:
+                totals[k] = ProcessUsage(command=r.command, stage=r.stage)
+                totals[k].count = 0
+                totals[k].add(r)
+        return totals
+
+    def by_stage(self):
+        """Return usage totals for each stage, in order of first use."""
+        return self._aggregate(lambda r: r.stage)
+
+    def by_command(self):
+        """Return usage totals for each command, in order of first use."""
+        return self._aggregate(lambda r: r.command)
+
+    def total(self):
+        """Return usage totals for the entire job."""
+        total = ProcessUsage(command="total", stage="total")
+        total.count = 0
+        for r in self.records:
+            total.add(r)
+        return total
+
+    def summary_table(self):
+        """Return a printable table of usage per stage and for the job."""
+        header = "{:<12} {:>5} {:>9} {:>9} {:>10} {:>10} {:>10}".format(
+            "stage", "procs", "wall (s)", "cpu (s)", "max rss", "read",
+            "written")
+        row = "{:<12} {:>5} {:>9.2f} {:>9.2f} {:>10} {:>10} {:>10}"
+        lines = [header, "-" * len(header)]
+        rows = list(self.by_stage().items()) + [("total", self.total())]
+        for stage, u in rows:
+            if stage == "total":
+                lines.append("-" * len(header))
+            lines.append(row.format(
+                stage, u.count, u.wall_time, u.cpu_time(),
+                human_size(u.max_rss * 1024), human_size(u.read_bytes),
+                human_size(u.write_bytes)))
+        return "\n".join(lines)
+
+    def as_dict(self):
+        """Return all usage data as a dictionary (e.g., for JSON output)."""
+        return {
+            "total": self.total().as_dict(),
+            "stages": {k: v.as_dict() for k, v in self.by_stage().items()},
+            "commands": {k: v.as_dict()
+                         for k, v in self.by_command().items()},
+        }
+
+
+def human_size(num_bytes):
+    """Format a byte count using binary units (e.g., 1.5M)."""
+    size = float(num_bytes)
+    for unit in ["B", "K", "M", "G"]:
+        if size < 1024:
+            return "{s:.1f}{u}".format(s=size, u=unit)
+        size /= 1024
+    return "{s:.1f}T".format(s=size)
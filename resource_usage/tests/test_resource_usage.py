@@ -0,0 +1,114 @@
+import os
+import resource
+import shutil
+import unittest
+
+from resource_usage import ProcessUsage, ResourceAccountant
+from shell_command import ShellCommand
+
+
+def fake_rusage(utime=1.0, stime=0.5, maxrss=1000, inblock=0, oublock=0):
+    """Build a struct_rusage with the specified values."""
+    values = [0] * resource.struct_rusage.n_fields
+    values[0], values[1], values[2] = utime, stime, maxrss
+    values[9], values[10] = inblock, oublock
+    return resource.struct_rusage(values)
+
+
+class ProcessUsageTestCase(unittest.TestCase):
+    """Test the ProcessUsage class."""
+
+    def test_add(self):
+        """Test accumulating usage records."""
+        usage = ProcessUsage(wall_time=1, user_time=2, system_time=3,
+                             max_rss=100, read_bytes=10, write_bytes=20)
+        usage.add(ProcessUsage(wall_time=1, user_time=1, system_time=1,
+                               max_rss=50, read_bytes=5, write_bytes=5))
+        test_data = (
+            (usage.count, 2, "count is summed"),
+            (usage.wall_time, 2, "wall time is summed"),
+            (usage.cpu_time(), 7, "CPU time is summed"),
+            (usage.max_rss, 100, "max RSS is the peak"),
+            (usage.read_bytes, 15, "read bytes are summed"),
+            (usage.write_bytes, 25, "written bytes are summed"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+class ResourceAccountantTestCase(unittest.TestCase):
+    """Test the ResourceAccountant class."""
+
+    def setUp(self):
+        """Set up for test."""
+        self.accountant = ResourceAccountant()
+
+    def tearDown(self):
+        """Clean up after test."""
+        self.accountant = None
+        ShellCommand.accountant = None
+
+    def test_record_io(self):
+        """Test recording with and without /proc I/O counters."""
+        with self.subTest(msg="uses /proc counters"):
+            usage = self.accountant.record(
+                "ffmpeg", 1.0, fake_rusage(inblock=1, oublock=1),
+                {"read_bytes": 4096, "write_bytes": 8192})
+            self.assertEqual((usage.read_bytes, usage.write_bytes),
+                             (4096, 8192))
+        with self.subTest(msg="falls back to rusage block counts"):
+            usage = self.accountant.record(
+                "ffmpeg", 1.0, fake_rusage(inblock=2, oublock=3))
+            self.assertEqual((usage.read_bytes, usage.write_bytes),
+                             (1024, 1536))
+
+    def test_aggregation(self):
+        """Test aggregation by stage, by command and for the job."""
+        self.accountant.set_stage("frames")
+        self.accountant.record("convert", 2.0, fake_rusage(maxrss=5000))
+        self.accountant.record("convert", 2.0, fake_rusage(maxrss=7000))
+        self.accountant.set_stage("render")
+        self.accountant.record("ffmpeg", 10.0, fake_rusage(maxrss=3000))
+        stages = self.accountant.by_stage()
+        with self.subTest(msg="stages in order of first use"):
+            self.assertEqual(list(stages), ["frames", "render"])
+        with self.subTest(msg="per stage totals"):
+            self.assertEqual(stages["frames"].count, 2)
+            self.assertEqual(stages["frames"].wall_time, 4.0)
+            self.assertEqual(stages["frames"].max_rss, 7000)
+        with self.subTest(msg="per command totals"):
+            self.assertEqual(self.accountant.by_command()["ffmpeg"].count, 1)
+        with self.subTest(msg="job totals"):
+            total = self.accountant.total()
+            self.assertEqual(total.count, 3)
+            self.assertEqual(total.cpu_time(), 4.5)
+            self.assertEqual(total.max_rss, 7000)
+        with self.subTest(msg="summary table includes every stage"):
+            table = self.accountant.summary_table()
+            for stage in ["frames", "render", "total"]:
+                self.assertIn(stage, table)
+
+    def test_read_proc_io(self):
+        """Test reading I/O counters of the current process."""
+        io = ResourceAccountant.read_proc_io(os.getpid())
+        if not os.path.exists("/proc/self/io"):
+            self.assertEqual(io, {})
+        else:
+            self.assertIn("read_bytes", io)
+
+    @unittest.skipUnless(shutil.which("true"), "requires true(1)")
+    def test_shell_command_accounting(self):
+        """Test that running a command records its usage."""
+        class TrueCommand(ShellCommand):
+            _executable = shutil.which("true")
+
+        ShellCommand.accountant = self.accountant
+        self.accountant.set_stage("test")
+        command = TrueCommand(input_options=[], output_options=[])
+        with self.subTest(msg="exit status is preserved"):
+            self.assertEqual(command.run(), 0)
+        with self.subTest(msg="usage is recorded"):
+            self.assertEqual(len(self.accountant.records), 1)
+            self.assertEqual(self.accountant.records[0].command, "true")
+            self.assertEqual(self.accountant.records[0].stage, "test")
@@ -0,0 +1,4 @@
+from scratch.scratch import (
+    Checkpoint,
+    ScratchWorkspace,
+)
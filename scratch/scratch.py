@@ -0,0 +1,254 @@
+import atexit
+import errno
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import signal
+import tempfile
+import time
+
+import globals
+
+
+class ScratchWorkspace(object):
+    """A per-job directory for temporary (intermediate) files.
+
+    Each job gets its own uniquely named directory, so concurrent jobs
+    never clobber each other's intermediates, even if they have the
+    same output file name. Small intermediates (e.g., slide images)
+    can optionally be placed in a separate directory on a faster file
+    system such as tmpfs.
+
+    The workspace records the (peak) size of every file it hands out,
+    and is removed by cleanup(), which is also registered to run at
+    exit. A pid file allows workspaces left behind by jobs that were
+    killed outright to be purged later, unless they were deliberately
+    kept (see keep()).
+
+    A workspace with a name is resumable: a later job with the same
+    name gets the same directory, and can use the work recorded in its
+    checkpoint (see Checkpoint). Resumable workspaces with a checkpoint
+    aren't purged until the checkpoint is CHECKPOINT_MAX_AGE seconds old.
+    """
+    PREFIX = "{p}_".format(p=globals.PROGRAM)
+    PID_FILE = "pid"
+    KEEP_FILE = "keep"
+    # Workspaces of failed resumable jobs are purged after a week.
+    CHECKPOINT_MAX_AGE = 7 * 24 * 60 * 60
+    # Default location for small intermediates, if requested.
+    TMPFS = "/dev/shm"
+
+    def __init__(self, base=None, small_base=None, name=None):
+        self.path = self._make_directory(base, name)
+        if small_base:
+            self.small_path = self._make_directory(small_base, name)
+        else:
+            self.small_path = self.path
+        self.checkpoint = None
+        self._files = {}
+        self._cleaned = False
+        atexit.register(self.cleanup)
+
+    def __repr__(self):
+        return "<{c}: {p}>".format(c=self.__class__.__name__, p=self.path)
+
+    @staticmethod
+    def _make_directory(base, name=None):
+        """Create a directory containing a pid file.
+
+        The directory is uniquely named unless name is specified, in
+        which case an existing directory is reused, provided that its
+        job is no longer running (otherwise FileExistsError is raised).
+        """
+        if name:
+            path = Path(base or tempfile.gettempdir(),
+                        ScratchWorkspace.PREFIX + name)
+            path.mkdir(exist_ok=True)
+            try:
+                pid = int((path / ScratchWorkspace.PID_FILE).read_text())
+            except (OSError, ValueError):
+                pid = None
+            if pid and (pid != os.getpid()) and \
+                    ScratchWorkspace._pid_alive(pid):
+                raise FileExistsError(
+                    "workspace {p} is in use by process {i}".format(
+                        p=path, i=pid))
+        else:
+            path = Path(tempfile.mkdtemp(prefix=ScratchWorkspace.PREFIX,
+                                         dir=base))
+        (path / ScratchWorkspace.PID_FILE).write_text(str(os.getpid()))
+        return path
+
+    @staticmethod
+    def _pid_alive(pid):
+        """Return True if a process with the specified pid exists."""
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+        return True
+
+    @staticmethod
+    def purge_stale(base=None):
+        """Remove workspaces in base whose jobs are no longer running.
+
+        Workspaces that were deliberately kept, or that have a recent
+        checkpoint (see CHECKPOINT_MAX_AGE), are left alone. Returns
+        the list of directories removed.
+        """
+        base = Path(base or tempfile.gettempdir())
+        removed = []
+        for d in base.glob("{p}*".format(p=ScratchWorkspace.PREFIX)):
+            try:
+                pid = int((d / ScratchWorkspace.PID_FILE).read_text())
+            except (OSError, ValueError):
+                continue
+            if (d / ScratchWorkspace.KEEP_FILE).exists():
+                continue
+            try:
+                age = time.time() - (d / Checkpoint.MANIFEST).stat().st_mtime
+                if (age < ScratchWorkspace.CHECKPOINT_MAX_AGE):
+                    continue
+            except OSError:
+                pass
+            if not ScratchWorkspace._pid_alive(pid):
+                shutil.rmtree(str(d), ignore_errors=True)
+                removed.append(d)
+        return removed
+
+    def file(self, name, small=False):
+        """Return the path for an intermediate file in the workspace."""
+        path = (self.small_path if small else self.path) / name
+        self._files.setdefault(path, 0)
+        return path
+
+    def update_sizes(self):
+        """Record the current size of each intermediate file."""
+        for f in self._files:
+            try:
+                self._files[f] = max(self._files[f], f.stat().st_size)
+            except OSError:
+                pass
+
+    def sizes(self):
+        """Return the peak recorded size of each intermediate file."""
+        return dict(self._files)
+
+    def total_size(self):
+        """Return the total peak recorded size of all intermediates."""
+        return sum(self._files.values())
+
+    def as_dict(self):
+        """Return the workspace details (e.g., for JSON output)."""
+        return {
+            "path": str(self.path),
+            "small_path": str(self.small_path),
+            "total_size": self.total_size(),
+            "files": {str(f): s for f, s in self._files.items()},
+        }
+
+    def keep(self, permanent=True):
+        """Don't remove the workspace at exit.
+
+        A permanently kept workspace is never purged, otherwise it's
+        purged like any other (e.g., once its checkpoint is too old).
+        """
+        self._cleaned = True
+        if not permanent:
+            return
+        for d in {self.path, self.small_path}:
+            try:
+                (d / self.KEEP_FILE).touch()
+            except OSError:
+                pass
+
+    def cleanup(self):
+        """Remove the workspace and everything in it."""
+        if self._cleaned:
+            return
+        self.update_sizes()
+        for d in {self.path, self.small_path}:
+            shutil.rmtree(str(d), ignore_errors=True)
+        self._cleaned = True
+
+    @staticmethod
+    def exit_on_signals(signals=(signal.SIGTERM, signal.SIGHUP)):
+        """Turn termination signals into SystemExit.
+
+        This lets finally clauses and atexit handlers (and therefore
+        cleanup()) run when a job is terminated.
+        """
+        def handler(signum, frame):
+            raise SystemExit(128 + signum)
+        for s in signals:
+            signal.signal(s, handler)
+
+
+class Checkpoint(object):
+    """A durable record of the work completed in a resumable workspace.
+
+    Each unit of work (e.g., a batch render) is recorded in a manifest
+    as soon as it's complete, with its result and the files it
+    produced, so that a later job can carry on from where a failed one
+    stopped. The manifest is only used if key (which describes the
+    job's inputs and settings; see key()) hasn't changed.
+    """
+    MANIFEST = "checkpoint.json"
+    VERSION = 1
+
+    def __init__(self, directory, key):
+        self.path = Path(directory) / self.MANIFEST
+        self.key = key
+        self._units = {}
+        try:
+            with self.path.open() as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        self.changed = bool(manifest) and not (
+            manifest.get("version") == self.VERSION
+            and manifest.get("key") == key)
+        if not self.changed:
+            self._units = manifest.get("units", {})
+
+    @staticmethod
+    def key(description):
+        """Return the key for a JSON serialisable job description."""
+        return hashlib.sha1(json.dumps(description).encode()).hexdigest()
+
+    def result(self, unit):
+        """Return the result of a completed unit of work, or None.
+
+        A unit whose files have gone missing (e.g., from tmpfs after
+        a reboot) isn't complete.
+        """
+        record = self._units.get(unit)
+        if record and all(Path(f).exists() for f in record["files"]):
+            return record["result"]
+        return None
+
+    def complete(self, unit, result, files=[]):
+        """Record that a unit of work is complete.
+
+        result must be JSON serialisable and not None. The files are
+        flushed to disk before the manifest is (atomically) replaced,
+        so the manifest never records work that could still be lost.
+        """
+        for f in files:
+            with open(str(f), "rb") as data:
+                os.fsync(data.fileno())
+        self._units[unit] = {"result": result,
+                             "files": [str(f) for f in files]}
+        temp = self.path.with_name(self.path.name + ".part")
+        with temp.open("w") as f:
+            json.dump({"version": self.VERSION, "key": self.key,
+                       "units": self._units}, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(str(temp), str(self.path))
+
+    def completed(self):
+        """Return the number of completed units of work."""
+        return len(self._units)
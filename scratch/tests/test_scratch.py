@@ -0,0 +1,295 @@
+import os
+from pathlib import Path
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from scratch import Checkpoint, ScratchWorkspace
+from segment import Segment, AudioSegment, FrameSegment
+
+
+class ScratchWorkspaceTestCase(unittest.TestCase):
+    """Test the ScratchWorkspace class."""
+
+    def setUp(self):
+        """Create a base directory for workspaces."""
+        self.base = tempfile.TemporaryDirectory()
+        self.small_base = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove the base directories."""
+        self.base.cleanup()
+        self.small_base.cleanup()
+
+    def test_unique(self):
+        """Test that each workspace gets its own directory."""
+        w1 = ScratchWorkspace(self.base.name)
+        w2 = ScratchWorkspace(self.base.name)
+        test_data = (
+            (w1.path != w2.path, True, "workspaces are distinct"),
+            (w1.path.parent, Path(self.base.name), "workspace is in base"),
+            (w1.path.is_dir(), True, "workspace exists"),
+            (w1.file("temp.mov") != w2.file("temp.mov"), True,
+                "same name in different workspaces doesn't collide"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        w1.cleanup()
+        w2.cleanup()
+
+    def test_small_files(self):
+        """Test that small files go in the small file area."""
+        w = ScratchWorkspace(self.base.name, self.small_base.name)
+        test_data = (
+            (w.file("a.mov").parent, w.path, "large file"),
+            (w.file("a.jpg", small=True).parent, w.small_path, "small file"),
+            (w.small_path.parent, Path(self.small_base.name),
+                "small file area is in small base"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        w.cleanup()
+        self.assertFalse(w.small_path.exists())
+
+    def test_sizes(self):
+        """Test tracking the peak size of intermediate files."""
+        w = ScratchWorkspace(self.base.name)
+        a = w.file("a.wav")
+        b = w.file("b.jpg", small=True)
+        w.file("never_created.mov")
+        a.write_bytes(b"x" * 100)
+        b.write_bytes(b"x" * 10)
+        w.update_sizes()
+        a.write_bytes(b"x" * 50)
+        b.unlink()
+        w.update_sizes()
+        test_data = (
+            (w.sizes()[a], 100, "peak size is kept"),
+            (w.sizes()[b], 10, "size of deleted file is kept"),
+            (w.total_size(), 110, "total size"),
+            (w.as_dict()["total_size"], 110, "total size in dict"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        w.cleanup()
+
+    def test_cleanup(self):
+        """Test removing the workspace."""
+        w = ScratchWorkspace(self.base.name)
+        w.file("a.wav").write_bytes(b"x" * 100)
+        w.cleanup()
+        self.assertFalse(w.path.exists())
+        # Cleaning up again should be harmless.
+        w.cleanup()
+        self.assertEqual(w.total_size(), 100)
+
+    def test_keep(self):
+        """Test keeping the workspace."""
+        w = ScratchWorkspace(self.base.name, self.small_base.name)
+        w.keep()
+        w.cleanup()
+        with self.subTest(msg="kept at exit"):
+            self.assertTrue(w.path.exists())
+        # The job has since finished.
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        for d in [w.path, w.small_path]:
+            (d / ScratchWorkspace.PID_FILE).write_text(str(process.pid))
+        for base in [self.base.name, self.small_base.name]:
+            with self.subTest(msg="not purged from {b}".format(b=base)):
+                self.assertEqual(ScratchWorkspace.purge_stale(base), [])
+        w = ScratchWorkspace(self.base.name)
+        w.keep(permanent=False)
+        w.cleanup()
+        with self.subTest(msg="kept at exit, not permanently"):
+            self.assertTrue(w.path.exists())
+        (w.path / ScratchWorkspace.PID_FILE).write_text(str(process.pid))
+        with self.subTest(msg="purged, not permanently kept"):
+            self.assertEqual(ScratchWorkspace.purge_stale(self.base.name),
+                             [w.path])
+
+    def test_purge_stale(self):
+        """Test removing workspaces of jobs that are no longer running."""
+        live = ScratchWorkspace(self.base.name)
+        dead = ScratchWorkspace(self.base.name)
+        # A process that has already exited.
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        (dead.path / ScratchWorkspace.PID_FILE).write_text(str(process.pid))
+        removed = ScratchWorkspace.purge_stale(self.base.name)
+        test_data = (
+            (removed, [dead.path], "only the stale workspace is removed"),
+            (dead.path.exists(), False, "stale workspace is gone"),
+            (live.path.exists(), True, "live workspace is kept"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        live.cleanup()
+
+    def test_resumable(self):
+        """Test that named workspaces are reused, but not shared."""
+        w1 = ScratchWorkspace(self.base.name, name="job")
+        w1.file("a.mov").write_bytes(b"x")
+        with self.subTest(msg="in use by a live job"):
+            (w1.path / ScratchWorkspace.PID_FILE).write_text(
+                str(os.getppid()))
+            with self.assertRaises(FileExistsError):
+                ScratchWorkspace(self.base.name, name="job")
+        (w1.path / ScratchWorkspace.PID_FILE).write_text(str(os.getpid()))
+        w2 = ScratchWorkspace(self.base.name, name="job")
+        test_data = (
+            (w2.path, w1.path, "same directory"),
+            (w2.file("a.mov").read_bytes(), b"x", "files are still there"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        w2.cleanup()
+
+    def test_purge_keeps_checkpoints(self):
+        """Test that workspaces with a recent checkpoint aren't purged."""
+        w = ScratchWorkspace(self.base.name, name="job")
+        Checkpoint(w.path, "key").complete("unit", 1)
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        (w.path / ScratchWorkspace.PID_FILE).write_text(str(process.pid))
+        with self.subTest(msg="recent checkpoint"):
+            self.assertEqual(ScratchWorkspace.purge_stale(self.base.name), [])
+        # The checkpoint has expired.
+        age = ScratchWorkspace.CHECKPOINT_MAX_AGE + 60
+        mtime = (w.path / Checkpoint.MANIFEST).stat().st_mtime - age
+        os.utime(str(w.path / Checkpoint.MANIFEST), (mtime, mtime))
+        with self.subTest(msg="expired checkpoint"):
+            self.assertEqual(ScratchWorkspace.purge_stale(self.base.name),
+                             [w.path])
+        w.cleanup()
+
+    def test_sigterm(self):
+        """Test that the workspace is removed when the job is terminated."""
+        script = (
+            "import sys, time\n"
+            "from scratch import ScratchWorkspace\n"
+            "w = ScratchWorkspace(sys.argv[1])\n"
+            "ScratchWorkspace.exit_on_signals()\n"
+            "w.file('a.mov').write_bytes(b'x')\n"
+            "print(w.path, flush=True)\n"
+            "time.sleep(60)\n")
+        process = subprocess.Popen(
+            [sys.executable, "-c", script, self.base.name],
+            stdout=subprocess.PIPE, universal_newlines=True,
+            cwd=str(Path(__file__).resolve().parents[2]))
+        path = Path(process.stdout.readline().strip())
+        self.assertTrue(path.exists())
+        process.send_signal(signal.SIGTERM)
+        process.communicate(timeout=30)
+        self.assertEqual(process.returncode, 128 + signal.SIGTERM)
+        self.assertFalse(path.exists())
+
+
+class CheckpointTestCase(unittest.TestCase):
+    """Test the Checkpoint class."""
+
+    def setUp(self):
+        """Set up a directory for the checkpoint."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.file = Path(self.directory.name, "batch.mkv")
+        self.file.write_bytes(b"batch")
+        self.checkpoint = Checkpoint(self.directory.name, "key")
+        self.checkpoint.complete("batch", 12.5, [self.file])
+        self.checkpoint.complete("slides", [[0, "slide.png"]])
+
+    def tearDown(self):
+        """Remove the checkpoint."""
+        self.directory.cleanup()
+
+    def test_resume(self):
+        """Test resuming from the checkpoint in a later job."""
+        later = Checkpoint(self.directory.name, "key")
+        test_data = (
+            (later.changed, False, "same job"),
+            (later.completed(), 2, "units"),
+            (later.result("batch"), 12.5, "completed unit"),
+            (later.result("slides"), [[0, "slide.png"]], "JSON result"),
+            (later.result("other"), None, "incomplete unit"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_changed(self):
+        """Test that a different job starts again."""
+        later = Checkpoint(self.directory.name, "other key")
+        test_data = (
+            (later.changed, True, "changed"),
+            (later.result("batch"), None, "nothing completed"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_missing_files(self):
+        """Test that units whose files are missing aren't complete."""
+        self.file.unlink()
+        self.assertIsNone(
+            Checkpoint(self.directory.name, "key").result("batch"))
+
+    def test_key(self):
+        """Test that the key depends on the description."""
+        test_data = (
+            (Checkpoint.key({"a": 1}) == Checkpoint.key({"a": 1}), True,
+             "same description"),
+            (Checkpoint.key({"a": 1}) == Checkpoint.key({"a": 2}), False,
+             "different description"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+class SegmentScratchTestCase(unittest.TestCase):
+    """Test generating temporary file names in a scratch workspace."""
+
+    def setUp(self):
+        """Set up a workspace for segments."""
+        Segment._input_files = {}
+        self.base = tempfile.TemporaryDirectory()
+        self.small_base = tempfile.TemporaryDirectory()
+        Segment._scratch = ScratchWorkspace(self.base.name,
+                                            self.small_base.name)
+
+    def tearDown(self):
+        """Remove the workspace."""
+        Segment._scratch.cleanup()
+        Segment._scratch = None
+        self.base.cleanup()
+        self.small_base.cleanup()
+
+    def test_generate_temp_filename(self):
+        """Test that temporary files are created in the workspace."""
+        audio = AudioSegment(file="test.wav")
+        frame = FrameSegment(file="test.pdf")
+        audio_file = audio.generate_temp_filename("output.mov")
+        frame_file = frame.generate_temp_filename("output.mov",
+                                                  suffix=".jpg")
+        test_data = (
+            (audio_file.parent, Segment._scratch.path, "audio file"),
+            (audio_file.name, "temp_audio_output_{n:03d}.wav".format(
+                n=audio.segment_number), "audio file name"),
+            (frame_file.parent, Segment._scratch.small_path,
+                "frame image is a small file"),
+            (audio_file in Segment._scratch.sizes(), True,
+                "audio file is tracked"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import contextlib
 from datetime import timedelta
 import errno
 import itertools
@@ -12,6 +13,29 @@ from shell_command import (ConvertCommand, FFprobeCommand, FFmpegCommand)
 class SegmentError(Exception):
     pass
 
+
+# Every PNG file starts with this signature, followed by a sequence of
+# chunks (length, type, data, CRC), the last of which is IEND.
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def split_png_stream(data):
+    """Split concatenated PNG files (e.g., from image2pipe) into a list."""
+    images = []
+    start = 0
+    while data.startswith(PNG_SIGNATURE, start):
+        pos = start + len(PNG_SIGNATURE)
+        while pos + 8 <= len(data):
+            length = int.from_bytes(data[pos:pos + 4], "big")
+            chunk_type = data[pos + 4:pos + 8]
+            pos += 12 + length
+            if (chunk_type == b"IEND"):
+                break
+        images.append(data[start:pos])
+        start = pos
+    return images
+
+
 class Segment(object):
     """A segment within the podcast.
     
@@ -26,6 +50,21 @@ class Segment(object):
     # first input file is, 0, etc.).
     _input_files = {}
     
+    # Cached mapping of input files to their index in _input_files,
+    # so that we don't have to search the list of files for every
+    # segment. _input_index_of records which dictionary the cache was
+    # built from; it's reset whenever _input_files changes.
+    _input_index = {}
+    _input_index_of = None
+    
+    # Scratch workspace for temporary files (see scratch.ScratchWorkspace).
+    # If not set, temporary files are created in the current directory.
+    _scratch = None
+    
+    # Suffixes of temporary files that are small enough to be put in
+    # the scratch workspace's area for small files (e.g., tmpfs).
+    _SMALL_SUFFIXES = [".jpg", ".png"]
+    
     # A string representing the type of the segment (e.g., "audio").
     # This is handy for generating temporary files and means that we
     # can implement this as a single method in the root class.
@@ -40,8 +79,28 @@ class Segment(object):
     def input_files():
         return Segment._input_files
     
+    @staticmethod
+    def input_file_index(file):
+        """Return the index of an input file in the ffmpeg command."""
+        if Segment._input_index_of is not Segment._input_files:
+            Segment._input_index = {
+                f: i for i, f in enumerate(Segment._input_files)}
+            Segment._input_index_of = Segment._input_files
+        return Segment._input_index[file]
+    
+    @staticmethod
+    def _add_input_file(file, options=None):
+        """Add (or update the options of) an input file."""
+        if file not in Segment._input_files:
+            Segment._input_index_of = None
+        Segment._input_files[file] = options
+    
     @staticmethod
     def _rename_input_file(old, new):
+        # Nothing to do if old has already been renamed (e.g., several
+        # frame segments that come from the same PDF).
+        if old not in Segment._input_files:
+            return
         tmp = {}
         for f in Segment._input_files:
             if (f == old):
@@ -49,6 +108,31 @@ class Segment(object):
             else:
                 tmp[f] = Segment._input_files[f]
         Segment._input_files = tmp
+        Segment._input_index_of = None
+    
+    @staticmethod
+    @contextlib.contextmanager
+    def only_input_files(files):
+        """Temporarily restrict the input files to those in files.
+        
+        The files keep their relative order, so input stream specifiers
+        generated in this context refer to an ffmpeg command with just
+        these inputs.
+        """
+        saved = Segment._input_files
+        Segment._input_files = {
+            f: o for f, o in saved.items() if f in files}
+        try:
+            yield
+        finally:
+            Segment._input_files = saved
+    
+    @staticmethod
+    def _remove_input_file(file):
+        """Remove an input file, if it's present."""
+        if file in Segment._input_files:
+            del Segment._input_files[file]
+            Segment._input_index_of = None
     
     def __init__(self, file="", punch_in=timedelta(),
                  punch_out=timedelta(), input_stream=0):
@@ -61,9 +145,11 @@ class Segment(object):
         self._temp_suffix = ".mov"
         # List of temporary files to delete when cleaning up.
         self._temp_files_list = []
+        # Extra filters to apply after trimming (see add_filters()).
+        self._filters = []
         
         if (file not in self.__class__._input_files):
-            self.__class__._input_files[file] = None
+            self._add_input_file(file)
         
         self._input_options = ["-ss", str(self.punch_in.total_seconds()),
                                "-t", str(self.get_duration()),
@@ -87,9 +173,13 @@ class Segment(object):
         """Generate a temporary filename for the segment."""
         if not suffix:
             suffix = self._temp_suffix
-        return Path("temp_{t}_{o}_{n:03d}".format(
+        name = Path("temp_{t}_{o}_{n:03d}".format(
             t=self._TYPE, o=Path(output).stem,
             n=self.segment_number)).with_suffix(suffix)
+        if Segment._scratch:
+            return Segment._scratch.file(
+                name, small=suffix in self._SMALL_SUFFIXES)
+        return name
     
     def generate_temp_file(self, output, width=0, height=0):
         """Compile the segment from the original source file(s)."""
@@ -129,9 +219,8 @@ class Segment(object):
     
     def input_stream_specifier(self):
         """Return the segment's ffmpeg stream input specifier."""
-        filenames = self.__class__._input_files.keys()
         return "[{n}:{t}]".format(
-            n=tuple(filenames).index(self.input_file),
+            n=self.input_file_index(self.input_file),
             t=self._TYPE[0] if self._TYPE else "")
         
     def output_stream_specifier(self):
@@ -139,15 +228,58 @@ class Segment(object):
         return "[{t}{n}]".format(t=self._TYPE[0] if self._TYPE else "",
                                  n=self.segment_number)
     
+    def set_punch(self, punch_in, punch_out):
+        """Change the segment's punch points.
+        
+        For example, to render only part of the segment.
+        """
+        self.punch_in = punch_in
+        self.punch_out = punch_out
+        self._input_options = ["-ss", str(self.punch_in.total_seconds()),
+                               "-t", str(self.get_duration()),
+                               "-i", self.input_file]
+    
+    def continues(self, segment):
+        """Return True if this segment carries on from where segment ends.
+        
+        That is, it takes the same stream of the same input file, and
+        starts exactly where segment stops.
+        """
+        return (type(self) is type(segment)
+                and (self.input_file == segment.input_file)
+                and (self.input_stream == segment.input_stream)
+                and (self.punch_in == segment.punch_out))
+    
+    def extend(self, segment):
+        """Extend the segment to include segment, which continues it."""
+        self.set_punch(self.punch_in, segment.punch_out)
+    
+    def set_input_file(self, file):
+        """Take the segment from a different but equivalent input file.
+        
+        For example, a proxy with the same content at lower resolution.
+        """
+        self.__class__._rename_input_file(self.input_file, file)
+        self._input_options[self._input_options.index("-i") + 1] = file
+        self.input_file = file
+    
+    def add_filters(self, filters):
+        """Add filters to apply to the segment after trimming.
+        
+        For example, scaling video segments down for a preview.
+        """
+        self._filters += filters
+    
     def trim_filter(self):
         """Return an FFMPEG trim filter for this segment."""
         return ("{inspec} "
-                "{trim}=start={pi}:duration={d},{setpts}=PTS-STARTPTS "
+                "{trim}=start={pi}:duration={d},{setpts}=PTS-STARTPTS{f} "
                 "{outspec}".format(
                     inspec=self.input_stream_specifier(),
                     trim=self._TRIM, setpts=self._SETPTS,
                     pi=self.punch_in.total_seconds(),
                     d=self.get_duration(),
+                    f="".join("," + f for f in self._filters),
                     outspec=self.output_stream_specifier()))
 
 
@@ -181,7 +313,11 @@ class VideoSegment(Segment):
         """Calculate frame number of segment's last frame using ffprobe."""
         fn = "get_last_frame_number"
         if (self._temp_file):
-            self._temp_frame_file = "__{f}".format(f=self._temp_file)
+            name = "__{f}".format(f=Path(self._temp_file).name)
+            if Segment._scratch:
+                self._temp_frame_file = Segment._scratch.file(name)
+            else:
+                self._temp_frame_file = Path(name)
         
             # To speed things up, grab up to the last 5 seconds of the
             # segment's temporary file, as we otherwise have to scan the
@@ -238,10 +374,53 @@ class VideoSegment(Segment):
                 "Failed to create JPEG for frame {n} of "
                 "{s}".format(n=frame_number, s=self))
     
+    def generate_frame_image(self, frame_number, width=2048, height=1536):
+        """Return the specified frame of the segment as PNG data.
+        
+        Unlike generate_frame(), this reads the frame directly from the
+        original input file and writes nothing to disk. The frame is
+        scaled (and padded) to fit width x height.
+        """
+        fn = "generate_frame_image"
+        scale = ("scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                 "pad={w}:{h}:-1:-1:color=dimgrey".format(w=width, h=height))
+        if (frame_number == -1):
+            # Decode (up to) the last second of the segment and keep
+            # the last frame, rather than decoding the whole segment.
+            start = max(self.get_duration() - 1, 0)
+            select = []
+        else:
+            start = 0
+            select = ["select='eq(n, {n})'".format(n=frame_number)]
+        command = FFmpegCommand(
+            input_options=[
+                "-ss", str(self.punch_in.total_seconds() + start),
+                "-t", str(self.get_duration() - start),
+                "-i", self.input_file],
+            output_options=["-filter:v", ",".join(select + [scale]),
+                            "-map", "0:v:0",
+                            "-pix_fmt", "rgb24",
+                            "-f", "image2pipe",
+                            "-codec:v", "png",
+                            "pipe:1"])
+        if (frame_number != -1):
+            command.prepend_output_options(["-frames:v", "1"])
+        globals.log.debug("{cls}.{fn}(): {cmd}".format(
+            cls=self.__class__.__name__, fn=fn, cmd=command))
+        images = split_png_stream(command.get_binary_output() or b"")
+        if images:
+            return images[-1]
+        else:
+            raise SegmentError(
+                "Failed to create PNG for frame {n} of "
+                "{s}".format(n=frame_number, s=self))
+    
 
 class FrameSegment(VideoSegment):
     """A video segment derived from a single still frame."""
     _TYPE = "frame"
+    # Prefix of the split filter outputs for shared frames.
+    SPLIT_LABEL = "fsplit"
     
     def __init__(self, file="", punch_in=timedelta(),
                  punch_out=timedelta(), input_stream=0,
@@ -251,7 +430,14 @@ class FrameSegment(VideoSegment):
         self._input_options = ["-loop", "1",
                                "-t", str(self.get_duration()),
                                "-i", self.input_file]
-        self.__class__._input_files[file] = self._input_options[:4]
+        self._add_input_file(file, self._input_options[:4])
+        # (label, start) of the stream this segment's frame comes from
+        # when frames are streamed (see use_stream()).
+        self._stream = None
+        # Whether the frame image is shared (see share_frame()), and
+        # the size to letterbox it to (see letterbox()).
+        self._shared = False
+        self._letterbox = None
     
     def __repr__(self):
         return('<{c} {n}: file "{f}", in {i}, out {o}, frame number '
@@ -282,6 +468,24 @@ class FrameSegment(VideoSegment):
                 "Failed to generate temporary file {f} for "
                 "{s}".format(f=self._temp_file, s=self))
     
+    def generate_image(self, width=2048, height=1536):
+        """Return the segment's frame rasterised as PNG data."""
+        fn = "generate_image"
+        command = ConvertCommand(
+            input_options=["{f}[{n}]".format(
+                f=self.input_file, n=self.frame_number)],
+            # Force 8 bit RGB so that every frame has the same format.
+            output_options=["png24:-"],
+            width=width, height=height)
+        globals.log.debug("{cls}.{fn}(): {cmd}".format(
+            cls=self.__class__.__name__, fn=fn, cmd=command))
+        image = command.get_binary_output()
+        if image:
+            return image
+        else:
+            raise SegmentError(
+                "Failed to rasterise frame for {s}".format(s=self))
+    
     def use_frame(self, frame):
         """Set the image to use for generating the frame video."""
         self.__class__._rename_input_file(self.input_file, frame)
@@ -289,18 +493,124 @@ class FrameSegment(VideoSegment):
         self._input_options = ["-loop", "1",
                                "-t", str(self.get_duration()),
                                "-i", self.input_file]
-        self.__class__._input_files[frame] = self._input_options[:4]
+        self._add_input_file(frame, self._input_options[:4])
+    
+    def set_punch(self, punch_in, punch_out):
+        """Change the segment's punch points (i.e., its duration)."""
+        self.punch_in = punch_in
+        self.punch_out = punch_out
+        self._input_options = ["-loop", "1",
+                               "-t", str(self.get_duration()),
+                               "-i", self.input_file]
+        self._add_input_file(self.input_file, self._input_options[:4])
+    
+    def continues(self, segment):
+        """Return True if this segment carries on from where segment ends.
+        
+        That is, segment is also a frame segment with the same image.
+        """
+        return (isinstance(segment, FrameSegment)
+                and ((self.input_file == "^")
+                     or ((self.input_file == segment.input_file)
+                         and (self.frame_number == segment.frame_number))))
+    
+    def extend(self, segment):
+        """Extend the segment to include segment, which continues it."""
+        self.set_punch(self.punch_in,
+                       self.punch_out + (segment.punch_out - segment.punch_in))
+    
+    def letterbox(self, width, height):
+        """Fit the frame within width x height, centred on dark grey.
+        
+        The image is scaled once, before it's split between segments,
+        so this also shares the frame (see share_frame()).
+        """
+        self._letterbox = (width, height)
+        self.share_frame()
+    
+    def share_frame(self):
+        """Share the segment's frame image with other frame segments.
+        
+        The image becomes a single (unlooped) input, which is split
+        between the segments that use it (see split_filters()). Each
+        segment then extends the frame to its own duration.
+        """
+        self._shared = True
+        self._add_input_file(self.input_file, [])
+    
+    @staticmethod
+    def split_filters(segments):
+        """Return filters that split shared frame images between segments.
+        
+        Only the segments in segments are included.
+        """
+        shared = {}
+        for s in segments:
+            if isinstance(s, FrameSegment) and s._shared and not s._stream:
+                shared.setdefault(s.input_file, []).append(s)
+        filters = []
+        for f in shared:
+            letterbox = ""
+            if shared[f][0]._letterbox:
+                letterbox = (
+                    "scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                    "pad={w}:{h}:-1:-1:color=dimgrey,setsar=1,".format(
+                        w=shared[f][0]._letterbox[0],
+                        h=shared[f][0]._letterbox[1]))
+            filters.append("[{n}:v] {l}split={c} {outspecs}".format(
+                n=Segment.input_file_index(f), l=letterbox,
+                c=len(shared[f]),
+                outspecs=" ".join(s.input_stream_specifier()
+                                  for s in shared[f])))
+        return filters
+    
+    def use_stream(self, label, start):
+        """Take the segment's frame from a stream of frames.
+        
+        label is the filter output carrying the stream, and start is
+        the time at which the segment's frame starts within it. The
+        segment's original input file is no longer an ffmpeg input.
+        """
+        self.__class__._remove_input_file(self.input_file)
+        self._stream = (label, start)
         
     def input_stream_specifier(self):
         """Return the segment's ffmpeg stream input specifier."""
-        filenames = self.__class__._input_files.keys()
-        return "[{n}:v]".format(
-            n=tuple(filenames).index(self.input_file))
+        if self._stream:
+            return "[{l}]".format(l=self._stream[0])
+        elif self._shared:
+            return "[{t}{n}]".format(t=self.SPLIT_LABEL, n=self.segment_number)
+        return "[{n}:v]".format(n=self.input_file_index(self.input_file))
         
     def output_stream_specifier(self):
         """Return the segment's ffmpeg audio stream output specifier."""
+        if self._stream or self._shared or self._filters:
+            return super().output_stream_specifier()
         return self.input_stream_specifier()
     
     def trim_filter(self):
         """Return an FFMPEG trim filter for this segment."""
+        if self._stream:
+            return ("{inspec} "
+                    "trim=start={s}:duration={d},setpts=PTS-STARTPTS{f} "
+                    "{outspec}".format(
+                        inspec=self.input_stream_specifier(),
+                        s=self._stream[1], d=self.get_duration(),
+                        f="".join("," + f for f in self._filters),
+                        outspec=self.output_stream_specifier()))
+        elif self._shared:
+            return ("{inspec} "
+                    "tpad=stop_mode=clone:stop_duration={d},trim=duration={d},"
+                    "setpts=PTS-STARTPTS{f} {outspec}".format(
+                        inspec=self.input_stream_specifier(),
+                        d=self.get_duration(),
+                        f="".join("," + f for f in self._filters),
+                        outspec=self.output_stream_specifier()))
+        elif self._filters:
+            # The frame is already the right length, so only the extra
+            # filters are needed.
+            return "{inspec} {f} {outspec}".format(
+                inspec=self.input_stream_specifier(),
+                f=",".join(self._filters),
+                outspec=self.output_stream_specifier())
         return ""
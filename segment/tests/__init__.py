@@ -113,3 +113,66 @@ class SegmentSharedTestCase(unittest.TestCase):
                 d=self.EXPECTED_DURATION,
                 outspec=self.segment.output_stream_specifier()))
         self.assertEqual(self.segment.trim_filter(), expected_filter)
+    
+    def test_add_filters(self):
+        """Test that extra filters are added after trimming."""
+        self.segment.add_filters(["scale=640:360"])
+        self.segment.add_filters(["fps=1"])
+        expected_filter = (
+            "{inspec} {trim}=start={pi}:duration={d},{setpts}=PTS-STARTPTS,"
+            "scale=640:360,fps=1 {outspec}".format(
+                inspec=self.segment.input_stream_specifier(),
+                trim=self.segment._TRIM, setpts=self.segment._SETPTS,
+                pi=self.EXPECTED_PUNCH_IN.total_seconds(),
+                d=self.EXPECTED_DURATION,
+                outspec=self.segment.output_stream_specifier()))
+        self.assertEqual(self.segment.trim_filter(), expected_filter)
+    
+    def test_set_punch(self):
+        """Test that changing the punch points updates the segment."""
+        punch_in = self.EXPECTED_PUNCH_IN + timedelta(seconds=20)
+        punch_out = self.EXPECTED_PUNCH_OUT - timedelta(seconds=30)
+        self.segment.set_punch(punch_in, punch_out)
+        duration = str((punch_out - punch_in).total_seconds())
+        test_data = (
+            (self.segment.punch_in, punch_in, "punch in"),
+            (self.segment.punch_out, punch_out, "punch out"),
+            (self.segment._input_options[2:4], ["-t", duration],
+             "input options duration"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+    
+    def test_continues(self):
+        """Test detecting and merging contiguous segments."""
+        cls = type(self.segment)
+        later = cls(file=self.EXPECTED_INPUT_FILE,
+                    punch_in=self.EXPECTED_PUNCH_OUT,
+                    punch_out=self.EXPECTED_PUNCH_OUT + timedelta(seconds=30),
+                    input_stream=self.EXPECTED_INPUT_STREAM)
+        test_data = (
+            (later, True, "contiguous"),
+            (cls(file=self.EXPECTED_INPUT_FILE,
+                 punch_in=self.EXPECTED_PUNCH_OUT + timedelta(seconds=1),
+                 punch_out=self.EXPECTED_PUNCH_OUT + timedelta(seconds=30),
+                 input_stream=self.EXPECTED_INPUT_STREAM),
+             False, "gap"),
+            (cls(file="other.in", punch_in=self.EXPECTED_PUNCH_OUT,
+                 punch_out=self.EXPECTED_PUNCH_OUT + timedelta(seconds=30),
+                 input_stream=self.EXPECTED_INPUT_STREAM),
+             False, "different file"),
+            (cls(file=self.EXPECTED_INPUT_FILE,
+                 punch_in=self.EXPECTED_PUNCH_OUT,
+                 punch_out=self.EXPECTED_PUNCH_OUT + timedelta(seconds=30),
+                 input_stream=self.EXPECTED_INPUT_STREAM + 1),
+             False, "different stream"),
+        )
+        for segment, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(segment.continues(self.segment), expected)
+        self.segment.extend(later)
+        with self.subTest(msg="extended"):
+            self.assertEqual(
+                (self.segment.punch_in, self.segment.punch_out),
+                (self.EXPECTED_PUNCH_IN, later.punch_out))
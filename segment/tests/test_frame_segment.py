@@ -1,3 +1,4 @@
+from datetime import timedelta
 import unittest
 
 from segment import Segment, FrameSegment
@@ -69,6 +70,116 @@ class FrameSegmentTestCase(SegmentSharedTestCase):
         """Test that the trim filter is correctly generated."""
         self.assertEqual(self.segment.trim_filter(), "")
     
+    def test_add_filters(self):
+        """Test that extra filters are applied to the frame."""
+        input_specifier = self.segment.input_stream_specifier()
+        self.segment.add_filters(["scale=640:360", "fps=1"])
+        expected_specifier = "[f{n}]".format(n=self.segment.segment_number)
+        self.assertEqual(
+            self.segment.output_stream_specifier(), expected_specifier)
+        self.assertEqual(
+            self.segment.trim_filter(),
+            "{i} scale=640:360,fps=1 {o}".format(i=input_specifier,
+                                                 o=expected_specifier))
+    
+    def test_use_stream(self):
+        """Test taking the frame from a stream of frames."""
+        self.segment.use_stream("stream", 12.5)
+        test_data = (
+            (self.EXPECTED_INPUT_FILE in Segment._input_files, False,
+             "input file is no longer an input"),
+            (self.segment.input_stream_specifier(), "[stream]",
+             "input stream specifier"),
+            (self.segment.output_stream_specifier(),
+             "[f{n}]".format(n=self.segment.segment_number),
+             "output stream specifier"),
+            (self.segment.trim_filter(),
+             "[stream] trim=start=12.5:duration={d},setpts=PTS-STARTPTS "
+             "[f{n}]".format(d=self.EXPECTED_DURATION,
+                             n=self.segment.segment_number),
+             "trim filter"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+    
+    def test_set_punch_input_options(self):
+        """Test that the frame input is looped for the new duration."""
+        self.segment.set_punch(timedelta(seconds=5), timedelta(seconds=15))
+        self.assertEqual(Segment._input_files[self.EXPECTED_INPUT_FILE],
+                         ["-loop", "1", "-t", "10.0"])
+    
+    def test_letterbox(self):
+        """Test that frames are letterboxed once, before being split."""
+        self.segment.letterbox(640, 480)
+        test_data = (
+            (Segment._input_files[self.EXPECTED_INPUT_FILE], [],
+             "input file is no longer looped"),
+            (FrameSegment.split_filters([self.segment]),
+             ["[{i}:v] scale=640:480:force_original_aspect_ratio=decrease,"
+              "pad=640:480:-1:-1:color=dimgrey,setsar=1,split=1 "
+              "[fsplit{n}]".format(
+                  i=tuple(Segment._input_files).index(
+                      self.EXPECTED_INPUT_FILE),
+                  n=self.segment.segment_number)],
+             "split filter"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+    
+    def test_continues(self):
+        """Test detecting and merging frame segments with the same image."""
+        def frame(file, number):
+            return FrameSegment(file=file, punch_in=timedelta(seconds=100),
+                                punch_out=timedelta(seconds=130),
+                                frame_number=number)
+        same = frame(self.EXPECTED_INPUT_FILE, self.EXPECTED_FRAME_NUMBER)
+        test_data = (
+            (same, True, "same frame"),
+            (frame("^", -1), True, "last frame of this segment"),
+            (frame("^", 3), True, "numbered frame of this segment"),
+            (frame(self.EXPECTED_INPUT_FILE, 1), False, "different frame"),
+            (frame("other.pdf", self.EXPECTED_FRAME_NUMBER), False,
+             "different file"),
+        )
+        for segment, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(segment.continues(self.segment), expected)
+        self.segment.extend(same)
+        with self.subTest(msg="extended"):
+            self.assertEqual(self.segment.get_duration(),
+                             self.EXPECTED_DURATION + 30)
+    
+    def test_share_frame(self):
+        """Test sharing a frame image between segments."""
+        other = FrameSegment(file=self.EXPECTED_INPUT_FILE,
+                             punch_in=timedelta(),
+                             punch_out=timedelta(seconds=3))
+        for s in [self.segment, other]:
+            s.share_frame()
+        n = tuple(Segment._input_files).index(self.EXPECTED_INPUT_FILE)
+        test_data = (
+            (Segment._input_files[self.EXPECTED_INPUT_FILE], [],
+             "input file is no longer looped"),
+            (FrameSegment.split_filters([self.segment, other]),
+             ["[{i}:v] split=2 [fsplit{m}] [fsplit{n}]".format(
+                 i=n, m=self.segment.segment_number, n=other.segment_number)],
+             "split filter"),
+            (FrameSegment.split_filters([other]),
+             ["[{i}:v] split=1 [fsplit{n}]".format(
+                 i=n, n=other.segment_number)],
+             "split filter for some of the segments"),
+            (other.trim_filter(),
+             "[fsplit{n}] tpad=stop_mode=clone:stop_duration=3.0,"
+             "trim=duration=3.0,setpts=PTS-STARTPTS [f{n}]".format(
+                 n=other.segment_number),
+             "trim filter"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+    
 
 # Remove SegmentSharedTestCase from the namespace so we don't run
 # the shared tests twice. See <https://stackoverflow.com/a/22836015>.
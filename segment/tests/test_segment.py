@@ -3,6 +3,7 @@ from pathlib import Path
 import unittest
 
 from segment import Segment
+from segment.segment import PNG_SIGNATURE, split_png_stream
 from segment.tests import SegmentSharedTestCase
 
 
@@ -18,6 +19,39 @@ class SegmentTestCase(SegmentSharedTestCase):
         Segment._rename_input_file(self.EXPECTED_INPUT_FILE, "file.new")
         self.assertEqual(Segment.input_files(), {"file.new": None})
 
+    def test_remove_input_file(self):
+        """Test input file removal (static method)."""
+        Segment._remove_input_file("file.missing")
+        self.assertEqual(Segment.input_files(), self.EXPECTED_FILE_LIST)
+        Segment._remove_input_file(self.EXPECTED_INPUT_FILE)
+        self.assertEqual(Segment.input_files(), {})
+
+    def test_only_input_files(self):
+        """Test temporarily restricting the input files (static method)."""
+        Segment._add_input_file("file.2")
+        Segment._add_input_file("file.3")
+        with Segment.only_input_files({"file.3", self.EXPECTED_INPUT_FILE}):
+            self.assertEqual(tuple(Segment.input_files()),
+                             (self.EXPECTED_INPUT_FILE, "file.3"))
+            self.assertEqual(Segment.input_file_index("file.3"), 1)
+        self.assertEqual(Segment.input_file_index("file.3"), 2)
+
+    def test_set_input_file(self):
+        """Test switching to an equivalent input file."""
+        other = Segment(file=self.EXPECTED_INPUT_FILE)
+        for s in [self.segment, other]:
+            s.set_input_file("file.proxy")
+        test_data = (
+            (self.segment.input_file, "file.proxy", "input file"),
+            (self.segment._input_options[-2:], ["-i", "file.proxy"],
+             "input options"),
+            (other.input_file, "file.proxy", "other segment's input file"),
+            (Segment.input_files(), {"file.proxy": None}, "input files"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
     def test_segment_number_increment(self):
         """Test that the segment number increments correctly."""
         segment_1, segment_2 = Segment(), Segment()
@@ -61,6 +95,30 @@ class SegmentTestCase(SegmentSharedTestCase):
     # Testing delete_temp_files() requires actual files to be created.
     
 
+class SplitPNGStreamTestCase(unittest.TestCase):
+    """Test splitting concatenated PNG files."""
+
+    @staticmethod
+    def png(data):
+        """Return a fake PNG file with one data chunk and IEND."""
+        chunk = (len(data).to_bytes(4, "big") + b"IDAT" + data +
+                 b"\0\0\0\0")
+        return PNG_SIGNATURE + chunk + b"\0\0\0\0IEND\0\0\0\0"
+
+    def test_split_png_stream(self):
+        """Test splitting concatenated PNGs."""
+        # The second image contains something that looks like IEND.
+        images = [self.png(b"one"), self.png(b"IEND\x89PNG"), self.png(b"")]
+        test_data = (
+            (b"", [], "empty stream"),
+            (images[0], images[:1], "single image"),
+            (b"".join(images), images, "several images"),
+        )
+        for data, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(split_png_stream(data), expected)
+
+
 # Remove SegmentSharedTestCase from the namespace so we don't run
 # the shared tests twice. See <https://stackoverflow.com/a/22836015>.
 del(SegmentSharedTestCase)
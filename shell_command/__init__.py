@@ -4,4 +4,6 @@ from shell_command.shell_command import (
     FFprobeCommand,
     FFmpegCommand,
     FFmpegConcatCommand,
+    FFmpegLoudnessCommand,
+    ToolPath,
 )
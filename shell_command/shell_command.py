@@ -1,13 +1,88 @@
 import datetime
 import json
+import os
 import tempfile
 from pathlib import Path
 import re
 import shutil
+import subprocess
+import time
 
 import pexpect
+import ptyprocess
 
 from progress_bar import ProgressBar
+from resource_usage import ResourceAccountant
+
+
+class _AccountedPtyProcess(ptyprocess.PtyProcess):
+    """A PtyProcess that captures the child's resource usage when reaped.
+    
+    pexpect reaps the child whenever it checks whether the child is
+    still alive, so we have to hook in at that point. /proc/<pid>/io
+    is read just before reaping, while the child is still a zombie.
+    """
+    rusage = None
+    io = {}
+    
+    def _wait4(self, nohang):
+        """Reap the child using wait4(), if it has exited."""
+        flags = os.WEXITED | os.WNOWAIT
+        if nohang:
+            flags |= os.WNOHANG
+        if os.waitid(os.P_PID, self.pid, flags) is None:
+            return
+        self.io = ResourceAccountant.read_proc_io(self.pid)
+        _, status, self.rusage = os.wait4(self.pid, 0)
+        self.status = status
+        if os.WIFEXITED(status):
+            self.exitstatus = os.WEXITSTATUS(status)
+            self.signalstatus = None
+        else:
+            self.exitstatus = None
+            self.signalstatus = os.WTERMSIG(status)
+        self.terminated = True
+    
+    def isalive(self):
+        if not self.terminated:
+            self._wait4(nohang=not self.flag_eof)
+        return super().isalive()
+    
+    def reap(self):
+        """Block until the child has exited and been reaped."""
+        if not self.terminated:
+            self._wait4(nohang=False)
+
+
+class _AccountedSpawn(pexpect.spawn):
+    """A pexpect spawn that uses _AccountedPtyProcess."""
+    
+    def _spawnpty(self, args, **kwargs):
+        return _AccountedPtyProcess.spawn(args, **kwargs)
+
+
+class ToolPath(object):
+    """The full path of an external tool, found when it's first needed.
+    
+    Searching PATH at import time costs a lookup for every tool on
+    every run, even for tools that the run never uses. The path is None
+    if the tool isn't installed.
+    """
+    
+    def __init__(self, name):
+        self.name = name
+        self._path = None
+        self._found = False
+    
+    def find(self):
+        """Return the tool's path."""
+        if not self._found:
+            self._path = shutil.which(self.name)
+            self._found = True
+        return self._path
+    
+    def __get__(self, instance, owner):
+        return self.find()
 
 
 class ShellCommand(object):
@@ -17,10 +92,33 @@ class ShellCommand(object):
     
     _base_options is a list of standard general options for this
     command.
+    
+    accountant is shared by all commands. If it's set to a
+    ResourceAccountant, the resource usage of every process that we
+    start is recorded; otherwise no accounting is done at all.
     """
     _executable = ""
     _base_options = []
     _expect_patterns = []
+    accountant = None
+    
+    # Regular expressions and substitutions used by shellquote(),
+    # compiled once rather than for every argument.
+    _QUOTE_SUBSTITUTIONS = [
+        # grouping parentheses for convert
+        (re.compile(r"^(\(|\))$"), r"\\\1"),
+        # double quote (in middle of string)
+        (re.compile(r'^(.+".*)$'), r"'\1'"),
+        # quotes around entire string
+        (re.compile(r"""^((?P<quote>['"]).*(?P=quote))$"""), r"\1"),
+        # command line switch (starts with one or two "-")
+        (re.compile(r"^(--?.+)$"), r"\1"),
+        # command path (starts with "/")
+        (re.compile(r"^(/[\w/]+)$"), r"\1"),
+    ]
+    # catch-all for non-word characters when none of the other
+    # substitutions apply
+    _QUOTE_NON_WORD = re.compile(r"^(.*\W+.*)$")
     
     @staticmethod
     def shellquote(s):
@@ -33,26 +131,12 @@ class ShellCommand(object):
         # We double-quote everything because that makes it easier
         # to deal with single quotes.
         if s:
-            regexes = [
-                # grouping parentheses for convert
-                re.compile(r"^(\(|\))$"),
-                # double quote (in middle of string)
-                re.compile(r'^(.+".*)$'),
-                # quotes around entire string
-                re.compile(r"""^((?P<quote>['"]).*(?P=quote))$"""),
-                # command line switch (starts with one or two "-")
-                re.compile(r"^(--?.+)$"),
-                # command path (starts with "/")
-                re.compile(r"^(/[\w/]+)$")]
-            substitutions = [r"\\\1", r"'\1'", r"\1", r"\1", r"\1"]
             num_matches = 0
-            for subst in zip(regexes, substitutions):
-                (s, n) = subst[0].subn(subst[1], s)
+            for regex, substitution in ShellCommand._QUOTE_SUBSTITUTIONS:
+                (s, n) = regex.subn(substitution, s)
                 num_matches += n
             if num_matches == 0:
-                # catch-all for non-word characters when none of the other
-                # substitutions apply
-                s = re.compile(r"^(.*\W+.*)$").sub(r'"\1"', s)
+                s = ShellCommand._QUOTE_NON_WORD.sub(r'"\1"', s)
         return s
     
     def __init__(self, input_options=[], output_options=[], quiet=False):
@@ -112,10 +196,27 @@ class ShellCommand(object):
         """Respond to a pexpect pattern. Return True on EOF."""
         return (pat == 0)
     
+    def _spawn(self):
+        """Start the command in a subprocess attached to a pty."""
+        if ShellCommand.accountant:
+            spawn_class = _AccountedSpawn
+        else:
+            spawn_class = pexpect.spawn
+        return spawn_class(self.executable_string(), self.argument_list())
+    
+    def _record_usage(self, start_time):
+        """Wait for the process to finish and record its resource usage."""
+        ptyproc = self.process.ptyproc
+        ptyproc.reap()
+        if ptyproc.rusage:
+            ShellCommand.accountant.record(
+                Path(self.executable_string()).name,
+                time.monotonic() - start_time, ptyproc.rusage, ptyproc.io)
+    
     def run(self):
         """Execute the command in a subprocess."""
-        self.process = pexpect.spawn(self.executable_string(),
-                                     self.argument_list())
+        start_time = time.monotonic()
+        self.process = self._spawn()
         # EOF is *always* the first pattern.
         patterns = self.process.compile_pattern_list(
             [pexpect.EOF] + self._expect_patterns)
@@ -124,6 +225,8 @@ class ShellCommand(object):
                 i = self.process.expect_list(patterns, timeout=None)
                 if self.process_pattern(i):
                     break
+            if ShellCommand.accountant:
+                self._record_usage(start_time)
         except (KeyboardInterrupt):
             pass
         finally:
@@ -134,35 +237,82 @@ class ShellCommand(object):
     
     def get_output(self):
         """Execute the command in a subprocess and return the output."""
-        return pexpect.run(self.command_string(quote=True))
+        if not ShellCommand.accountant:
+            return pexpect.run(self.command_string(quote=True))
+        start_time = time.monotonic()
+        self.process = self._spawn()
+        try:
+            output = self.process.read()
+            self._record_usage(start_time)
+        finally:
+            self.process.close()
+        return output
+    
+    def get_binary_output(self):
+        """Execute the command and return its (binary) standard output.
+        
+        pexpect runs commands on a pty, which mangles binary output,
+        so this uses a plain pipe instead. Returns None if the command
+        fails.
+        """
+        start_time = time.monotonic()
+        process = subprocess.Popen(
+            [self.executable_string()] + self.argument_list(),
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        with process.stdout:
+            output = process.stdout.read()
+        # Reap the process ourselves so that we get its resource usage.
+        _, status, rusage = os.wait4(process.pid, 0)
+        if os.WIFEXITED(status):
+            process.returncode = os.WEXITSTATUS(status)
+        else:
+            process.returncode = -os.WTERMSIG(status)
+        if ShellCommand.accountant:
+            ShellCommand.accountant.record(
+                Path(self.executable_string()).name,
+                time.monotonic() - start_time, rusage)
+        return output if process.returncode == 0 else None
 
 
 class ConvertCommand(ShellCommand):
-    """An ImageMagick convert command."""
-    _executable = shutil.which("convert")
-    _base_options = ["-density", "600",
-                     "xc:dimgrey", "null:", # dark grey background
+    """An ImageMagick convert command.
+    
+    density is the resolution (dpi) at which PDFs are rasterised
+    before being resized. The image is resized to fit within width x
+    height and, if letterbox is True, centred on a width x height
+    dark grey background.
+    """
+    _executable = ToolPath("convert")
+    _base_options = ["xc:dimgrey", "null:", # dark grey background
                      "("]
+    density = 600
     
-    def __init__(self, input_options=[], output_options=[], width=2048, height=1536):
+    def __init__(self, input_options=[], output_options=[], width=2048,
+                 height=1536, letterbox=True):
         super().__init__(input_options, output_options)
-        self._base_options = (["-size", "{w}x{h}".format(w=width, h=height)] +
-                              self._base_options)
+        if letterbox:
+            self._base_options = (
+                ["-size", "{w}x{h}".format(w=width, h=height),
+                 "-density", str(self.density)] + self._base_options)
+        else:
+            self._base_options = ["-density", str(self.density)]
         self.append_input_options(
             ["-resize", "{w}x{h}".format(w=width, h=height),
              "-background", "white", 
              "-alpha", "remove",
              "-type", "truecolor", # force RGB (this and next line)
              "-define", "colorspace:auto-grayscale=off"])
-        self.prepend_output_options([")",
-                                     "-gravity", "center",
-                                     "-layers", "composite",
-                                     "-flatten"])
+        if letterbox:
+            self.prepend_output_options([")",
+                                         "-gravity", "center",
+                                         "-layers", "composite",
+                                         "-flatten"])
     
 
 class FFprobeCommand(ShellCommand):
     """An ffprobe shell command."""
-    _executable = shutil.which("ffprobe")
+    _executable = ToolPath("ffprobe")
     _base_options = ["-loglevel", "error",
                      "-show_entries", "format:stream",
                      "-print_format", "json"]
@@ -186,7 +336,7 @@ class FFprobeCommand(ShellCommand):
     
 class FFmpegCommand(ShellCommand):
     """A "simple" ffmpeg shell command."""
-    _executable = shutil.which("ffmpeg")
+    _executable = ToolPath("ffmpeg")
     _base_options = ["-y", "-nostdin"]
         
 
@@ -194,6 +344,14 @@ class FFmpegConcatCommand(FFmpegCommand):
     """An ffmpeg shell command with a complex concat filter."""
     _expect_patterns = [r"time=(\d\d):(\d\d):(\d\d\.\d\d)"]
     
+    # EBU R128 true peak (dBTP) and loudness range (LU) targets for
+    # loudness normalisation. loudnorm upsamples to 192 kHz, so we
+    # resample back down afterwards (unless the audio is only measured).
+    LOUDNESS_TRUE_PEAK = -1.5
+    LOUDNESS_RANGE = 11
+    LOUDNESS_SAMPLE_RATE = 48000
+    _loudness_resample = True
+    
     def __init__(self, input_options=[], output_options=[], quiet=False,
                  max_progress=100, has_audio=False, has_video=False,
                  process_audio=True, process_video=True,
@@ -219,6 +377,8 @@ class FFmpegConcatCommand(FFmpegCommand):
                 self.prepend_output_options(["-map", "[aconc]"])
             self.prepend_output_options(["-codec:a", self.audio_codec])
         self.filters = []
+        # (audio, video, video filter) for each extra rendition.
+        self._renditions = []
     
     def append_filter(self, filter):
         """Append a filter to the filters list."""
@@ -230,6 +390,43 @@ class FFmpegConcatCommand(FFmpegCommand):
         if (self.has_audio):
             self.append_filter("[aconc] dynaudnorm=r=0.25:f=10:b=1 [anorm]")
     
+    def append_unnormalised_filter(self):
+        """Append a filter that passes the audio through unnormalised.
+        
+        Processed audio is always mapped from [anorm], so this is
+        needed when neither normalisation filter is used.
+        """
+        if (self.has_audio and self.process_audio):
+            self.append_filter("[aconc] anull [anorm]")
+    
+    def append_loudness_filter(self, target, measured=None):
+        """Append an EBU R128 loudness normalisation audio filter.
+        
+        target is the integrated loudness to aim for (LUFS). If measured
+        contains the values measured by a previous pass (see
+        FFmpegLoudnessCommand), the gain is adjusted linearly; otherwise
+        loudnorm normalises dynamically in a single pass.
+        
+        The audio is downmixed to mono (as it's output) before it's
+        measured, otherwise the output would miss the target.
+        """
+        if (self.has_audio):
+            options = "I={i}:TP={tp}:LRA={lra}".format(
+                i=target, tp=self.LOUDNESS_TRUE_PEAK, lra=self.LOUDNESS_RANGE)
+            if measured:
+                options += (":measured_I={input_i}:measured_TP={input_tp}"
+                            ":measured_LRA={input_lra}"
+                            ":measured_thresh={input_thresh}"
+                            ":offset={target_offset}:linear=true".format(
+                                **measured))
+            resample = ""
+            if self._loudness_resample:
+                resample = ",aresample={r}".format(r=self.LOUDNESS_SAMPLE_RATE)
+            self.append_filter(
+                "[aconc] aformat=channel_layouts=mono,"
+                "loudnorm={o}:print_format=json{r} [anorm]".format(
+                    o=options, r=resample))
+    
     def append_concat_filter(self, frame_type, segments=[]):
         """Append a concat filter to the filters list"""
         # Ignore frame segments.
@@ -248,12 +445,69 @@ class FFmpegConcatCommand(FFmpegCommand):
                         a=frame_type if frame_type == "a" else "",
                         t=frame_type))
         
+    def append_rendition(self, output_options, audio=True, video=True,
+                         video_filter=None, pix_fmt="yuv420p"):
+        """Add another output (rendition) of the same audio and video.
+        
+        The final audio and video are split between the main output
+        and its renditions, so everything is decoded and filtered only
+        once. output_options are the rendition's codec options and
+        output file. video_filter (e.g., "scale=-2:720") is applied to
+        the rendition's video only, and processed video is converted to
+        pix_fmt. Call this after the main output has been added.
+        """
+        number = len(self._renditions)
+        audio = audio and self.has_audio
+        video = video and self.has_video
+        if (video):
+            if (self.process_video):
+                self.append_output_options(["-pix_fmt", pix_fmt])
+            self.append_output_options(["-map", "[vrend{n}]".format(n=number)])
+        if (audio):
+            if (self.process_audio):
+                self.append_output_options(["-ac", "1"])
+            self.append_output_options(["-map", "[arend{n}]".format(n=number)])
+        self.append_output_options(output_options)
+        self._renditions.append((audio, video, video_filter))
+    
+    def rendition_filters(self):
+        """Return the filters, with the final streams split between renditions.
+        
+        The filter that produces each stream of the main output is
+        redirected to a split filter that feeds both the main output
+        and the renditions.
+        """
+        filters = list(self.filters)
+        outputs = (("a", "[anorm]" if self.process_audio else "[aconc]", 0),
+                   ("v", "[vconc]", 1))
+        for t, label, i in outputs:
+            taps = [n for n, r in enumerate(self._renditions) if r[i]]
+            producers = [n for n, f in enumerate(filters)
+                         if f.endswith(" " + label)]
+            if not (taps and producers):
+                continue
+            filters[producers[-1]] = "{f}[{t}split]".format(
+                f=filters[producers[-1]][:-len(label)], t=t)
+            outspecs = [label]
+            for n in taps:
+                video_filter = self._renditions[n][2] if t == "v" else None
+                outspecs.append("[{t}{s}{n}]".format(
+                    t=t, s="tap" if video_filter else "rend", n=n))
+                if video_filter:
+                    filters.append("[vtap{n}] {f} [vrend{n}]".format(
+                        n=n, f=video_filter))
+            filters.insert(producers[-1] + 1,
+                           "[{t}split] {a}split={c} {o}".format(
+                               t=t, a="a" if t == "a" else "",
+                               c=len(outspecs), o=" ".join(outspecs)))
+        return filters
+    
     def build_complex_filter(self):
         """Build the complete complex filter.
         
         Filters in the filtergraph are separated by ";".
         """
-        return "{f}".format(f=";".join(self.filters))
+        return "{f}".format(f=";".join(self.rendition_filters()))
     
     def argument_string(self, quote=False):
         """Return the list of arguments as a string."""
@@ -282,3 +536,30 @@ class FFmpegConcatCommand(FFmpegCommand):
                 seconds=float(self.process.match.group(3)))
             self.progress.update(elapsed.total_seconds())
         return (pat == 0)
+
+
+class FFmpegLoudnessCommand(FFmpegConcatCommand):
+    """An ffmpeg command that measures the loudness of its audio.
+    
+    The command must include a loudness filter (see
+    append_loudness_filter()). After running, measurement() returns
+    the values that it printed, or None if there weren't any.
+    """
+    _expect_patterns = (FFmpegConcatCommand._expect_patterns +
+                        [r'\{\s*"input_i"[^}]*\}'])
+    # Only the measured values are needed, not the audio.
+    _loudness_resample = False
+    
+    def __init__(self, input_options=[], output_options=[], **kwargs):
+        super().__init__(input_options, output_options, **kwargs)
+        self._measurement = None
+    
+    def measurement(self):
+        """Return the measured loudness values."""
+        return self._measurement
+    
+    def process_pattern(self, pat):
+        """Respond to a pexpect pattern. Return True on EOF."""
+        if (pat == 2):
+            self._measurement = json.loads(self.process.match.group(0))
+        return super().process_pattern(pat)
@@ -39,6 +39,28 @@ class ConvertCommandTestCase(ShellCommandSharedTestCase):
         ]
 
 
+class ConvertCommandNoLetterboxTestCase(ShellCommandSharedTestCase):
+    """Test the ConvertCommand class without letterboxing."""
+
+    def setUp(self):
+        """Set up for test."""
+        self.command = ConvertCommand(
+            input_options=["in.pdf[12]"], output_options=["out.png"],
+            width=640, height=480, letterbox=False)
+        self.expected_executable = shutil.which("convert")
+        self.expected_base_options = ["-density", "600"]
+        self.expected_input_options = [
+            "in.pdf[12]",
+            "-resize", "640x480",
+            "-background", "white", 
+            "-alpha", "remove",
+            "-type", "truecolor",
+            "-define", "colorspace:auto-grayscale=off",
+        ]
+        self.expected_filter_options = []
+        self.expected_output_options = ["out.png"]
+
+
 # Remove ShellCommandSharedTestCase from the namespace so we don't run
 # the shared tests twice. See <https://stackoverflow.com/a/22836015>.
 del(ShellCommandSharedTestCase)
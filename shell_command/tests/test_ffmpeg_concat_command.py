@@ -6,7 +6,7 @@ import unittest
 from unittest.mock import MagicMock
 
 from segment import Segment, AudioSegment, VideoSegment
-from shell_command import FFmpegConcatCommand
+from shell_command import FFmpegConcatCommand, FFmpegLoudnessCommand
 from shell_command.tests import ShellCommandSharedTestCase
 
 
@@ -54,6 +54,43 @@ class FFmpegConcatCommandTestCase(ShellCommandSharedTestCase):
         self.command.append_normalisation_filter()
         self.assertEqual(self.command.filters, filters)
     
+    def test_append_unnormalised_filter(self):
+        """Test appending a filter for unnormalised audio."""
+        self.command.append_unnormalised_filter()
+        self.assertEqual(self.command.filters, ["[aconc] anull [anorm]"])
+    
+    def test_append_loudness_filter(self):
+        """Test appending single and second pass loudness filters."""
+        measured = {"input_i": "-27.5", "input_tp": "-8.1",
+                    "input_lra": "6.2", "input_thresh": "-38.0",
+                    "target_offset": "0.4"}
+        measurement = FFmpegLoudnessCommand(
+            input_options=["-i", "in.mov"], output_options=["out.mov"],
+            has_audio=True, quiet=True)
+        test_data = (
+            (self.command, None,
+             "[aconc] aformat=channel_layouts=mono,"
+             "loudnorm=I=-16:TP=-1.5:LRA=11:print_format=json,"
+             "aresample=48000 [anorm]",
+             "single pass"),
+            (measurement, None,
+             "[aconc] aformat=channel_layouts=mono,"
+             "loudnorm=I=-16:TP=-1.5:LRA=11:print_format=json [anorm]",
+             "measurement pass"),
+            (self.command, measured,
+             "[aconc] aformat=channel_layouts=mono,"
+             "loudnorm=I=-16:TP=-1.5:LRA=11:measured_I=-27.5:"
+             "measured_TP=-8.1:measured_LRA=6.2:measured_thresh=-38.0:"
+             "offset=0.4:linear=true:print_format=json,aresample=48000 "
+             "[anorm]",
+             "second pass"),
+        )
+        for command, values, expected, description in test_data:
+            with self.subTest(msg=description):
+                command.filters = []
+                command.append_loudness_filter(-16, values)
+                self.assertEqual(command.filters, [expected])
+    
     def test_append_concat_filter(self):
         """Test appending various concat filters."""
         test_data = (
@@ -118,6 +155,37 @@ class FFmpegConcatCommandTestCase(ShellCommandSharedTestCase):
                 self.command.append_filter(appended)
                 self.assertEqual(self.command.build_complex_filter(), expected)
 
+    def test_append_rendition(self):
+        """Test splitting the output between renditions."""
+        self.command.append_filter("[a0] anull [aconc]")
+        self.command.append_unnormalised_filter()
+        self.command.append_filter("[v0] null [vconc]")
+        self.command.append_rendition(["-codec:v", "h264", "web.mp4"],
+                                      video_filter="scale=-2:720")
+        self.command.append_rendition(["-codec:a", "aac", "feed.m4a"],
+                                      video=False)
+        test_data = (
+            (self.command.build_complex_filter(),
+             "[a0] anull [aconc];[aconc] anull [asplit];"
+             "[asplit] asplit=3 [anorm] [arend0] [arend1];"
+             "[v0] null [vsplit];[vsplit] split=2 [vconc] [vtap0];"
+             "[vtap0] scale=-2:720 [vrend0]",
+             "filters"),
+            (self.command.output_options,
+             self.expected_output_options + [
+                 "-pix_fmt", "yuv420p", "-map", "[vrend0]",
+                 "-ac", "1", "-map", "[arend0]",
+                 "-codec:v", "h264", "web.mp4",
+                 "-ac", "1", "-map", "[arend1]",
+                 "-codec:a", "aac", "feed.m4a"],
+             "output options"),
+            (self.command.filters[-1], "[v0] null [vconc]",
+             "filter list is unchanged"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
 # process_pattern() updates the internal ProgressBar object.
 
 
@@ -1,6 +1,8 @@
+import shutil
 import unittest
+from unittest.mock import patch
 
-from shell_command import ShellCommand
+from shell_command import ShellCommand, ToolPath
 from shell_command.tests import ShellCommandSharedTestCase
 
 
@@ -122,6 +124,24 @@ class ShellCommandTestCase(ShellCommandSharedTestCase):
         pass
 
 
+class ToolPathTestCase(unittest.TestCase):
+    """Test the ToolPath class."""
+
+    def test_lazy_lookup(self):
+        """Test that the tool is only looked up once, when first used."""
+        expected = shutil.which("sh")
+        with patch("shutil.which", wraps=shutil.which) as which:
+            class Command(ShellCommand):
+                _executable = ToolPath("sh")
+            with self.subTest(msg="not looked up when defined"):
+                which.assert_not_called()
+            with self.subTest(msg="path"):
+                self.assertEqual(Command._executable, expected)
+                self.assertEqual(Command().executable_string(), expected)
+            with self.subTest(msg="looked up once"):
+                which.assert_called_once_with("sh")
+
+
 # Remove ShellCommandSharedTestCase from the namespace so we don't run
 # the shared tests twice. See <https://stackoverflow.com/a/22836015>.
 del(ShellCommandSharedTestCase)
@@ -0,0 +1,97 @@
+from pathlib import Path
+import unittest
+
+from config_parser import fast_parse, get_parser, parse_configuration_string
+
+
+# Sample configuration files.
+CONFIGS = Path(__file__).resolve().parents[1] / "test"
+
+
+def results(parsed):
+    """Return the tokens and named fields of each segment specification."""
+    return [(s.asList(), s.asDict()) for s in parsed]
+
+
+def full_parse(config_string):
+    """Parse a configuration with the full grammar."""
+    return get_parser().parseString(config_string, parseAll=True)
+
+
+class FastParseTestCase(unittest.TestCase):
+    """Test that the fast path matches the full grammar."""
+
+    def test_config_files(self):
+        """Test the sample configuration files."""
+        # The others contain duration files (@file).
+        fast = ["config1.txt", "config4.txt"]
+        for f in sorted(CONFIGS.glob("config*.txt")):
+            config = f.read_text()
+            with self.subTest(msg=f.name):
+                if f.name in fast:
+                    self.assertEqual(results(fast_parse(config)),
+                                     results(full_parse(config)))
+                else:
+                    self.assertIsNone(fast_parse(config))
+                    self.assertEqual(
+                        results(parse_configuration_string(config)),
+                        results(full_parse(config)))
+
+    def test_common_forms(self):
+        """Test configurations the fast path handles."""
+        test_data = (
+            ("", "empty"),
+            ("[a] 1 2", "type only"),
+            ("[audio:a.wav] 1 2\n[video:a.mov] 3 4", "long types"),
+            ("[a::1] 1 2", "stream without file"),
+            ("[v:a b.mov:0] 1 2", "file and stream"),
+            ("[f:s.pdf:last] 1 2", "last frame"),
+            ("[f:s.pdf:-1] 1 2", "last frame (-1)"),
+            ("[f:^:3] 1 2", "previous segment"),
+            ("[f:s.pdf] 1 2", "frame without number"),
+            ("[a:a.wav] 1:02:03.5 1:02:04.25", "h:mm:ss.fff"),
+            ("[a:a.wav] 2:03 2:04.1234", "mm:ss.ffff"),
+            ("[a:a.wav] 00:00:01 00:00:02 00:00:05 00:00:06",
+                "several punch points"),
+            ("# comment\n[a:a.wav] 1 2 # comment\n# [v:a.mov] 1 2\n",
+                "comments"),
+            ("[a:a.wav]\n[v:a.mov] 1\n2", "segment without times"),
+        )
+        for config, description in test_data:
+            with self.subTest(msg=description):
+                fast = fast_parse(config)
+                self.assertIsNotNone(fast)
+                self.assertEqual(results(fast), results(full_parse(config)))
+
+    def test_fallback(self):
+        """Test configurations left to the full grammar."""
+        test_data = (
+            ("[a:a.wav] @joiner.wav", "lonely duration file"),
+            ("[a:a.wav] 1 @joiner.wav", "duration file"),
+            ("[a:a.wav] .5 1", "milliseconds only"),
+            ("[a:a.wav:1:v:a.mov] 1 2", "several input specifications"),
+        )
+        for config, description in test_data:
+            with self.subTest(msg=description):
+                self.assertIsNone(fast_parse(config))
+                self.assertEqual(
+                    results(parse_configuration_string(config)),
+                    results(full_parse(config)))
+
+    def test_bad_input(self):
+        """Test that errors are left to the full grammar."""
+        test_data = (
+            ("[x:a.wav] 1 2", "unknown type"),
+            ("[a:a.wav 1 2", "unclosed bracket"),
+            ("1 2 [a:a.wav]", "times before input"),
+            ("[a:a.wav] 1:2:3:4", "too many fields"),
+            ("[a:a.wav] 1x", "not a timestamp"),
+            ("[f:s.pdf:first] 1 2", "bad frame number"),
+        )
+        for config, description in test_data:
+            with self.subTest(msg=description):
+                self.assertIsNone(fast_parse(config))
+
+
+if __name__ == '__main__':
+    unittest.main()
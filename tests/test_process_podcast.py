@@ -0,0 +1,325 @@
+import argparse
+from datetime import timedelta
+import unittest
+
+from process_podcast import (
+    clip_previous_segments, clip_segments, coalesce_segments,
+    previous_segments, render_window, segment_window, time_window,
+    video_chunks,
+)
+from segment import AudioSegment, FrameSegment, Segment, VideoSegment
+
+
+def seconds(s):
+    """Return a timedelta of s seconds."""
+    return timedelta(seconds=s)
+
+
+def punches(segments):
+    """Return the punch points of segments, in seconds."""
+    return [(s.punch_in.total_seconds(), s.punch_out.total_seconds())
+            for s in segments]
+
+
+class WindowTestCase(unittest.TestCase):
+    """Test rendering part of a podcast (--range and --segments)."""
+
+    def setUp(self):
+        """Set up a video timeline of 10 + 20 + 30 seconds."""
+        Segment._input_files = {}
+        self.video = [
+            VideoSegment(file="a.mov", punch_in=seconds(100),
+                         punch_out=seconds(110)),
+            FrameSegment(file="s.pdf", punch_in=seconds(0),
+                         punch_out=seconds(20), frame_number=3),
+            VideoSegment(file="b.mov", punch_in=seconds(0),
+                         punch_out=seconds(30)),
+        ]
+        self.audio = [AudioSegment(file="a.wav", punch_in=seconds(5),
+                                   punch_out=seconds(65))]
+
+    def tearDown(self):
+        """Clean up after test."""
+        Segment._input_files = {}
+
+    def test_time_window(self):
+        """Test parsing --range."""
+        test_data = (
+            ("1:02:30-1:03:15", (seconds(3750), seconds(3795)), "both"),
+            ("10:00-", (seconds(600), None), "no end"),
+            ("-5:00", (seconds(0), seconds(300)), "no start"),
+            ("0-5:00", (seconds(0), seconds(300)), "from 0"),
+            ("0-", (seconds(0), None), "from 0 to the end"),
+            ("1.5-2.25", (seconds(1.5), seconds(2.25)), "milliseconds"),
+        )
+        for value, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(time_window(value), expected)
+        for value in ["", "-", "5", "5-2", "2-2", "0-0", "1-2-3", "a-b"]:
+            with self.subTest(msg='invalid "{v}"'.format(v=value)):
+                with self.assertRaises(argparse.ArgumentTypeError):
+                    time_window(value)
+
+    def test_segment_window(self):
+        """Test parsing --segments."""
+        test_data = (
+            ("2..3", (2, 3), "both"),
+            ("2..", (2, None), "no end"),
+            ("..3", (1, 3), "no start"),
+            ("2", (2, 2), "single segment"),
+            ("3..3", (3, 3), "single segment range"),
+        )
+        for value, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(segment_window(value), expected)
+        for value in ["0..3", "5..2", "0", "a", "1..2..3", "-1"]:
+            with self.subTest(msg='invalid "{v}"'.format(v=value)):
+                with self.assertRaises(argparse.ArgumentTypeError):
+                    segment_window(value)
+
+    def test_render_window(self):
+        """Test working out the part of the output to render."""
+        def window(time_window=None, segment_window=None, audio=None,
+                   video=None):
+            args = argparse.Namespace(time_window=time_window,
+                                      segment_window=segment_window)
+            return render_window(args, self.audio if audio is None else audio,
+                                 self.video if video is None else video)
+        test_data = (
+            (window(), None, "whole podcast"),
+            (window(time_window=(seconds(5), None)), (seconds(5), None),
+                "time range"),
+            (window(segment_window=(2, 2)), (seconds(10), seconds(30)),
+                "single segment"),
+            (window(segment_window=(2, None)), (seconds(10), None),
+                "no end"),
+            (window(segment_window=(1, 3)), (seconds(0), None),
+                "up to the last segment"),
+            (window(segment_window=(1, 1), video=[]),
+                (seconds(0), None), "audio only"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        with self.subTest(msg="past the last segment"):
+            with self.assertRaises(SystemExit):
+                window(segment_window=(4, None))
+
+    def test_clip_segments(self):
+        """Test clipping a timeline to a window."""
+        test_data = (
+            (0, None, [(100, 110), (0, 20), (0, 30)], "whole timeline"),
+            (5, 45, [(105, 110), (0, 20), (0, 15)], "inside segments"),
+            (10, 30, [(0, 20)], "on segment edges"),
+            (10, 31, [(0, 20), (0, 1)], "just past an edge"),
+            (12, 14, [(2, 4)], "inside one segment"),
+            (55, None, [(25, 30)], "no end"),
+            (60, None, [], "after the end"),
+        )
+        for start, end, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.setUp()
+                self.assertEqual(
+                    punches(clip_segments(self.video, seconds(start),
+                                          end and seconds(end))),
+                    expected)
+
+    def test_clip_numbered_frame(self):
+        """Test that a "^" frame's numbered frame isn't moved by clipping."""
+        before = self.video[2]
+        frame = FrameSegment(file="^", punch_in=seconds(0),
+                             punch_out=seconds(5), frame_number=24)
+        last = FrameSegment(file="^", punch_in=seconds(0),
+                            punch_out=seconds(5), frame_number=-1)
+        previous = {frame: before, last: before}
+        clipped = clip_segments(self.video + [frame], seconds(40), None,
+                                previous=previous)
+        test_data = (
+            (punches(clipped), [(10, 30), (0, 5)], "clipped"),
+            (punches([previous[frame]]), [(0, 30)], "numbered frame"),
+            (previous[last] is before, True, "last frame"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_clip_previous_segments(self):
+        """Test trimming previous segments that won't be rendered."""
+        frames = [FrameSegment(file="^", punch_in=seconds(0),
+                               punch_out=seconds(5), frame_number=n)
+                  for n in [-1, 24, -1]]
+        previous = {frames[0]: self.video[0], frames[1]: self.video[2],
+                    frames[2]: self.video[1]}
+        clip_previous_segments(previous, [self.video[1]])
+        test_data = (
+            (punches([self.video[0]]), [(105, 110)], "last frame"),
+            (punches([self.video[2]]), [(0, 30)], "numbered frame"),
+            (punches([self.video[1]]), [(0, 20)], "frame segment"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+
+class CoalesceTestCase(unittest.TestCase):
+    """Test merging segments that continue each other."""
+
+    def setUp(self):
+        """Clean up the input files of earlier tests."""
+        Segment._input_files = {}
+
+    def tearDown(self):
+        """Clean up after test."""
+        Segment._input_files = {}
+
+    def video(self, start, end, file="a.mov"):
+        """Return a video segment."""
+        return VideoSegment(file=file, punch_in=seconds(start),
+                            punch_out=seconds(end))
+
+    def frame(self, file, number, duration=5):
+        """Return a frame segment."""
+        return FrameSegment(file=file, punch_in=seconds(0),
+                            punch_out=seconds(duration), frame_number=number)
+
+    def test_timelines(self):
+        """Test merging back to back segments of each timeline."""
+        audio = [AudioSegment(file="a.wav", punch_in=seconds(start),
+                              punch_out=seconds(end))
+                 for start, end in [(0, 10), (10, 20), (25, 30)]]
+        video = [self.video(0, 10), self.video(10, 20),
+                 self.video(20, 30, file="b.mov"), self.video(30, 40)]
+        # The timelines are interleaved, as in a configuration file.
+        segments = coalesce_segments([audio[0], video[0], audio[1],
+                                      video[1], audio[2], video[2],
+                                      video[3]])
+        test_data = (
+            (segments, [audio[0], video[0], audio[2], video[2], video[3]],
+                "remaining segments"),
+            (punches(segments), [(0, 20), (0, 20), (25, 30), (20, 30),
+                                 (30, 40)], "punch points"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_frames(self):
+        """Test merging frame segments with the same image."""
+        frames = [self.frame("s.pdf", 1), self.frame("s.pdf", 1),
+                  self.frame("^", -1), self.frame("s.pdf", 2)]
+        segments = coalesce_segments(frames)
+        test_data = (
+            (segments, [frames[0], frames[3]], "remaining segments"),
+            ([s.get_duration() for s in segments], [15, 5], "durations"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_last_frame(self):
+        """Test that a "^" frame's last frame comes from the merged segment."""
+        video = [self.video(0, 10), self.video(10, 20)]
+        frames = [self.frame("^", -1), self.frame("^", -1)]
+        segments = video + frames
+        previous = previous_segments(segments)
+        segments = coalesce_segments(segments, previous)
+        test_data = (
+            (segments, [video[0], frames[0]], "remaining segments"),
+            (punches(segments[:1]), [(0, 20)], "merged"),
+            (previous, {frames[0]: video[0]}, "previous segments"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_numbered_frame(self):
+        """Test that a "^" frame's numbered frame isn't moved by merging."""
+        video = [self.video(0, 10), self.video(10, 20)]
+        frame = self.frame("^", 24)
+        later = self.frame("^", -1)
+        segments = video + [frame, later]
+        previous = previous_segments(segments)
+        segments = coalesce_segments(segments, previous)
+        test_data = (
+            (segments, video + [frame], "not merged"),
+            (punches(video), [(0, 10), (10, 20)], "punch points"),
+            (previous, {frame: video[1]}, "previous segments"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+
+class VideoChunksTestCase(unittest.TestCase):
+    """Test splitting the final video into chunks (see --resume)."""
+
+    def setUp(self):
+        """Clean up the input files of earlier tests."""
+        Segment._input_files = {}
+
+    def tearDown(self):
+        """Clean up after test."""
+        Segment._input_files = {}
+
+    def chunks(self, segments, length=10):
+        """Return the punch points of each chunk of segments."""
+        return [punches(c) for c in video_chunks(segments, length)]
+
+    def test_boundaries(self):
+        """Test chunks that end on segment boundaries."""
+        segments = [VideoSegment(file="a.mov", punch_in=seconds(start),
+                                 punch_out=seconds(end))
+                    for start, end in [(0, 4), (4, 10), (20, 30), (30, 35)]]
+        test_data = (
+            (self.chunks(segments), [[(0, 4), (4, 10)], [(20, 30)],
+                                     [(30, 35)]], "chunks"),
+            (self.chunks(segments, 100), [punches(segments)], "one chunk"),
+            (self.chunks([]), [], "no segments"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_split(self):
+        """Test splitting video segments that cross a chunk boundary."""
+        segment = VideoSegment(file="a.mov", punch_in=seconds(100),
+                               punch_out=seconds(125))
+        chunks = video_chunks([VideoSegment(file="b.mov",
+                                            punch_out=seconds(4)), segment],
+                              10)
+        pieces = [s for c in chunks for s in c][1:]
+        test_data = (
+            ([punches(c) for c in chunks],
+                [[(0, 4), (100, 106)], [(106, 116)], [(116, 125)]],
+                "chunks"),
+            (punches([segment]), [(100, 125)], "segment unchanged"),
+            ([p._input_options for p in pieces],
+                [["-ss", "100.0", "-t", "6.0", "-i", "a.mov"],
+                 ["-ss", "106.0", "-t", "10.0", "-i", "a.mov"],
+                 ["-ss", "116.0", "-t", "9.0", "-i", "a.mov"]],
+                "input options"),
+            (set(Segment._input_files), {"a.mov", "b.mov"}, "input files"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_frames(self):
+        """Test that frame segments aren't split."""
+        frames = [FrameSegment(file="s.pdf", punch_in=seconds(0),
+                               punch_out=seconds(duration), frame_number=n)
+                  for n, duration in enumerate([8, 25, 3])]
+        chunks = video_chunks(frames, 10)
+        test_data = (
+            (chunks, [frames[:2], frames[2:]], "chunks"),
+            (punches(frames), [(0, 8), (0, 25), (0, 3)], "punch points"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
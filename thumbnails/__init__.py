@@ -0,0 +1 @@
+from thumbnails.thumbnails import Thumbnails
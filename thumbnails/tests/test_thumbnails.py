@@ -0,0 +1,77 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from thumbnails import Thumbnails
+
+
+class ThumbnailsTestCase(unittest.TestCase):
+    """Test the Thumbnails class."""
+
+    def setUp(self):
+        """Set up thumbnails for a 4:3 video."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.thumbnails = Thumbnails(self.directory.name, 10, 1024, 768)
+
+    def tearDown(self):
+        """Remove the thumbnails."""
+        self.directory.cleanup()
+
+    def test_size(self):
+        """Test that thumbnails keep the video's aspect ratio."""
+        test_data = (
+            ((1024, 768), (160, 120), "4:3"),
+            ((1920, 1080), (160, 90), "16:9"),
+            ((1000, 1), (160, 2), "very wide"),
+        )
+        for (width, height), expected, description in test_data:
+            with self.subTest(msg=description):
+                thumbnails = Thumbnails(self.directory.name, 10, width, height)
+                self.assertEqual((thumbnails.width, thumbnails.height),
+                                 expected)
+
+    def test_sprite_filter(self):
+        """Test the sprite sheet filter."""
+        self.assertEqual(self.thumbnails.sprite_filter(),
+                         "fps=1/10,scale=160:120,tile=10x10")
+
+    def test_timestamp(self):
+        """Test formatting WebVTT timestamps."""
+        test_data = (
+            (0, "00:00:00.000", "zero"),
+            (75.5, "00:01:15.500", "minutes"),
+            (7322.25, "02:02:02.250", "hours"),
+        )
+        for seconds, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(Thumbnails.timestamp(seconds), expected)
+
+    def test_cues(self):
+        """Test mapping intervals to sprite regions."""
+        cues = self.thumbnails.cues(1005)
+        test_data = (
+            (len(cues), 101, "number of thumbnails"),
+            (cues[0], (0, 10, "sprite_000.jpg", 0, 0), "first"),
+            (cues[11], (110, 120, "sprite_000.jpg", 160, 120),
+             "second row"),
+            (cues[100], (1000, 1005, "sprite_001.jpg", 0, 0),
+             "second sprite, cut short"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_write_index(self):
+        """Test writing the WebVTT index."""
+        self.thumbnails.write_index(15)
+        self.assertEqual(
+            Path(self.directory.name, "thumbnails.vtt").read_text(),
+            "WEBVTT\n\n"
+            "00:00:00.000 --> 00:00:10.000\n"
+            "sprite_000.jpg#xywh=0,0,160,120\n\n"
+            "00:00:10.000 --> 00:00:15.000\n"
+            "sprite_000.jpg#xywh=160,0,160,120\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import math
+import os
+from pathlib import Path
+
+
+class Thumbnails(object):
+    """Scrubbing thumbnails: sprite sheets, a WebVTT index and a poster.
+    
+    One thumbnail is taken every interval seconds, scaled to WIDTH
+    pixels wide (keeping the aspect ratio of a width x height video),
+    and COLUMNS x ROWS of them are tiled into each sprite sheet. The
+    index maps each interval to its thumbnail's region of a sheet, as
+    scrubbing previews in most web players expect.
+    """
+    WIDTH = 160
+    COLUMNS = 10
+    ROWS = 10
+    SPRITE_PATTERN = "sprite_%03d.jpg"
+    POSTER = "poster.jpg"
+    INDEX = "thumbnails.vtt"
+    
+    def __init__(self, directory, interval, width, height):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.width = self.WIDTH
+        # Even, as most encoders require.
+        self.height = 2 * max(1, int(round(self.WIDTH * height / width / 2)))
+    
+    @property
+    def sprites(self):
+        """Return the file name pattern of the sprite sheets."""
+        return self.directory / self.SPRITE_PATTERN
+    
+    @property
+    def poster(self):
+        """Return the poster frame file."""
+        return self.directory / self.POSTER
+    
+    def sprite_filter(self):
+        """Return the video filter that turns a video into sprite sheets."""
+        return "fps=1/{i},scale={w}:{h},tile={c}x{r}".format(
+            i=self.interval, w=self.width, h=self.height, c=self.COLUMNS,
+            r=self.ROWS)
+    
+    @staticmethod
+    def timestamp(seconds):
+        """Return a WebVTT timestamp (HH:MM:SS.mmm)."""
+        milliseconds = int(round(seconds * 1000))
+        return "{h:02d}:{m:02d}:{s:02d}.{ms:03d}".format(
+            h=milliseconds // 3600000, m=milliseconds // 60000 % 60,
+            s=milliseconds // 1000 % 60, ms=milliseconds % 1000)
+    
+    def cues(self, duration):
+        """Return the (start, end, sprite, x, y) of each thumbnail."""
+        per_sprite = self.COLUMNS * self.ROWS
+        cues = []
+        for i in range(int(math.ceil(duration / self.interval))):
+            position = i % per_sprite
+            cues.append((i * self.interval,
+                         min((i + 1) * self.interval, duration),
+                         self.SPRITE_PATTERN % (i // per_sprite),
+                         position % self.COLUMNS * self.width,
+                         position // self.COLUMNS * self.height))
+        return cues
+    
+    def write_index(self, duration):
+        """Write the WebVTT index for a video of duration seconds."""
+        lines = ["WEBVTT", ""]
+        for start, end, sprite, x, y in self.cues(duration):
+            lines += ["{s} --> {e}".format(s=self.timestamp(start),
+                                           e=self.timestamp(end)),
+                      "{f}#xywh={x},{y},{w},{h}".format(
+                          f=sprite, x=x, y=y, w=self.width, h=self.height),
+                      ""]
+        index = self.directory / self.INDEX
+        temp = index.with_name(index.name + ".part")
+        temp.write_text("\n".join(lines))
+        os.replace(str(temp), str(index))
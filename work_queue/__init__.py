@@ -0,0 +1,4 @@
+from work_queue.work_queue import (
+    WorkQueue,
+    Worker,
+)
@@ -0,0 +1,42 @@
+import argparse
+import logging
+
+import globals
+from work_queue import WorkQueue, Worker
+
+
+def main():
+    """Run a worker for a shared work queue (see process_podcast --queue)."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(levelname)s: {p}: %(message)s".format(p=globals.PROGRAM))
+    parser = argparse.ArgumentParser(
+        prog="python -m work_queue",
+        description="Run units of work from the shared queue directory "
+            "DIR, one at a time.")
+    parser.add_argument("queue", metavar="DIR")
+    parser.add_argument(
+        "--idle-timeout", dest="idle_timeout", metavar="SECONDS",
+        type=float,
+        help="Stop after SECONDS without any work (default: never stop).")
+    parser.add_argument(
+        "--name", help="Name of the worker in results (default host:pid).")
+    parser.add_argument(
+        "--debug", "-d", action="store_true",
+        help="Print debugging output.")
+    args = parser.parse_args()
+    if args.debug:
+        globals.log.setLevel(logging.DEBUG)
+    worker = Worker(WorkQueue(args.queue), args.name)
+    globals.log.info("Worker {n} waiting for work in {q}".format(
+        n=worker.name, q=args.queue))
+    try:
+        count = worker.work(args.idle_timeout)
+    except KeyboardInterrupt:
+        return
+    globals.log.info("Worker {n} ran {c} units".format(n=worker.name,
+                                                        c=count))
+
+
+if (__name__ == "__main__"):
+    main()
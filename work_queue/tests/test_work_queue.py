@@ -0,0 +1,171 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from work_queue import WorkQueue, Worker
+
+
+# The package root, so that worker processes can import work_queue.
+ROOT = str(Path(__file__).resolve().parents[2])
+
+
+class FakeCommand(object):
+    """A shell command that runs Python."""
+
+    def __init__(self, code):
+        self.code = code
+
+    def executable_string(self):
+        return sys.executable
+
+    def argument_list(self):
+        return ["-c", self.code]
+
+
+class WorkQueueTestCase(unittest.TestCase):
+    """Test the WorkQueue class."""
+
+    def setUp(self):
+        """Set up an empty queue."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.queue = WorkQueue(self.directory.name, claim_timeout=60)
+
+    def tearDown(self):
+        """Remove the queue."""
+        self.directory.cleanup()
+
+    def test_claim(self):
+        """Test that each unit is claimed exactly once, in order."""
+        units = [self.queue.submit(["echo", str(n)]) for n in range(3)]
+        # Another handle on the same directory (e.g., on another host).
+        other = WorkQueue(self.directory.name)
+        claims = [self.queue.claim(), other.claim(), self.queue.claim()]
+        test_data = (
+            ([c["unit"] for c in claims], units, "claim order"),
+            (claims[1]["argv"], ["echo", "1"], "arguments"),
+            (other.claim(), None, "queue empty"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_requeue(self):
+        """Test that abandoned claims are returned to the queue."""
+        unit = self.queue.submit(["echo"])
+        self.queue.claim()
+        with self.subTest(msg="live claim"):
+            self.assertEqual(self.queue.requeue_abandoned(), [])
+        claim = Path(self.directory.name, WorkQueue.CLAIMED, unit + ".json")
+        stale = time.time() - 120
+        os.utime(str(claim), (stale, stale))
+        with self.subTest(msg="abandoned claim"):
+            self.assertEqual(self.queue.requeue_abandoned(), [unit])
+        with self.subTest(msg="claimed again"):
+            self.assertEqual(self.queue.claim()["unit"], unit)
+
+    def test_worker(self):
+        """Test running units in process."""
+        output = Path(self.directory.name, "output")
+        units = [self.queue.submit(
+            [sys.executable, "-c",
+             "import sys; open(sys.argv[1], 'a').write('x'); "
+             "sys.exit(int(sys.argv[2]))", output, status])
+            for status in [0, 3]]
+        units.append(self.queue.submit(["no such command"]))
+        units.append(self.queue.submit(
+            [sys.executable, "-c", "open('relative', 'w')"],
+            cwd=self.directory.name))
+        worker = Worker(self.queue, "test")
+        test_data = (
+            (worker.work(idle_timeout=0), 4, "units run"),
+            (self.queue.result(units[0])["worker"], "test", "worker name"),
+            (self.queue.wait(units), [0, 3, 127, 0], "exit statuses"),
+            (output.read_text(), "xx", "output written"),
+            (Path(self.directory.name, "relative").exists(), True,
+                "working directory"),
+            (self.queue.result(units[0]), None, "results collected"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_lost_claim(self):
+        """Test that a worker stops a unit whose claim has been lost."""
+        queue = WorkQueue(self.directory.name, claim_timeout=0.4)
+        unit = queue.submit([sys.executable, "-c",
+                             "import time; time.sleep(60)"])
+        claim = queue.claim()
+        # Requeued as abandoned while the worker is starting.
+        os.rename(str(Path(self.directory.name, WorkQueue.CLAIMED,
+                           unit + ".json")),
+                  str(Path(self.directory.name, WorkQueue.PENDING,
+                           unit + ".json")))
+        start = time.monotonic()
+        status = Worker(queue, "test").run_unit(claim)
+        test_data = (
+            (status, None, "exit status"),
+            (time.monotonic() - start < 30, True, "command stopped"),
+            (queue.result(unit), None, "no result recorded"),
+            (queue.claim()["unit"], unit, "claimed again"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+    def test_wait_timeout(self):
+        """Test giving up on units that no worker claims."""
+        self.queue.UNCLAIMED_WARNING = 0
+        units = [self.queue.submit(["echo"]) for n in range(2)]
+        self.queue.finish(self.queue.claim()["unit"], 0)
+        with self.assertLogs("process_podcast") as logs:
+            statuses = self.queue.wait(units, timeout=1)
+        test_data = (
+            (statuses, [0, None], "exit statuses"),
+            (self.queue.claim(), None, "withdrawn"),
+            (any(["WARNING" in m for m in logs.output]), False,
+                "no warning once a unit is claimed"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+        unit = self.queue.submit(["echo"])
+        with self.assertLogs("process_podcast", "WARNING") as logs:
+            self.queue.wait([unit], timeout=1)
+        with self.subTest(msg="warning when nothing is claimed"):
+            self.assertIn("are any workers running", logs.output[0])
+
+    def test_workers(self):
+        """Test running units on several worker processes."""
+        output = Path(self.directory.name, "output")
+        code = ("import os, sys; "
+                "open(sys.argv[1] + '.' + sys.argv[2], 'w').write("
+                "str(os.getppid()))")
+        commands = [FakeCommand(code) for n in range(8)]
+        for n, c in enumerate(commands):
+            c.argument_list = (lambda n=n: ["-c", code, output, str(n)])
+        workers = [subprocess.Popen(
+            [sys.executable, "-m", "work_queue", self.directory.name,
+             "--idle-timeout", "5"], cwd=ROOT) for n in range(3)]
+        try:
+            statuses = self.queue.run(commands)
+        finally:
+            for w in workers:
+                w.terminate()
+                w.wait()
+        pids = [int(Path("{o}.{n}".format(o=output, n=n)).read_text())
+                for n in range(len(commands))]
+        test_data = (
+            (statuses, [0] * len(commands), "exit statuses"),
+            (set(pids) <= {w.pid for w in workers}, True, "run by workers"),
+        )
+        for actual, expected, description in test_data:
+            with self.subTest(msg=description):
+                self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import json
+import os
+from pathlib import Path
+import socket
+import subprocess
+import tempfile
+import time
+import uuid
+
+import globals
+
+
+class WorkQueue(object):
+    """A queue of commands, shared between hosts through a directory.
+
+    Each unit of work is a command (argument list) in a JSON file. A
+    unit is submitted by writing it to pending/ under a temporary name
+    and renaming it, and a worker claims it by renaming it into
+    claimed/. Renames are atomic, so only one worker can claim each
+    unit. The worker then writes the unit's result to done/.
+
+    Workers touch their claims while they work on them. A claim that
+    hasn't been touched for claim_timeout seconds (e.g., because its
+    worker's host died) is abandoned, and is returned to pending/.
+
+    Commands are run with the same arguments and working directory on
+    every host, so file paths (e.g., input files and the queue directory
+    itself) must be the same everywhere. Executables are found on each
+    worker's PATH.
+
+    Waiting for units gives up after wait_timeout seconds, if set, and
+    warns if none of them have been claimed after UNCLAIMED_WARNING
+    seconds (e.g., because no workers are running).
+    """
+    PENDING = "pending"
+    CLAIMED = "claimed"
+    DONE = "done"
+    SUFFIX = ".json"
+    POLL_INTERVAL = 0.5
+    CLAIM_TIMEOUT = 300
+    UNCLAIMED_WARNING = 30
+
+    def __init__(self, directory, claim_timeout=CLAIM_TIMEOUT,
+                 wait_timeout=None):
+        self.directory = Path(directory)
+        self.claim_timeout = claim_timeout
+        self.wait_timeout = wait_timeout
+        for d in [self.PENDING, self.CLAIMED, self.DONE]:
+            (self.directory / d).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, state, unit):
+        """Return the file for unit in state."""
+        return self.directory / state / (unit + self.SUFFIX)
+
+    def _write(self, path, data):
+        """Write data to a JSON file atomically."""
+        fd, temp = tempfile.mkstemp(dir=str(path.parent), prefix=".",
+                                    suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp, str(path))
+
+    def submit(self, argv, cwd=None):
+        """Add a command to the queue. Return the unit's id.
+
+        The command is run in cwd (default the current directory).
+        """
+        fn = "submit"
+        # Units are claimed roughly in the order they're submitted.
+        unit = "{t:020d}_{u}".format(t=time.time_ns(), u=uuid.uuid4().hex)
+        self._write(self._path(self.PENDING, unit),
+                    {"unit": unit, "argv": [str(a) for a in argv],
+                     "cwd": str(cwd or os.getcwd())})
+        globals.log.debug("{cls}.{fn}(): {u}: {a}".format(
+            cls=self.__class__.__name__, fn=fn, u=unit, a=argv))
+        return unit
+
+    def claim(self):
+        """Claim the next pending unit.
+
+        Returns the unit, or None if there isn't one.
+        """
+        for f in sorted((self.directory / self.PENDING).glob(
+                "*" + self.SUFFIX)):
+            claim = self.directory / self.CLAIMED / f.name
+            try:
+                os.rename(str(f), str(claim))
+            except OSError:
+                # Another worker got there first.
+                continue
+            # The claim is fresh, whenever the unit was submitted.
+            os.utime(str(claim))
+            with claim.open() as c:
+                return json.load(c)
+        return None
+
+    def heartbeat(self, unit):
+        """Show that a claimed unit is still being worked on.
+
+        Raises FileNotFoundError if the claim has been lost (i.e., the
+        unit was requeued as abandoned).
+        """
+        os.utime(str(self._path(self.CLAIMED, unit)))
+
+    def finish(self, unit, status, worker="", output=""):
+        """Record the result of a claimed unit."""
+        self._write(self._path(self.DONE, unit),
+                    {"unit": unit, "status": status, "worker": worker,
+                     "output": output})
+        try:
+            self._path(self.CLAIMED, unit).unlink()
+        except OSError:
+            pass
+
+    def requeue_abandoned(self):
+        """Return abandoned claims to the queue. Return their ids."""
+        fn = "requeue_abandoned"
+        requeued = []
+        now = time.time()
+        for f in (self.directory / self.CLAIMED).glob("*" + self.SUFFIX):
+            try:
+                if (now - f.stat().st_mtime < self.claim_timeout):
+                    continue
+                os.rename(str(f), str(self.directory / self.PENDING / f.name))
+            except OSError:
+                continue
+            requeued.append(f.name[:-len(self.SUFFIX)])
+        if requeued:
+            globals.log.debug("{cls}.{fn}(): {r}".format(
+                cls=self.__class__.__name__, fn=fn, r=requeued))
+        return requeued
+
+    def result(self, unit):
+        """Return the result of a unit, or None if it isn't done."""
+        try:
+            with self._path(self.DONE, unit).open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def wait(self, units, timeout=None):
+        """Wait for units to be done. Return their exit statuses, in order.
+
+        If the units aren't all done after timeout seconds (default
+        wait_timeout), those still pending are withdrawn, and their
+        status is None.
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        start = time.monotonic()
+        warned = False
+        results = {}
+        while True:
+            for u in units:
+                if u not in results:
+                    results[u] = self.result(u)
+                    if results[u] is None:
+                        del results[u]
+            waiting = [u for u in set(units) if u not in results]
+            if not waiting:
+                break
+            elapsed = time.monotonic() - start
+            if (timeout is not None) and (elapsed > timeout):
+                for u in waiting:
+                    self._path(self.PENDING, u).unlink(missing_ok=True)
+                globals.log.error("{n} units weren't done after {t} seconds "
+                                  "in work queue {d}".format(
+                                      n=len(waiting), t=timeout,
+                                      d=self.directory))
+                break
+            if (not warned and not results
+                    and (elapsed > self.UNCLAIMED_WARNING)
+                    and all([self._path(self.PENDING, u).exists()
+                             for u in waiting])):
+                globals.log.warning(
+                    "No units have been claimed from work queue {d} after "
+                    "{t} seconds; are any workers running (\"python -m "
+                    "work_queue {d}\")?".format(d=self.directory,
+                                                t=self.UNCLAIMED_WARNING))
+                warned = True
+            self.requeue_abandoned()
+            time.sleep(self.POLL_INTERVAL)
+        for u in units:
+            self._path(self.DONE, u).unlink(missing_ok=True)
+        return [results[u]["status"] if u in results else None
+                for u in units]
+
+    def run(self, commands):
+        """Run shell commands on the workers. Return their exit statuses.
+
+        Each command's executable is looked up on the worker.
+        """
+        return self.wait([self.submit(
+            [Path(str(c.executable_string())).name] + c.argument_list())
+            for c in commands])
+
+
+class Worker(object):
+    """A worker that runs units of work from a WorkQueue, one at a time."""
+    # Keep this much of the end of each command's output (for errors).
+    OUTPUT_TAIL = 4096
+
+    def __init__(self, queue, name=None):
+        self.queue = queue
+        self.name = name or "{h}:{p}".format(h=socket.gethostname(),
+                                             p=os.getpid())
+
+    def run_unit(self, unit):
+        """Run a claimed unit and record its result.
+
+        Returns the exit status, or None if the claim was lost while
+        the unit was running (e.g., because this worker was too slow
+        to touch it). The command is then stopped, and its result isn't
+        recorded, as the unit is now another worker's.
+        """
+        fn = "run_unit"
+        globals.log.debug("{cls}.{fn}(): {u}: {a}".format(
+            cls=self.__class__.__name__, fn=fn, u=unit["unit"],
+            a=unit["argv"]))
+        with tempfile.TemporaryFile() as output:
+            try:
+                process = subprocess.Popen(
+                    unit["argv"], cwd=unit["cwd"],
+                    stdin=subprocess.DEVNULL, stdout=output,
+                    stderr=subprocess.STDOUT)
+            except OSError as e:
+                self.queue.finish(unit["unit"], 127, self.name, str(e))
+                return 127
+            # The claim must be touched more often than it times out.
+            interval = max(self.queue.claim_timeout / 4, 0.1)
+            while True:
+                try:
+                    status = process.wait(timeout=interval)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                try:
+                    self.queue.heartbeat(unit["unit"])
+                except OSError:
+                    globals.log.warning("Lost the claim on unit {u}, "
+                                        "stopping it".format(u=unit["unit"]))
+                    process.kill()
+                    process.wait()
+                    return None
+            output.seek(max(0, output.tell() - self.OUTPUT_TAIL))
+            tail = output.read().decode(errors="replace")
+        self.queue.finish(unit["unit"], status, self.name, tail)
+        return status
+
+    def work(self, idle_timeout=None):
+        """Run units until there have been none for idle_timeout seconds.
+
+        If idle_timeout is None, keep going forever. Returns the number
+        of units run.
+        """
+        count = 0
+        idle_since = time.monotonic()
+        while True:
+            unit = self.queue.claim()
+            if unit:
+                self.run_unit(unit)
+                count += 1
+                idle_since = time.monotonic()
+            elif ((idle_timeout is not None)
+                    and (time.monotonic() - idle_since > idle_timeout)):
+                return count
+            else:
+                self.queue.requeue_abandoned()
+                time.sleep(self.queue.POLL_INTERVAL)